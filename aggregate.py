@@ -0,0 +1,98 @@
+# aggregate.py
+import datetime
+
+from database import DatabaseManager
+
+MAX_BUCKETS = 2000
+
+def choose_bucket_seconds(span_seconds, requested=None, max_buckets=MAX_BUCKETS):
+    """
+    Returns the bucket width to use for a time span: the requested width, or
+    one hour by default, widened if needed so there are at most `max_buckets`.
+    """
+    bucket = int(requested) if requested else 3600
+    minimum = -(-int(span_seconds) // max_buckets)
+    return max(1, bucket, minimum)
+
+def _combine(stats, into=None):
+    """Merges (count, total, minimum, maximum) partials."""
+    count, total, minimum, maximum = stats
+    if into is None:
+        return [count, total, minimum, maximum]
+    into[0] += count
+    into[1] += total
+    into[2] = min(into[2], minimum)
+    into[3] = max(into[3], maximum)
+    return into
+
+def _summary(partial):
+    if partial is None or not partial[0]:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None}
+    count, total, minimum, maximum = partial
+    return {'count': count, 'mean': total / count, 'min': minimum, 'max': maximum}
+
+def align_bucket_stats(bucket_stats, start_epoch, end_epoch, bucket_seconds):
+    """
+    Turns BucketStats rows into series aligned on a common time axis, ready for
+    plotting. Every station gets mean/min/max/count lists with one entry per
+    bucket (None where it has no data), and the network-wide series and
+    summaries are derived exactly from the same per-bucket partials.
+    """
+    first = int(start_epoch) // bucket_seconds * bucket_seconds
+    last = int(end_epoch) // bucket_seconds * bucket_seconds
+    n_buckets = max(0, (last - first) // bucket_seconds + 1)
+
+    per_station, station_totals, network, network_total = {}, {}, [None] * n_buckets, None
+    for stat in bucket_stats:
+        i = (stat.bucket - first) // bucket_seconds
+        if not 0 <= i < n_buckets or not stat.count:
+            continue
+        partial = (stat.count, stat.total, stat.minimum, stat.maximum)
+        series = per_station.get(stat.station_id)
+        if series is None:
+            series = per_station[stat.station_id] = [None] * n_buckets
+        series[i] = _combine(partial, series[i])
+        station_totals[stat.station_id] = _combine(partial, station_totals.get(stat.station_id))
+        network[i] = _combine(partial, network[i])
+        network_total = _combine(partial, network_total)
+
+    def columns(buckets):
+        return {
+            'mean': [b[1] / b[0] if b else None for b in buckets],
+            'min': [b[2] if b else None for b in buckets],
+            'max': [b[3] if b else None for b in buckets],
+            'count': [b[0] if b else 0 for b in buckets],
+        }
+
+    return {
+        'bucket_seconds': bucket_seconds,
+        'timestamps': [(first + i * bucket_seconds) * 1000 for i in range(n_buckets)],
+        'stations': {station_id: columns(series) for station_id, series in sorted(per_station.items())},
+        'network': columns(network),
+        'summary': {
+            'stations': {station_id: _summary(total) for station_id, total in sorted(station_totals.items())},
+            'network': _summary(network_total),
+        },
+    }
+
+def aggregate_series(db_paths, sensor, metric, start, end=None, bucket_seconds=None, station_ids=None):
+    """
+    Computes per-station and network-wide bucket statistics for one series
+    across every database in `db_paths` (one file per station, or a single
+    store). `start` and `end` are datetimes; `end` defaults to now.
+    """
+    end = end or datetime.datetime.now(datetime.timezone.utc)
+    bucket_seconds = choose_bucket_seconds((end - start).total_seconds(), bucket_seconds)
+
+    def stats():
+        for db_path in db_paths:
+            db = DatabaseManager(db_path)
+            try:
+                yield from db.iter_bucket_stats(sensor, metric, start.isoformat(), end.isoformat(),
+                                                bucket_seconds, station_ids)
+            finally:
+                db.close()
+
+    result = align_bucket_stats(stats(), start.timestamp(), end.timestamp(), bucket_seconds)
+    result.update({'sensor': sensor, 'metric': metric})
+    return result
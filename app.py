@@ -1,13 +1,34 @@
 # app.py
 import os
+import sys
 import json
-import glob
 import time 
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+import gzip
+import hashlib
+import logging
+import datetime
+from array import array
+from flask import Flask, Response, make_response, render_template, request, redirect, url_for, jsonify, flash, stream_with_context
 from threading import Lock
-from database import DatabaseManager
+import metrics
+import logging_setup
+from aggregate import aggregate_series
+from config_watcher import write_config
+from dashboard_data import DashboardData, DASHBOARD_METRICS, DEFAULT_HISTORY_CACHE_MB, get_all_db_paths, get_data_version
+from export import EXPORT_FORMATS, iter_export, known_sensor_names, normalize_timestamp, split_sensor_key
+from ring_buffer import query_recent, DEFAULT_SOCKET_PATH
+from live_stream import ReadingTailer, sse_events
 from run_weather_station import get_dynamic_db_path as get_local_db_path
 
+log = logging.getLogger(__name__)
+
+# Brotli is optional; gzip is always available
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
 # --- Configuration ---
 project_dir = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(project_dir, 'config.json')
@@ -16,12 +37,12 @@ app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'a-very-secret-key')
 config_lock = Lock()
 
-# --- Caching and DB Mapping ---
-cache = {'data': None, 'last_updated': 0}
-CACHE_LIFETIME_SECONDS = 10
-cache_lock = Lock()
-station_db_map = {}
-map_lock = Lock()
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'application/octet-stream')
+MIN_COMPRESS_BYTES = 500
+HISTORY_ETAG_BUCKET_SECONDS = 60
+# 'points' is a list of {timestamp, value}; 'columns' is {"t": [epoch ms], "v": [values]};
+# 'f64' is the same columns as little-endian Float64 arrays, all times then all values
+HISTORY_FORMATS = ('points', 'columns', 'f64')
 
 def load_config():
     with config_lock:
@@ -30,115 +51,226 @@ def load_config():
 
 def save_config(config_data):
     with config_lock:
-        with open(CONFIG_PATH, 'w') as f:
-            json.dump(config_data, f, indent=2)
-
-def get_all_db_paths(local_db_path):
-    db_dir = os.path.dirname(local_db_path)
-    if not os.path.isdir(db_dir):
-        return []
-    return glob.glob(os.path.join(db_dir, '*.db'))
-
-def get_enriched_data():
-    with cache_lock:
-        now = time.time()
-        if cache['data'] and (now - cache['last_updated'] < CACHE_LIFETIME_SECONDS):
-            return cache['data']
-
-        print("[Dashboard] Cache expired. Rebuilding data from databases.")
-        config = load_config()
-        local_db_path = get_local_db_path(config)
-        all_db_files = get_all_db_paths(local_db_path)
-        
-        latest_data_by_station = {}
-        
-        with map_lock:
-            station_db_map.clear()
-            for db_file in all_db_files:
-                try:
-                    # Use a temporary DB manager to avoid holding connections
-                    db_manager = DatabaseManager(db_file)
-                    data = db_manager.get_latest_readings_by_station()
-                    for station_id in data.keys():
-                        station_db_map[station_id] = db_file
-                    latest_data_by_station.update(data)
-                    db_manager.close()
-                except Exception as e:
-                    print(f"[Dashboard] ERROR reading from {db_file}: {e}")
-        
-        # Enrich data with labels and units from config
-        for station_id, readings in latest_data_by_station.items():
-            for key, reading in readings.items():
-                sensor_name = reading['sensor']
-                metric_name = reading['metric']
-                
-                # Find the label and unit from the config file
-                label, unit = key, ""
-                sensor_found = False
-                for s_conf in config.get('sensors', {}).values():
-                    if s_conf['name'] == sensor_name:
-                        metric_conf = s_conf.get('metrics', {}).get(metric_name)
-                        if metric_conf:
-                            label = metric_conf.get('label', key)
-                            unit = metric_conf.get('unit', '')
-                        sensor_found = True
-                        break
-                if not sensor_found:
-                    rg_conf = config.get('rain_gauge', {})
-                    if rg_conf.get('name') == sensor_name:
-                         label = rg_conf.get('label', key)
-                         unit = rg_conf.get('unit', '')
-                
-                reading['label'] = label
-                reading['unit'] = unit
-
-        cache['data'] = latest_data_by_station
-        cache['last_updated'] = now
-        return cache['data']
+        write_config(CONFIG_PATH, config_data)
+
+logging_setup.setup_logging(load_config(), 'dashboard')
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+def is_not_modified(etag, last_modified=None):
+    """Checks the request's validators against the current ETag / Last-Modified."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+def with_validators(response, etag, last_modified=None):
+    # Weak because the body may be re-encoded with gzip or brotli
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let browsers keep the body but revalidate it on every load
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified_response(etag, last_modified=None):
+    return with_validators(Response(status=304), etag, last_modified)
+
+@app.after_request
+def compress_response(response):
+    """Compresses JSON and HTML bodies with brotli or gzip when the client accepts it."""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if BROTLI_AVAILABLE and accepted['br']:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
+
+def get_stream_db_paths():
+    return get_all_db_paths(get_local_db_path(load_config()))
+
+def default_max_streams(dashboard_config):
+    """Each /api/stream client holds a worker thread, so by default half of them are left for other requests."""
+    return max(dashboard_config.get('threads', 16) // 2, 1)
+
+dashboard_config = load_config().get('dashboard', {})
+# One tailer per process feeds every connected /api/stream client
+reading_tailer = ReadingTailer(get_stream_db_paths,
+                               max_subscribers=dashboard_config.get('max_streams', default_max_streams(dashboard_config)))
+stream_lifetime_seconds = dashboard_config.get('stream_lifetime_seconds', 300)
+# Shared by every request thread: open databases, station map and latest readings
+history_cache_mb = load_config().get('dashboard', {}).get('history_cache_mb', DEFAULT_HISTORY_CACHE_MB)
+data_layer = DashboardData(get_stream_db_paths, load_config, history_cache_bytes=int(history_cache_mb * 1024 * 1024))
+
+def columns_response(times, values, fmt):
+    """Encodes epoch-ms / value columns as JSON arrays or as one Float64 buffer."""
+    if fmt == 'columns':
+        return jsonify({'t': [int(t) for t in times], 'v': list(values)})
+    buf = array('d', times)
+    buf.extend(array('d', values))
+    if sys.byteorder == 'big':
+        buf.byteswap()
+    return Response(buf.tobytes(), mimetype='application/octet-stream',
+                    headers={'X-Series-Length': str(len(times))})
 
 @app.route('/api/history/<int:station_id>/<string:sensor_key>/<int:hours>')
 def get_history(station_id, sensor_key, hours):
-    with map_lock:
-        db_path = station_db_map.get(station_id)
-
+    """
+    History for one series. `format` selects the encoding: 'points' (default),
+    'columns' or 'f64'; see HISTORY_FORMATS.
+    """
+    fmt = request.args.get('format', 'points')
+    if fmt not in HISTORY_FORMATS:
+        return jsonify({"error": f"Unknown history format '{fmt}'"}), 400
+    db_path = data_layer.db_path_for(station_id)
     if not db_path:
         return jsonify({"error": "Station database not found"}), 404
 
     try:
         # Load the config to get a list of valid sensor names
         config = load_config()
-        known_sensor_names = [s['name'] for s in config.get('sensors', {}).values()]
-        if 'rain_gauge' in config:
-            known_sensor_names.append(config['rain_gauge']['name'])
-
-        sensor = None
-        metric = None
-
-        # Sort by length (descending) to match longer names first (e.g., 'wind-speed' before 'wind')
-        for s_name in sorted(known_sensor_names, key=len, reverse=True):
-            # Check if the key starts with the sensor name followed by a hyphen
-            if sensor_key.startswith(s_name + '-'):
-                sensor = s_name
-                # The metric is the rest of the string after the sensor name and hyphen
-                metric = sensor_key[len(s_name) + 1:]
-                break
-        
-        if not sensor:
-            raise ValueError(f"Could not determine sensor from key: '{sensor_key}'")
+        sensor, metric = split_sensor_key(sensor_key, known_sensor_names(config))
+
+        # The window slides with time, so the tag also changes once per bucket
+        versions, _ = get_data_version([db_path])
+        etag = make_etag(station_id, sensor_key, hours, fmt, versions, int(time.time() // HISTORY_ETAG_BUCKET_SECONDS))
+        if is_not_modified(etag):
+            return not_modified_response(etag)
 
-        db = DatabaseManager(db_path)
-        historical_data = db.get_historical_data(station_id, sensor, metric, hours)
-        db.close()
-        return jsonify(historical_data)
+        # Short windows are answered from the collector's in-memory buffer when possible
+        rr_config = config.get('recent_readings', {})
+        if rr_config.get('enabled', False) and hours <= rr_config.get('retention_hours', 48):
+            recent_data = query_recent(station_id, sensor, metric, hours, rr_config.get('socket_path', DEFAULT_SOCKET_PATH),
+                                       columns=fmt != 'points')
+            if recent_data is not None:
+                if fmt == 'points':
+                    return with_validators(jsonify(recent_data), etag)
+                return with_validators(columns_response(recent_data['t'], recent_data['v'], fmt), etag)
+
+        if fmt != 'points':
+            # Cached, and extended with rows above the version's max id instead of re-scanned
+            max_id = versions[0][1] if versions else 0
+            times, values = data_layer.history.get(data_layer.db(db_path), station_id, sensor, metric, hours, max_id)
+            return with_validators(columns_response(times, values, fmt), etag)
+        historical_data = data_layer.db(db_path).get_historical_data(station_id, sensor, metric, hours)
+        return with_validators(jsonify(historical_data), etag)
     except ValueError as e:
          return jsonify({"error": f"Invalid sensor key format. {e}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/aggregate/<string:sensor_key>')
+def get_aggregate(sensor_key):
+    """
+    Per-station and network-wide mean/min/max/count for one series, bucketed on
+    a shared time axis. Query parameters: hours (default 24), bucket (seconds)
+    and station (repeatable; default all stations).
+    """
+    try:
+        config = load_config()
+        sensor, metric = split_sensor_key(sensor_key, known_sensor_names(config))
+        hours = request.args.get('hours', 24, type=float)
+        bucket = request.args.get('bucket', type=int)
+        station_ids = request.args.getlist('station', type=int) or None
+
+        db_paths = get_all_db_paths(get_local_db_path(config))
+        if not db_paths:
+            return jsonify({"error": "No station databases found"}), 404
+
+        versions, _ = get_data_version(db_paths)
+        etag = make_etag('aggregate', sensor_key, hours, bucket, station_ids, versions,
+                         int(time.time() // HISTORY_ETAG_BUCKET_SECONDS))
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        end = datetime.datetime.now(datetime.timezone.utc)
+        start = end - datetime.timedelta(hours=hours)
+        result = aggregate_series(db_paths, sensor, metric, start, end, bucket, station_ids)
+        return with_validators(jsonify(result), etag)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid sensor key format. {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/export')
+def export_readings():
+    """
+    Streams readings as CSV or columnar binary. Optional query parameters:
+    station, series (repeatable sensor key), start, end and format.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown export format '{fmt}'"}), 400
+
+    try:
+        station_id = request.args.get('station', type=int)
+        config = load_config()
+        names = known_sensor_names(config)
+        series = [split_sensor_key(key, names) for key in request.args.getlist('series')] or None
+        start = normalize_timestamp(request.args.get('start'))
+        end = normalize_timestamp(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid export parameters. {e}"}), 400
+
+    db_path = data_layer.db_path_for(station_id) if station_id is not None else None
+    db_paths = [db_path] if db_path else get_all_db_paths(get_local_db_path(config))
+    if not db_paths:
+        return jsonify({"error": "No station databases found"}), 404
+
+    _, mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"station-{station_id}.{extension}" if station_id is not None else f"readings.{extension}"
+    chunks = iter_export(db_paths, fmt, station_id, series, start, end)
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/stream')
+def stream_readings():
+    """Pushes new readings to the dashboard as Server-Sent Events."""
+    return Response(stream_with_context(sse_events(reading_tailer, lifetime_seconds=stream_lifetime_seconds)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus metrics for the dashboard process, followed by the collector's
+    metrics when it is running with its metrics server enabled. Only the
+    dashboard's own families are rendered here, so no family appears twice.
+    """
+    body = DASHBOARD_METRICS.render()
+    metrics_conf = load_config().get('metrics', {})
+    if metrics_conf.get('enabled', False):
+        port = metrics_conf.get('port', metrics.DEFAULT_METRICS_PORT)
+        collector = metrics.fetch(f"http://127.0.0.1:{port}/metrics")
+        if collector:
+            body += collector
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def dashboard():
     config = load_config()
-    enriched_data = get_enriched_data()
+    versions, last_modified = get_data_version(get_all_db_paths(get_local_db_path(config)))
+    # Labels and units come from the config, so it is part of the version too
+    etag = make_etag(versions, os.path.getmtime(CONFIG_PATH))
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    enriched_data = data_layer.latest_readings(etag)
     station_tabs = []
     local_station_id = config.get('station_info', {}).get('station_id')
     
@@ -148,7 +280,7 @@ def dashboard():
         sorted_station_ids.insert(0, sorted_station_ids.pop(sorted_station_ids.index(local_station_id)))
         
     for station_id in sorted_station_ids:
-        db_path = station_db_map.get(station_id, "Unknown DB")
+        db_path = data_layer.station_db_map.get(station_id, "Unknown DB")
         db_name = os.path.basename(db_path)
         is_local = (station_id == local_station_id)
 
@@ -159,7 +291,7 @@ def dashboard():
             'data': dict(sorted(enriched_data.get(station_id, {}).items()))
         })
         
-    return render_template('dashboard.html', station_tabs=station_tabs)
+    return with_validators(make_response(render_template('dashboard.html', station_tabs=station_tabs)), etag, last_modified)
 
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
@@ -194,7 +326,7 @@ def settings():
                 current_config['rain_gauge']['enabled'] = 'enabled_rain' in request.form
 
             save_config(current_config)
-            flash("Configuration saved successfully! A restart may be required for some changes to take effect.", "success")
+            flash("Configuration saved successfully! Running services will apply the changes automatically.", "success")
         except (ValueError, TypeError) as e:
             flash(f"Error saving configuration: Invalid input. ({e})", "danger")
         except Exception as e:
@@ -205,5 +337,6 @@ def settings():
     return render_template('settings.html', config=config)
 
 if __name__ == '__main__':
+    # Development server; production runs under gunicorn with gunicorn.conf.py.
     # Use 0.0.0.0 to make it accessible on the network
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG') == '1', threaded=True)
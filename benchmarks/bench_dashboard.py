@@ -0,0 +1,41 @@
+# benchmarks/bench_dashboard.py
+import os
+import time
+
+from common import SERIES, build_synthetic_db, summarize
+
+def run(args, workdir):
+    """Requests per second for /api/history through the Flask app, with and without ETag revalidation."""
+    import app
+
+    db_dir = os.path.join(workdir, 'dashboard')
+    os.makedirs(db_dir, exist_ok=True)
+    db_path = os.path.join(db_dir, 'bench-dashboard.db')
+    build_synthetic_db(db_path, args.dashboard_rows, stations=(1,), span_days=30)
+
+    app.get_local_db_path = lambda config: db_path
+    client = app.app.test_client()
+
+    sensor, metric = SERIES[1]
+    url = f'/api/history/1/{sensor}-{metric}/24'
+    results = {}
+    variants = (('full', url, {}), ('gzip', url, {'Accept-Encoding': 'gzip'}),
+                ('columns', url + '?format=columns', {}), ('f64', url + '?format=f64', {}))
+    for name, variant_url, headers in variants:
+        durations = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(variant_url, headers=headers)
+            durations.append(time.perf_counter() - start)
+        results[name] = dict(summarize(durations), requests_per_second=len(durations) / sum(durations),
+                             status=response.status_code, body_bytes=len(response.data))
+
+    etag = client.get(url).headers.get('ETag')
+    durations = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        response = client.get(url, headers={'If-None-Match': etag})
+        durations.append(time.perf_counter() - start)
+    results['conditional'] = dict(summarize(durations), requests_per_second=len(durations) / sum(durations),
+                                  status=response.status_code)
+    return results
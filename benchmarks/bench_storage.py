@@ -0,0 +1,36 @@
+# benchmarks/bench_storage.py
+import os
+import time
+
+from common import DatabaseManager, SERIES, build_synthetic_db, summarize, timed
+
+def run(args, workdir):
+    """Write throughput, and history / latest-reading query latency on a synthetic database."""
+    results = {}
+
+    # Write throughput on a fresh database, one commit per reading like the sensors do
+    write_db = DatabaseManager(os.path.join(workdir, 'write-bench.db'))
+    durations, _ = timed(lambda: write_db.write_reading(1, 'soil', 'temp-c', 21.5), args.writes)
+    write_db.close()
+    results['write_reading'] = dict(summarize(durations), rows_per_second=len(durations) / sum(durations))
+
+    db_path = os.path.join(workdir, 'query-bench.db')
+    start = time.perf_counter()
+    build_synthetic_db(db_path, args.rows, stations=range(1, args.stations + 1))
+    results['synthetic_db'] = {
+        'rows': args.rows,
+        'stations': args.stations,
+        'build_seconds': time.perf_counter() - start,
+        'size_bytes': os.path.getsize(db_path),
+    }
+
+    db = DatabaseManager(db_path)
+    sensor, metric = SERIES[1]
+    for hours in (24, 168, 720):
+        durations, data = timed(lambda: db.get_historical_data(1, sensor, metric, hours), args.repeat)
+        results[f'get_historical_data_{hours}h'] = dict(summarize(durations), rows_returned=len(data))
+
+    durations, data = timed(db.get_latest_readings_by_station, args.repeat)
+    results['get_latest_readings_by_station'] = dict(summarize(durations), stations_returned=len(data))
+    db.close()
+    return results
@@ -0,0 +1,72 @@
+# benchmarks/common.py
+import os
+import sys
+import time
+import random
+import sqlite3
+import datetime
+import statistics
+
+# Benchmarks import the project modules from the repository root
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from database import DatabaseManager
+
+SERIES = [
+    ('soil', 'moisture-rh'), ('soil', 'temp-c'), ('atmosphere', 'humidity-rh'),
+    ('atmosphere', 'temp-c'), ('co2', 'ppm'), ('light', 'lux'), ('pressure', 'kpa'),
+    ('pressure', 'temp-c'), ('wind-direction', 'direction'), ('wind-speed', 'speed-ms'),
+]
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+def timed(fn, repeat):
+    """Calls fn `repeat` times and returns (durations, last result)."""
+    durations, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+def build_synthetic_db(db_path, rows, stations=(1,), span_days=365, batch=50000):
+    """
+    Creates a station database with `rows` readings spread evenly over the last
+    `span_days` across every station and SERIES entry. Uses one transaction per
+    batch so even 100M rows can be generated in reasonable time.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    DatabaseManager(db_path).close()  # Creates the schema the same way the station does
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    keys = [(station, sensor, metric) for station in stations for sensor, metric in SERIES]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    step = datetime.timedelta(days=span_days) / max(1, rows)
+    start_ts = now - datetime.timedelta(days=span_days)
+    for offset in range(0, rows, batch):
+        chunk = []
+        for i in range(offset, min(rows, offset + batch)):
+            station, sensor, metric = keys[i % len(keys)]
+            ts = (start_ts + step * i).isoformat()
+            chunk.append((ts, station, sensor, metric, random.uniform(0, 100), None))
+        conn.executemany(
+            "INSERT INTO readings (timestamp, station_id, sensor, metric, value, rssi) VALUES (?, ?, ?, ?, ?, ?)",
+            chunk)
+        conn.commit()
+    conn.close()
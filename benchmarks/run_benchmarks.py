@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# benchmarks/run_benchmarks.py
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+import common
+from simulation import use_simulation
+
+SUITES = ('storage', 'lora', 'dashboard')
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=common.PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, storage, LoRa relay and the dashboard on simulated hardware.")
+    parser.add_argument('--suite', action='append', choices=SUITES, help="Suite to run (default: all). May be repeated.")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Rows in the synthetic query database (1M-100M).")
+    parser.add_argument('--stations', type=int, default=1, help="Stations in the synthetic query database.")
+    parser.add_argument('--writes', type=int, default=2000, help="Readings written for the write throughput test.")
+    parser.add_argument('--repeat', type=int, default=20, help="Repetitions per query latency test.")
+    parser.add_argument('--lora-records', type=int, default=200, help="Records relayed in the LoRa test.")
+    parser.add_argument('--lora-timeout', type=float, default=120.0, help="Give up on the LoRa test after this many seconds.")
+    parser.add_argument('--time-scale', type=float, default=0.01, help="Simulated airtime/latency scale (1.0 = real time).")
+    parser.add_argument('--dashboard-rows', type=int, default=200_000, help="Rows in the dashboard test database.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per dashboard test.")
+    parser.add_argument('--workdir', help="Directory for the synthetic databases (default: a temporary directory).")
+    parser.add_argument('-o', '--output', help="Write the JSON results to this file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    with open(os.path.join(common.PROJECT_DIR, 'config.json'), 'r') as f:
+        config = json.load(f)
+    suites = args.suite or list(SUITES)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='ws-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    report = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'parameters': vars(args),
+        'results': {},
+    }
+
+    try:
+        # Progress and the project's own console output go to stderr so stdout stays valid JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            sim_config = dict(config.get('simulation', {}), time_scale=args.time_scale, lora_loss_rate=0.0)
+            _, channel = use_simulation(sim_config, config)
+            for suite in suites:
+                print(f"[Benchmarks] Running '{suite}'...")
+                start = time.perf_counter()
+                if suite == 'storage':
+                    import bench_storage
+                    result = bench_storage.run(args, workdir)
+                elif suite == 'lora':
+                    import bench_lora
+                    result = bench_lora.run(args, workdir, config, channel)
+                else:
+                    import bench_dashboard
+                    result = bench_dashboard.run(args, workdir)
+                result['suite_seconds'] = time.perf_counter() - start
+                report['results'][suite] = result
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
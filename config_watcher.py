@@ -0,0 +1,138 @@
+# config_watcher.py
+import os
+import json
+import time
+import logging
+import tempfile
+import select
+import struct
+import ctypes
+import ctypes.util
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+# inotify is reached through libc with ctypes so no extra package is needed.
+# On platforms without it the watcher falls back to polling the file's mtime.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_EVENT_HEADER = struct.Struct('iIII')
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    _libc.inotify_init1
+    _libc.inotify_add_watch
+    INOTIFY_AVAILABLE = True
+except (OSError, AttributeError):
+    INOTIFY_AVAILABLE = False
+
+ConfigDiff = namedtuple('ConfigDiff', 'sections added removed changed')
+
+def diff_config(old, new):
+    """
+    Compares two configs structurally. Returns the set of top-level sections that
+    differ, and which Modbus sensor addresses were added, removed or changed.
+    """
+    sections = {key for key in set(old) | set(new) if old.get(key) != new.get(key)}
+    old_sensors, new_sensors = old.get('sensors', {}), new.get('sensors', {})
+    added = {addr for addr in new_sensors if addr not in old_sensors}
+    removed = {addr for addr in old_sensors if addr not in new_sensors}
+    changed = {addr for addr in new_sensors if addr in old_sensors and old_sensors[addr] != new_sensors[addr]}
+    return ConfigDiff(sections, added, removed, changed)
+
+def write_config(path, config):
+    """
+    Replaces the config file atomically: the JSON is written to a temporary file
+    in the same directory and renamed over it, so a watcher reloading the file
+    never sees it half-written.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path), suffix='.tmp',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(config, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class FileWatcher:
+    """
+    Blocks until a file has been rewritten. Uses inotify on the file's directory
+    (so editors that save by renaming are caught too) and falls back to polling.
+    """
+    def __init__(self, path, poll_interval=10, settle_seconds=0.2):
+        self.path = os.path.abspath(path)
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.fd = None
+        self.last_mtime = self._mtime()
+        if INOTIFY_AVAILABLE:
+            self._init_inotify()
+
+    def _init_inotify(self):
+        fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            log.warning("[ConfigWatcher] inotify unavailable (%s), polling instead.", os.strerror(ctypes.get_errno()))
+            return
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if _libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+            log.warning("[ConfigWatcher] Could not watch %s, polling instead.", os.path.dirname(self.path))
+            os.close(fd)
+            return
+        self.fd = fd
+
+    def _mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def _read_events(self):
+        """Returns True if any pending event concerns the watched file."""
+        try:
+            buf = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return False
+        name = os.path.basename(self.path).encode()
+        hit, offset = False, 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            _, _, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            if buf[offset:offset + length].rstrip(b'\0') == name:
+                hit = True
+            offset += length
+        return hit
+
+    def wait(self, stop_event):
+        """Returns True once the file has changed, or False if stop_event was set."""
+        while not stop_event.is_set():
+            if self.fd is None:
+                if stop_event.wait(self.poll_interval):
+                    return False
+                changed = True
+            else:
+                ready, _, _ = select.select([self.fd], [], [], 1.0)
+                changed = bool(ready) and self._read_events()
+                if changed:
+                    # Let a burst of writes finish before the file is parsed
+                    time.sleep(self.settle_seconds)
+                    while select.select([self.fd], [], [], 0)[0]:
+                        self._read_events()
+            if changed:
+                mtime = self._mtime()
+                if mtime is not None and mtime != self.last_mtime:
+                    self.last_mtime = mtime
+                    return True
+        return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
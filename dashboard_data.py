@@ -0,0 +1,275 @@
+# dashboard_data.py
+import os
+import glob
+import time
+import logging
+import datetime
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+
+import metrics
+from database import DatabaseManager, read_max_id
+from derived import DERIVED_SENSOR
+
+log = logging.getLogger(__name__)
+
+CACHE_LIFETIME_SECONDS = 10
+# A request for an unknown station rescans the files at most this often
+STATION_RESCAN_SECONDS = 1.0
+DEFAULT_HISTORY_CACHE_MB = 32
+
+# The dashboard's own metrics. The collector modules it imports register their
+# families in metrics.REGISTRY too, and those are served by the collector itself.
+DASHBOARD_METRICS = metrics.Registry()
+CACHE_REQUESTS = DASHBOARD_METRICS.counter('ws_dashboard_cache_requests_total', "Dashboard data cache lookups, by hit or miss.", ('result',))
+CACHE_REBUILD_SECONDS = DASHBOARD_METRICS.histogram('ws_dashboard_cache_rebuild_seconds', "Time to rebuild the dashboard data cache.")
+HISTORY_CACHE_REQUESTS = DASHBOARD_METRICS.counter('ws_dashboard_history_cache_requests_total',
+                                                   "History cache lookups: hit, extended with new rows, or miss.", ('result',))
+HISTORY_CACHE_BYTES = DASHBOARD_METRICS.gauge('ws_dashboard_history_cache_bytes', "Memory held by cached history windows.")
+
+def get_all_db_paths(local_db_path):
+    db_dir = os.path.dirname(local_db_path)
+    if not os.path.isdir(db_dir):
+        return []
+    return glob.glob(os.path.join(db_dir, '*.db'))
+
+def get_data_version(db_paths):
+    """
+    Describes the current contents of the given databases by their newest row
+    ids, and returns it with the most recent file modification time.
+    """
+    versions, last_modified = [], None
+    for db_path in sorted(db_paths):
+        versions.append((os.path.basename(db_path), read_max_id(db_path)))
+        try:
+            mtime = os.path.getmtime(db_path)
+        except OSError:
+            continue
+        if last_modified is None or mtime > last_modified:
+            last_modified = mtime
+    if last_modified is not None:
+        last_modified = datetime.datetime.fromtimestamp(int(last_modified), datetime.timezone.utc)
+    return tuple(versions), last_modified
+
+def label_and_unit(config, sensor_name, metric_name, key):
+    """Looks up the display label and unit of a series in the config."""
+    for s_conf in config.get('sensors', {}).values():
+        if s_conf['name'] == sensor_name:
+            metric_conf = s_conf.get('metrics', {}).get(metric_name)
+            if metric_conf:
+                return metric_conf.get('label', key), metric_conf.get('unit', '')
+            return key, ''
+    rg_conf = config.get('rain_gauge', {})
+    if rg_conf.get('name') == sensor_name:
+        return rg_conf.get('label', key), rg_conf.get('unit', '')
+    if sensor_name == DERIVED_SENSOR:
+        derived_conf = config.get('derived_metrics', {}).get('metrics', {}).get(metric_name, {})
+        return derived_conf.get('label', key), derived_conf.get('unit', '')
+    return key, ''
+
+class HistoryWindow:
+    """One cached history window: epoch-ms and value columns, complete up to row `max_id`."""
+    __slots__ = ('times', 'values', 'max_id')
+
+    def __init__(self, times, values, max_id):
+        self.times = times
+        self.values = values
+        self.max_id = max_id
+
+    @property
+    def nbytes(self):
+        return (len(self.times) + len(self.values)) * 8
+
+class HistoryCache:
+    """
+    LRU cache of history windows keyed by (file, station, sensor, metric,
+    hours), bounded by the bytes its columns hold. A window is never thrown
+    away because new rows arrived: the rows above its `max_id` are read by id
+    and appended, and points that slid out of the window are trimmed from the
+    front. Windows are replaced rather than modified, so a request thread can
+    keep encoding the arrays it was handed.
+    """
+    def __init__(self, max_bytes=DEFAULT_HISTORY_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._windows = OrderedDict()
+        self._lock = Lock()
+        HISTORY_CACHE_BYTES.set_function(lambda: self.nbytes)
+
+    def get(self, db, station_id, sensor, metric, hours, max_id):
+        """
+        Returns (epoch ms, values) arrays for the window, as of row `max_id` or
+        later. `db` is the file's DatabaseManager, used on a miss or to extend.
+        """
+        key = (db.db_path, station_id, sensor, metric, hours)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None:
+                self._windows.move_to_end(key)
+
+        if window is None or max_id < window.max_id:
+            # Not cached, or the file was replaced by one with fewer rows
+            HISTORY_CACHE_REQUESTS.labels('miss').inc()
+            times, values = db.get_historical_columns(station_id, sensor, metric, hours, max_id=max_id)
+            window = HistoryWindow(times, values, max_id)
+        elif max_id > window.max_id:
+            HISTORY_CACHE_REQUESTS.labels('extend').inc()
+            newest, times, values = db.get_series_since(station_id, sensor, metric, window.max_id)
+            window = HistoryWindow(*_merge(window.times, window.values, times, values), max(newest, max_id))
+        else:
+            HISTORY_CACHE_REQUESTS.labels('hit').inc()
+
+        cutoff = (time.time() - hours * 3600) * 1000
+        if window.times and window.times[0] < cutoff:
+            i = bisect_left(window.times, cutoff)
+            window = HistoryWindow(window.times[i:], window.values[i:], window.max_id)
+        self._store(key, window)
+        return window.times, window.values
+
+    def _store(self, key, window):
+        with self._lock:
+            old = self._windows.get(key)
+            if old is window:
+                return
+            if old is not None:
+                if old.max_id > window.max_id:
+                    # Another request already stored a newer copy
+                    return
+                self.nbytes -= old.nbytes
+                del self._windows[key]
+            if window.nbytes > self.max_bytes:
+                return
+            self._windows[key] = window
+            self.nbytes += window.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._windows.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+            self.nbytes = 0
+
+def _merge(times, values, new_times, new_values):
+    """
+    Appends new points to sorted columns. Rows normally arrive in time order;
+    late ones (LoRa retries, spool replays) are merged into place.
+    """
+    if not new_times:
+        return times, values
+    if all(a <= b for a, b in zip(new_times, new_times[1:])) and (not times or new_times[0] >= times[-1]):
+        return times + new_times, values + new_values
+    points = sorted(zip(list(times) + list(new_times), list(values) + list(new_values)), key=lambda p: p[0])
+    return array('d', (t for t, _ in points)), array('d', (v for _, v in points))
+
+class DashboardData:
+    """
+    The dashboard's data layer, shared by every request thread of a process:
+    one open DatabaseManager per station file, one station -> file map and one
+    cache of the latest readings. The map is built lazily from each file's
+    station ids, so any route works on the first request, not only after the
+    dashboard page has been rendered.
+    """
+    def __init__(self, db_paths_fn, config_fn, history_cache_bytes=DEFAULT_HISTORY_CACHE_MB * 1024 * 1024):
+        self.db_paths_fn = db_paths_fn
+        self.config_fn = config_fn
+        self.history = HistoryCache(history_cache_bytes)
+        self._dbs = {}
+        self._db_lock = Lock()
+        self.station_db_map = {}
+        self._map_lock = Lock()
+        self._last_scan = 0.0
+        self.cache = {'data': None, 'last_updated': 0, 'version': None}
+        self._cache_lock = Lock()
+
+    def db(self, db_path):
+        """Returns the shared DatabaseManager for a file, opening it on first use."""
+        with self._db_lock:
+            db = self._dbs.get(db_path)
+            if db is None:
+                db = self._dbs[db_path] = DatabaseManager(db_path)
+            return db
+
+    def _prune(self, db_paths):
+        """Closes files that are gone, e.g. moved away by a single-store migration."""
+        with self._db_lock:
+            gone = set(self._dbs) - set(db_paths)
+            for db_path in gone:
+                self._dbs.pop(db_path).close()
+        if gone:
+            self.history.clear()
+
+    def refresh_station_map(self, db_paths=None):
+        """Rebuilds the station -> file map from every database's station ids."""
+        db_paths = self.db_paths_fn() if db_paths is None else db_paths
+        self._prune(db_paths)
+        mapping = {}
+        for db_path in sorted(db_paths):
+            try:
+                for station_id in self.db(db_path).get_station_ids():
+                    mapping[station_id] = db_path
+            except Exception as e:
+                log.error("[Dashboard] Error reading stations from %s: %s", db_path, e)
+        with self._map_lock:
+            self.station_db_map = mapping
+            self._last_scan = time.monotonic()
+        return mapping
+
+    def db_path_for(self, station_id):
+        """The file holding a station's readings, or None if no database has it."""
+        with self._map_lock:
+            db_path = self.station_db_map.get(station_id)
+            stale = time.monotonic() - self._last_scan >= STATION_RESCAN_SECONDS
+        if db_path and os.path.exists(db_path):
+            return db_path
+        if not stale:
+            return None
+        return self.refresh_station_map().get(station_id)
+
+    def latest_readings(self, version=None):
+        """
+        Returns the latest readings for every station with labels and units. When a
+        data version is given, the cache is reused for as long as it is unchanged.
+        """
+        with self._cache_lock:
+            now = time.time()
+            cache = self.cache
+            if cache['data']:
+                if version is not None and cache['version'] == version:
+                    CACHE_REQUESTS.labels('hit').inc()
+                    return cache['data']
+                if version is None and (now - cache['last_updated'] < CACHE_LIFETIME_SECONDS):
+                    CACHE_REQUESTS.labels('hit').inc()
+                    return cache['data']
+
+            CACHE_REQUESTS.labels('miss').inc()
+            log.debug("[Dashboard] Cache expired. Rebuilding data from databases.")
+            config = self.config_fn()
+            db_paths = self.db_paths_fn()
+            self._prune(db_paths)
+
+            latest_data_by_station, mapping = {}, {}
+            for db_path in sorted(db_paths):
+                try:
+                    data = self.db(db_path).get_latest_readings_by_station()
+                except Exception as e:
+                    log.error("[Dashboard] Error reading from %s: %s", db_path, e)
+                    continue
+                for station_id in data:
+                    mapping[station_id] = db_path
+                latest_data_by_station.update(data)
+            with self._map_lock:
+                self.station_db_map = mapping
+                self._last_scan = time.monotonic()
+
+            for readings in latest_data_by_station.values():
+                for key, reading in readings.items():
+                    reading['label'], reading['unit'] = label_and_unit(config, reading['sensor'], reading['metric'], key)
+
+            CACHE_REBUILD_SECONDS.observe(time.time() - now)
+            cache['data'] = latest_data_by_station
+            cache['last_updated'] = now
+            cache['version'] = version
+            return cache['data']
@@ -1,8 +1,40 @@
 # database.py
 import sqlite3
 import os
+import bisect
 import datetime
-from threading import Lock
+import logging
+import urllib.request
+from array import array
+from collections import namedtuple
+
+import metrics
+
+# Lightweight row records used by the streaming query methods
+Reading = namedtuple('Reading', 'id timestamp station_id sensor metric value rssi')
+HistoryPoint = namedtuple('HistoryPoint', 'timestamp value')
+BucketStats = namedtuple('BucketStats', 'station_id bucket count total minimum maximum')
+READING_COLUMNS = "r.id, r.timestamp, r.station_id, r.sensor, r.metric, r.value, r.rssi"
+
+COMMIT_SECONDS = metrics.histogram('ws_db_commit_seconds', "Time taken to commit a write to SQLite.")
+WRITE_ERRORS = metrics.counter('ws_db_write_errors_total', "Readings that could not be written to SQLite.")
+
+log = logging.getLogger(__name__)
+
+def read_max_id(db_path):
+    """
+    Returns the newest row id in a database file, or 0 if it is empty or missing.
+    Opens the file read-only, so it never creates a database or its tables.
+    """
+    uri = f"file:{urllib.request.pathname2url(os.path.abspath(db_path))}?mode=ro"
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            return conn.execute("SELECT MAX(id) FROM readings").fetchone()[0] or 0
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return 0
 
 class DatabaseManager:
     """
@@ -11,7 +43,7 @@ class DatabaseManager:
     """
     def __init__(self, db_path):
         self.db_path = db_path
-        self._lock = Lock()
+        self._lock = metrics.InstrumentedLock('database')
         self.conn = None
         try:
             # Ensure the directory for the database exists
@@ -29,16 +61,41 @@ class DatabaseManager:
             self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
             # Use the Row factory to access columns by name
             self.conn.row_factory = sqlite3.Row
-            print(f"[Database] Connected to {self.db_path}")
+            # WAL lets the streaming readers' own connections run alongside this writer
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            log.debug("[Database] Connected to %s", self.db_path)
         except sqlite3.Error as e:
-            print(f"[Database] ERROR: Could not connect to database: {e}")
+            log.error("[Database] Could not connect to database: %s", e)
             raise
 
     def close(self):
         """Closes the database connection."""
         if self.conn:
             self.conn.close()
-            print(f"[Database] Disconnected from {self.db_path}")
+            log.debug("[Database] Disconnected from %s", self.db_path)
+
+    def reconnect(self):
+        """
+        Reopens the database after its drive was removed and mounted again.
+        Unlike the constructor it never creates the directory, so it fails
+        rather than writing to an empty mount point. Returns True on success.
+        """
+        if not os.path.isdir(os.path.dirname(self.db_path) or '.'):
+            return False
+        with self._lock:
+            try:
+                if self.conn:
+                    self.conn.close()
+            except sqlite3.Error:
+                pass  # The old file handle may already be gone with the drive
+            try:
+                self.connect()
+                self.conn.execute("SELECT 1 FROM readings LIMIT 1").fetchall()
+            except sqlite3.Error as e:
+                log.debug("[Database] Reconnect to %s failed: %s", self.db_path, e)
+                return False
+        self.create_tables()
+        return True
 
     def create_tables(self):
         """Creates the necessary tables if they don't already exist."""
@@ -56,9 +113,51 @@ class DatabaseManager:
                         rssi REAL
                     )
                 ''')
+                # Partitions rows by station and series so per-station, per-series
+                # and cross-station queries are index range scans in one file
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_readings_station_series
+                    ON readings (station_id, sensor, metric, timestamp)
+                ''')
+                # Individual rain gauge tip times, stored per flush as
+                # millisecond offsets from the first tip
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS rain_tips (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        station_id INTEGER NOT NULL,
+                        sensor TEXT NOT NULL,
+                        start_timestamp TEXT NOT NULL,
+                        tip_count INTEGER NOT NULL,
+                        offsets_ms BLOB NOT NULL
+                    )
+                ''')
+                # Per-station files merged into this store, so a merge whose
+                # source was not moved aside (e.g. a crash) is not copied again
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS merged_sources (
+                        path TEXT PRIMARY KEY,
+                        merged_at TEXT NOT NULL,
+                        row_count INTEGER NOT NULL
+                    )
+                ''')
+                # Spool files already replayed into this database, so a replay
+                # interrupted after its commit is never applied twice
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS spool_replays (
+                        spool_id TEXT PRIMARY KEY,
+                        replayed_at TEXT NOT NULL,
+                        row_count INTEGER NOT NULL,
+                        end_offset INTEGER
+                    )
+                ''')
+                # Markers written before offsets were tracked have a NULL end_offset
+                # and cover the whole spool
+                columns = [row[1] for row in cursor.execute("PRAGMA table_info(spool_replays)")]
+                if 'end_offset' not in columns:
+                    cursor.execute("ALTER TABLE spool_replays ADD COLUMN end_offset INTEGER")
                 self.conn.commit()
             except sqlite3.Error as e:
-                print(f"[Database] ERROR: Could not create tables: {e}")
+                log.error("[Database] Could not create tables: %s", e)
 
     def write_reading(self, station_id, sensor, metric, value, rssi=None, timestamp=None):
         """Writes a single sensor reading to the database."""
@@ -70,78 +169,426 @@ class DatabaseManager:
                     "INSERT INTO readings (timestamp, station_id, sensor, metric, value, rssi) VALUES (?, ?, ?, ?, ?, ?)",
                     (ts, station_id, sensor, metric, value, rssi)
                 )
-                self.conn.commit()
+                with COMMIT_SECONDS.time():
+                    self.conn.commit()
                 return cursor.lastrowid
             except sqlite3.Error as e:
-                print(f"[Database] ERROR: Failed to write reading: {e}")
+                WRITE_ERRORS.inc()
+                log.error("[Database] Failed to write reading: %s", e)
                 return None
 
-    def get_latest_readings_by_station(self):
+    def write_readings(self, rows):
         """
-        Retrieves the most recent reading for each sensor/metric combination,
-        grouped by station ID.
+        Writes many readings in one transaction. `rows` are
+        (timestamp, station_id, sensor, metric, value, rssi) tuples.
+        Returns the number of rows written, or None if the batch failed.
         """
         with self._lock:
             try:
-                cursor = self.conn.cursor()
-                # This query efficiently gets the full row for the latest timestamp
-                # for each unique combination of station, sensor, and metric.
-                query = """
-                    SELECT r.* FROM readings r
-                    INNER JOIN (
-                        SELECT station_id, sensor, metric, MAX(timestamp) AS max_ts
-                        FROM readings
-                        GROUP BY station_id, sensor, metric
-                    ) AS latest ON r.station_id = latest.station_id
-                               AND r.sensor = latest.sensor
-                               AND r.metric = latest.metric
-                               AND r.timestamp = latest.max_ts;
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                data_by_station = {}
-                for row in rows:
-                    station_id = row['station_id']
-                    if station_id not in data_by_station:
-                        data_by_station[station_id] = {}
-                    # Create a unique key for the dashboard (e.g., 'soil-temp-c')
-                    key = f"{row['sensor']}-{row['metric']}"
-                    data_by_station[station_id][key] = dict(row)
-                return data_by_station
+                self.conn.executemany(
+                    "INSERT INTO readings (timestamp, station_id, sensor, metric, value, rssi) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                with COMMIT_SECONDS.time():
+                    self.conn.commit()
+                return len(rows)
+            except sqlite3.Error as e:
+                try:
+                    self.conn.rollback()
+                except sqlite3.Error:
+                    pass  # e.g. the drive holding the file was removed
+                WRITE_ERRORS.inc(len(rows))
+                log.error("[Database] Failed to write %d readings: %s", len(rows), e)
+                return None
+
+    def replay_spool(self, spool_id, rows, offsets):
+        """
+        Writes readings recovered from a spool file, together with a marker for
+        `spool_id`, in one transaction. `offsets` are the rows' (increasing)
+        positions in the spool; the marker keeps the last one, so rows appended
+        to the same spool after a replay are picked up by the next one and
+        rows already replayed here are skipped. Returns the number of rows
+        written, 0 if there were none left to replay, or None if it failed.
+        """
+        with self._lock:
+            try:
+                with self.conn:
+                    marker = self.conn.execute("SELECT end_offset FROM spool_replays WHERE spool_id = ?",
+                                               (spool_id,)).fetchone()
+                    if marker and marker[0] is None:
+                        return 0
+                    pending = rows[bisect.bisect_right(offsets, marker[0]):] if marker else rows
+                    if not pending:
+                        return 0
+                    self.conn.executemany(
+                        "INSERT INTO readings (timestamp, station_id, sensor, metric, value, rssi) VALUES (?, ?, ?, ?, ?, ?)",
+                        pending
+                    )
+                    self.conn.execute(
+                        "INSERT INTO spool_replays (spool_id, replayed_at, row_count, end_offset) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (spool_id) DO UPDATE SET replayed_at = excluded.replayed_at, "
+                        "row_count = row_count + excluded.row_count, end_offset = excluded.end_offset",
+                        (spool_id, datetime.datetime.now(datetime.timezone.utc).isoformat(), len(pending), offsets[-1])
+                    )
+                return len(pending)
+            except sqlite3.Error as e:
+                log.error("[Database] Failed to replay spool %s: %s", spool_id, e)
+                return None
+
+    def write_tip_batch(self, station_id, sensor, tip_times):
+        """Stores a batch of epoch-second tip times as one compact row."""
+        first = tip_times[0]
+        offsets = array('I', (int(round((t - first) * 1000)) for t in tip_times))
+        ts = datetime.datetime.fromtimestamp(first, datetime.timezone.utc).isoformat()
+        with self._lock:
+            try:
+                self.conn.execute(
+                    "INSERT INTO rain_tips (station_id, sensor, start_timestamp, tip_count, offsets_ms) VALUES (?, ?, ?, ?, ?)",
+                    (station_id, sensor, ts, len(offsets), offsets.tobytes())
+                )
+                with COMMIT_SECONDS.time():
+                    self.conn.commit()
             except sqlite3.Error as e:
-                print(f"[Database] ERROR: Could not fetch latest readings: {e}")
-                return {}
+                WRITE_ERRORS.inc()
+                log.error("[Database] Failed to write rain tips: %s", e)
+
+    def iter_tip_times(self, station_id, sensor, start=None):
+        """Yields the individual tip times (epoch seconds) stored with write_tip_batch."""
+        query = "SELECT start_timestamp, offsets_ms FROM rain_tips WHERE station_id = ? AND sensor = ?"
+        params = [station_id, sensor]
+        if start:
+            query += " AND start_timestamp >= ?"
+            params.append(start)
+        for start_ts, blob in self._iter_query(query + " ORDER BY id", params, what="fetch rain tips"):
+            first = datetime.datetime.fromisoformat(start_ts).timestamp()
+            offsets = array('I')
+            offsets.frombytes(blob)
+            for offset in offsets:
+                yield first + offset / 1000.0
+
+    def merge_from(self, source_path):
+        """
+        Copies every reading from another database file into this one in a
+        single transaction, oldest first, together with a marker for the file's
+        resolved path. The marker is keyed on the path alone, since attaching a
+        WAL database can checkpoint it and change its size and mtime. Row ids
+        are reassigned. Returns the number of rows copied, 0 if this file was
+        already merged, or None if the merge failed and was rolled back.
+        """
+        if not os.path.isfile(source_path):
+            # ATTACH would create an empty database in its place
+            log.error("[Database] Could not open %s for merging: no such file.", source_path)
+            return None
+        source = os.path.realpath(source_path)
+        with self._lock:
+            try:
+                if self.conn.execute("SELECT 1 FROM merged_sources WHERE path = ?", (source,)).fetchone():
+                    log.info("[Database] %s was already merged into %s.", source_path, self.db_path)
+                    return 0
+                self.conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+            except sqlite3.Error as e:
+                log.error("[Database] Could not open %s for merging: %s", source_path, e)
+                return None
+            try:
+                with self.conn:
+                    cursor = self.conn.execute(
+                        "INSERT INTO readings (timestamp, station_id, sensor, metric, value, rssi) "
+                        "SELECT timestamp, station_id, sensor, metric, value, rssi FROM source.readings ORDER BY id"
+                    )
+                    copied = cursor.rowcount
+                    has_tips = self.conn.execute(
+                        "SELECT 1 FROM source.sqlite_master WHERE type = 'table' AND name = 'rain_tips'").fetchone()
+                    if has_tips:
+                        self.conn.execute(
+                            "INSERT INTO rain_tips (station_id, sensor, start_timestamp, tip_count, offsets_ms) "
+                            "SELECT station_id, sensor, start_timestamp, tip_count, offsets_ms FROM source.rain_tips ORDER BY id"
+                        )
+                    self.conn.execute(
+                        "INSERT INTO merged_sources (path, merged_at, row_count) VALUES (?, ?, ?)",
+                        (source, datetime.datetime.now(datetime.timezone.utc).isoformat(), copied)
+                    )
+                return copied
+            except sqlite3.Error as e:
+                log.error("[Database] Could not merge %s: %s", source_path, e)
+                return None
+            finally:
+                try:
+                    self.conn.execute("DETACH DATABASE source")
+                except sqlite3.Error as e:
+                    log.debug("[Database] Could not detach %s: %s", source_path, e)
+
+    def _read_connection(self):
+        """
+        Opens a read-only connection for one streaming query. Read-only mode
+        never creates the file, so a missing drive fails instead of leaving an
+        empty database behind.
+        """
+        uri = f"file:{urllib.request.pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _iter_query(self, query, params=(), batch_size=500, record=None, what="query"):
+        """
+        Runs a query and yields its rows in batches of `batch_size` using fetchmany.
+        Each query streams from its own read-only connection, which sees one
+        consistent snapshot however long it is consumed, so it neither holds the
+        lock nor is disturbed by commits and rollbacks on the writer connection.
+        Rows are plain tuples, or `record` instances when a namedtuple is given.
+        """
+        try:
+            conn = self._read_connection()
+        except sqlite3.Error as e:
+            log.error("[Database] Could not %s: %s", what, e)
+            return
+        try:
+            try:
+                cursor = conn.execute(query, params)
+            except sqlite3.Error as e:
+                log.error("[Database] Could not %s: %s", what, e)
+                return
+            while True:
+                try:
+                    rows = cursor.fetchmany(batch_size)
+                except sqlite3.Error as e:
+                    log.error("[Database] Could not %s: %s", what, e)
+                    return
+                if not rows:
+                    break
+                if record:
+                    yield from map(record._make, rows)
+                else:
+                    yield from rows
+        finally:
+            conn.close()
+
+    def iter_latest_readings(self, batch_size=500):
+        """
+        Yields the most recent Reading for each station/sensor/metric combination.
+        """
+        # This query efficiently gets the full row for the latest timestamp
+        # for each unique combination of station, sensor, and metric.
+        query = f"""
+            SELECT {READING_COLUMNS} FROM readings r
+            INNER JOIN (
+                SELECT station_id, sensor, metric, MAX(timestamp) AS max_ts
+                FROM readings
+                GROUP BY station_id, sensor, metric
+            ) AS latest ON r.station_id = latest.station_id
+                       AND r.sensor = latest.sensor
+                       AND r.metric = latest.metric
+                       AND r.timestamp = latest.max_ts;
+        """
+        return self._iter_query(query, batch_size=batch_size, record=Reading, what="fetch latest readings")
+
+    def get_latest_readings_by_station(self):
+        """
+        Retrieves the most recent reading for each sensor/metric combination,
+        grouped by station ID.
+        """
+        data_by_station = {}
+        for reading in self.iter_latest_readings():
+            # Create a unique key for the dashboard (e.g., 'soil-temp-c')
+            key = f"{reading.sensor}-{reading.metric}"
+            data_by_station.setdefault(reading.station_id, {})[key] = reading._asdict()
+        return data_by_station
+
+    def iter_historical_data(self, station_id, sensor, metric, hours, batch_size=500):
+        """
+        Yields HistoryPoint(timestamp, value) records for a specific sensor and
+        metric over a given number of hours, oldest first.
+        """
+        # Query for data within the specified time window
+        query = """
+            SELECT timestamp, value FROM readings 
+            WHERE station_id = ? AND sensor = ? AND metric = ? AND timestamp >= datetime('now', '-' || ? || ' hours') 
+            ORDER BY timestamp ASC
+        """
+        return self._iter_query(query, (station_id, sensor, metric, hours), batch_size,
+                                record=HistoryPoint, what="fetch historical data")
 
     def get_historical_data(self, station_id, sensor, metric, hours):
         """
         Retrieves historical data for a specific sensor and metric over a
         given number of hours.
         """
+        return [point._asdict() for point in self.iter_historical_data(station_id, sensor, metric, hours)]
+
+    def get_historical_columns(self, station_id, sensor, metric, hours, max_id=None, batch_size=2000):
+        """
+        Returns the same window as get_historical_data as two arrays: epoch
+        milliseconds and values. SQLite converts the timestamps, so no per-row
+        datetime parsing or dicts are needed. With `max_id`, rows inserted
+        after that id are left out.
+        """
+        query = """
+            SELECT CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER), value FROM readings
+            WHERE station_id = ? AND sensor = ? AND metric = ? AND timestamp >= datetime('now', '-' || ? || ' hours')
+        """
+        params = [station_id, sensor, metric, hours]
+        if max_id is not None:
+            query += " AND id <= ?"
+            params.append(max_id)
+        query += " ORDER BY timestamp ASC"
+        times, values = array('d'), array('d')
+        for ms, value in self._iter_query(query, params, batch_size, what="fetch historical data"):
+            times.append(ms)
+            values.append(value)
+        return times, values
+
+    def get_series_since(self, station_id, sensor, metric, after_id, batch_size=2000):
+        """
+        Returns (newest id, epoch ms array, value array) for one series' rows
+        with an id above `after_id`, in insertion order. The unary '+' keeps
+        SQLite on the rowid range, so only the new rows are visited.
+        """
+        query = """
+            SELECT id, CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER), value FROM readings
+            WHERE id > ? AND +station_id = ? AND +sensor = ? AND +metric = ?
+            ORDER BY id ASC
+        """
+        newest, times, values = after_id, array('d'), array('d')
+        for row_id, ms, value in self._iter_query(query, (after_id, station_id, sensor, metric), batch_size,
+                                                  what="fetch new readings"):
+            newest = row_id
+            times.append(ms)
+            values.append(value)
+        return newest, times, values
+
+    def iter_readings(self, station_id=None, series=None, start=None, end=None, batch_size=500):
+        """
+        Yields (timestamp, station_id, sensor, metric, value, rssi) tuples matching
+        the given filters, in insertion order. `series` is a list of (sensor, metric)
+        pairs. Rows are pulled from the cursor with fetchmany, so memory use stays
+        constant no matter how large the time range is.
+        """
+        clauses, params = [], []
+        if station_id is not None:
+            clauses.append("station_id = ?")
+            params.append(station_id)
+        if series:
+            clauses.append("(" + " OR ".join("(sensor = ? AND metric = ?)" for _ in series) + ")")
+            for sensor, metric in series:
+                params.extend((sensor, metric))
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        query = "SELECT timestamp, station_id, sensor, metric, value, rssi FROM readings"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id ASC"
+        return self._iter_query(query, params, batch_size, what="export readings")
+
+    def get_station_ids(self):
+        """
+        Returns the distinct station ids in the table. Each step is a single
+        index seek past the previous id, so it costs one lookup per station
+        rather than a scan of every row.
+        """
+        station_ids, last = [], None
         with self._lock:
             try:
-                cursor = self.conn.cursor()
-                # Query for data within the specified time window
-                query = """
-                    SELECT timestamp, value FROM readings 
-                    WHERE station_id = ? AND sensor = ? AND metric = ? AND timestamp >= datetime('now', '-' || ? || ' hours') 
-                    ORDER BY timestamp ASC
-                """
-                cursor.execute(query, (station_id, sensor, metric, hours))
-                return [dict(row) for row in cursor.fetchall()]
+                while True:
+                    if last is None:
+                        row = self.conn.execute("SELECT MIN(station_id) FROM readings").fetchone()
+                    else:
+                        row = self.conn.execute("SELECT MIN(station_id) FROM readings WHERE station_id > ?", (last,)).fetchone()
+                    if row[0] is None:
+                        return station_ids
+                    last = row[0]
+                    station_ids.append(last)
             except sqlite3.Error as e:
-                print(f"[Database] ERROR: Could not fetch historical data: {e}")
-                return []
+                log.error("[Database] Could not fetch station ids: %s", e)
+                return station_ids
 
-    def get_unsent_lora_data(self, station_id, last_sent_id, limit=10):
+    def get_series(self):
         """
-        Retrieves a batch of readings that have not yet been sent via LoRa.
+        Returns every distinct (station_id, sensor, metric) in the table. Like
+        get_station_ids, each step is one seek along the series index.
         """
+        series, last = [], None
         with self._lock:
             try:
-                cursor = self.conn.cursor()
-                query = "SELECT * FROM readings WHERE station_id = ? AND id > ? ORDER BY id ASC LIMIT ?"
-                cursor.execute(query, (station_id, last_sent_id, limit))
-                return [dict(row) for row in cursor.fetchall()]
+                while True:
+                    if last is None:
+                        row = self.conn.execute(
+                            "SELECT station_id, sensor, metric FROM readings "
+                            "ORDER BY station_id, sensor, metric LIMIT 1").fetchone()
+                    else:
+                        row = self.conn.execute(
+                            "SELECT station_id, sensor, metric FROM readings WHERE (station_id, sensor, metric) > (?, ?, ?) "
+                            "ORDER BY station_id, sensor, metric LIMIT 1", last).fetchone()
+                    if row is None:
+                        return series
+                    last = tuple(row)
+                    series.append(last)
             except sqlite3.Error as e:
-                print(f"[Database] ERROR: Could not fetch unsent LoRa data: {e}")
-                return []
+                log.error("[Database] Could not fetch series: %s", e)
+                return series
+
+    def iter_bucket_stats(self, sensor, metric, start, end=None, bucket_seconds=3600, station_ids=None, batch_size=500):
+        """
+        Yields BucketStats(station_id, bucket, count, total, minimum, maximum)
+        for one series, grouped by station and by time bucket in a single SQL
+        pass. `bucket` is the bucket's start as epoch seconds; `start` and `end`
+        are ISO 8601 timestamps. Restricting the query to explicit station ids
+        lets SQLite use the (station_id, sensor, metric, timestamp) index.
+        """
+        if station_ids is None:
+            station_ids = self.get_station_ids()
+        if not station_ids:
+            return iter(())
+        bucket_seconds = max(1, int(bucket_seconds))
+        clauses = [f"station_id IN ({', '.join('?' for _ in station_ids)})", "sensor = ?", "metric = ?", "timestamp >= ?"]
+        params = [*station_ids, sensor, metric, start]
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        query = f"""
+            SELECT station_id,
+                   CAST(strftime('%s', timestamp) AS INTEGER) / {bucket_seconds} * {bucket_seconds} AS bucket,
+                   COUNT(value), SUM(value), MIN(value), MAX(value)
+            FROM readings
+            WHERE {' AND '.join(clauses)}
+            GROUP BY station_id, bucket
+            ORDER BY station_id, bucket
+        """
+        return self._iter_query(query, params, batch_size, record=BucketStats, what="aggregate readings")
+
+    def iter_unsent_lora_data(self, station_id, last_sent_id, limit=10, batch_size=500):
+        """
+        Yields Reading records that have not yet been sent via LoRa, oldest first.
+        """
+        query = f"SELECT {READING_COLUMNS} FROM readings r WHERE station_id = ? AND id > ? ORDER BY id ASC LIMIT ?"
+        return self._iter_query(query, (station_id, last_sent_id, limit), batch_size,
+                                record=Reading, what="fetch unsent LoRa data")
+
+    def iter_readings_after(self, last_id, batch_size=500, limit=None):
+        """
+        Yields every Reading with an id greater than `last_id`, oldest first, or
+        the first `limit` of them. Used to tail the table for new rows without
+        scanning it.
+        """
+        query = f"SELECT {READING_COLUMNS} FROM readings r WHERE id > ? ORDER BY id ASC"
+        params = (last_id,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        return self._iter_query(query, params, batch_size, record=Reading, what="fetch new readings")
+
+    def get_max_id(self):
+        """Returns the id of the newest row, or 0 for an empty table."""
+        with self._lock:
+            try:
+                row = self.conn.execute("SELECT MAX(id) FROM readings").fetchone()
+                return row[0] or 0
+            except sqlite3.Error as e:
+                log.error("[Database] Could not fetch max id: %s", e)
+                return 0
+
+    def get_unsent_lora_data(self, station_id, last_sent_id, limit=10):
+        """
+        Retrieves a batch of readings that have not yet been sent via LoRa.
+        """
+        return [reading._asdict() for reading in self.iter_unsent_lora_data(station_id, last_sent_id, limit)]
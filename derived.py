@@ -0,0 +1,296 @@
+# derived.py
+import math
+import time
+import logging
+import datetime
+from collections import deque
+from threading import Lock
+
+from handlers import BaseHandler
+from ingest import IngestPipeline
+
+log = logging.getLogger(__name__)
+
+# Derived series are stored like any other reading under this sensor name,
+# with the derived metric's name as the metric.
+DERIVED_SENSOR = 'derived'
+
+def _epoch(timestamp):
+    dt = datetime.datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+def _series(spec):
+    return (spec['sensor'], spec['metric'])
+
+class SlidingWindow:
+    """
+    Running sum, count and maximum over the last `window_seconds` of samples.
+    Each sample is added and evicted once, so updates are O(1) amortized.
+    """
+    def __init__(self, window_seconds):
+        self.window = window_seconds
+        self.samples = deque()
+        self.maxima = deque()  # Decreasing values, for the window maximum
+        self.total = 0.0
+
+    def add(self, t, value):
+        self.samples.append((t, value))
+        self.total += value
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((t, value))
+
+    def evict(self, now):
+        cutoff = now - self.window
+        while self.samples and self.samples[0][0] <= cutoff:
+            self.total -= self.samples.popleft()[1]
+        while self.maxima and self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+        if not self.samples:
+            self.total = 0.0  # Clears accumulated rounding error
+
+    def __len__(self):
+        return len(self.samples)
+
+class WindowMetric:
+    """
+    A statistic over a sliding window of one input series.
+    kind is 'mean', 'max', 'sum' or 'rate' (sum scaled to `per_seconds`,
+    e.g. rain tips as mm/h). 'sum' and 'rate' report 0 for an empty window.
+    """
+    def __init__(self, spec):
+        self.kind = spec['type']
+        self.inputs = [_series(spec['input'])]
+        self.lookback = spec.get('window_seconds', 600)
+        self.per_seconds = spec.get('per_seconds', 3600)
+        self.window = SlidingWindow(self.lookback)
+
+    def add(self, series, t, value):
+        self.window.add(t, value)
+
+    def value(self, now):
+        self.window.evict(now)
+        if self.kind == 'sum':
+            return self.window.total
+        if self.kind == 'rate':
+            return self.window.total * self.per_seconds / self.lookback
+        if not self.window:
+            return None
+        if self.kind == 'max':
+            return self.window.maxima[0][1]
+        return self.window.total / len(self.window)
+
+class VectorMeanMetric:
+    """
+    Vector-averaged direction in degrees over a sliding window, so that 350°
+    and 10° average to 0° rather than 180°. `scale` converts the input to
+    degrees, e.g. 45 for a vane reporting one of eight gear positions.
+    """
+    def __init__(self, spec):
+        self.inputs = [_series(spec['input'])]
+        self.lookback = spec.get('window_seconds', 600)
+        self.scale = spec.get('scale', 1.0)
+        self.sin = SlidingWindow(self.lookback)
+        self.cos = SlidingWindow(self.lookback)
+
+    def add(self, series, t, value):
+        angle = math.radians(value * self.scale)
+        self.sin.add(t, math.sin(angle))
+        self.cos.add(t, math.cos(angle))
+
+    def value(self, now):
+        self.sin.evict(now)
+        self.cos.evict(now)
+        if not self.sin:
+            return None
+        return round(math.degrees(math.atan2(self.sin.total, self.cos.total)), 6) % 360
+
+class DewPointMetric:
+    """Dew point in °C from the latest temperature and relative humidity (Magnus formula)."""
+    B, C = 17.62, 243.12
+
+    def __init__(self, spec):
+        self.temperature = _series(spec['temperature'])
+        self.humidity = _series(spec['humidity'])
+        self.inputs = [self.temperature, self.humidity]
+        self.lookback = spec.get('max_age_seconds', 1800)
+        self.latest = {}
+
+    def add(self, series, t, value):
+        self.latest[series] = (t, value)
+
+    def value(self, now):
+        temp, rh = self.latest.get(self.temperature), self.latest.get(self.humidity)
+        if not temp or not rh or now - min(temp[0], rh[0]) > self.lookback or rh[1] <= 0:
+            return None
+        gamma = math.log(rh[1] / 100.0) + self.B * temp[1] / (self.C + temp[1])
+        return self.C * gamma / (self.B - gamma)
+
+class GrowingDegreeDaysMetric:
+    """
+    Growing degree days accumulated since `season_start` ("MM-DD", local time),
+    using each day's (max + min) / 2 above `base_c`, optionally capped at
+    `upper_c`. Today's partial value is included. Each reading's season is
+    worked out from its own date, so the total resets at the first reading of
+    a new season even if none arrived on the start day itself.
+    """
+    def __init__(self, spec):
+        self.inputs = [_series(spec['input'])]
+        self.base = spec.get('base_c', 10.0)
+        self.upper = spec.get('upper_c')
+        self.season_start = spec.get('season_start', '01-01')
+        self.completed = 0.0
+        self.season = self.day = None
+        self.low = self.high = None
+
+    def _season_of(self, day):
+        """The date the season containing `day` started."""
+        month, start_day = (int(part) for part in self.season_start.split('-'))
+        start = datetime.date(day.year, month, start_day)
+        if start > day:
+            start = start.replace(year=day.year - 1)
+        return start
+
+    @property
+    def lookback(self):
+        """Seconds since the current season started, replayed on warm-up."""
+        now = time.time()
+        start = self._season_of(datetime.datetime.fromtimestamp(now).date())
+        return now - datetime.datetime.combine(start, datetime.time()).timestamp()
+
+    def _day_value(self):
+        if self.low is None:
+            return 0.0
+        high = min(self.high, self.upper) if self.upper is not None else self.high
+        return max(0.0, (high + self.low) / 2.0 - self.base)
+
+    def add(self, series, t, value):
+        day = datetime.datetime.fromtimestamp(t).date()
+        if self.day is not None and day < self.day:
+            return  # Late reading for a day that is already closed
+        if day != self.day:
+            season = self._season_of(day)
+            if self.day is not None and season == self.season:
+                self.completed += self._day_value()
+            else:
+                self.completed = 0.0
+            self.season, self.day, self.low, self.high = season, day, value, value
+        else:
+            self.low, self.high = min(self.low, value), max(self.high, value)
+
+    def value(self, now):
+        if self.day is None:
+            return None
+        if self._season_of(datetime.datetime.fromtimestamp(now).date()) != self.season:
+            return 0.0  # A new season with no readings yet
+        return self.completed + self._day_value()
+
+METRIC_TYPES = {
+    'mean': WindowMetric,
+    'max': WindowMetric,
+    'sum': WindowMetric,
+    'rate': WindowMetric,
+    'vector_mean': VectorMeanMetric,
+    'dew_point': DewPointMetric,
+    'gdd': GrowingDegreeDaysMetric,
+}
+
+class DerivedMetricsHandler(BaseHandler):
+    """
+    Evaluates the 'derived_metrics' config section on ingest. Sensors pass each
+    new reading to record(), which only updates the streaming window state of
+    the metrics that use it; a background loop writes each derived value every
+    `interval_seconds` as an ordinary series under the 'derived' sensor, so
+    charts read it directly instead of recomputing it from raw history.
+    """
+    config_sections = {'derived_metrics', 'station_info'}
+
+    def __init__(self, config, db_manager, recent=None, ingest=None):
+        # Without a shared pipeline the handler owns one, stopped in close()
+        self.owns_ingest = ingest is None
+        self.ingest = ingest or IngestPipeline.from_config(config, db_manager, recent=recent)
+        self.metrics = {}
+        self.by_input = {}
+        self.next_due = {}
+        self._lock = Lock()
+        super().__init__(config, db_manager)
+        if self.owns_ingest:
+            self.ingest.start()
+
+    def update_interval(self):
+        """Rebuilds the derived metrics from the config and warms them from the database."""
+        self.station_id = self.config.get('station_info', {}).get('station_id', 0)
+        section = self.config.get('derived_metrics', {})
+        specs = section.get('metrics', {}) if section.get('enabled', False) else {}
+
+        metrics, by_input, next_due = {}, {}, {}
+        for name, spec in specs.items():
+            metric_class = METRIC_TYPES.get(spec.get('type'))
+            if metric_class is None:
+                log.error("[%s] Unknown type %r for derived metric '%s'.", self.name, spec.get('type'), name)
+                continue
+            try:
+                metric = metric_class(spec)
+            except (KeyError, ValueError) as e:
+                log.error("[%s] Invalid derived metric '%s': %s", self.name, name, e)
+                continue
+            metric.interval = spec.get('interval_seconds', 300)
+            metrics[name] = metric
+            next_due[name] = time.time() + metric.interval
+            for series in metric.inputs:
+                by_input.setdefault(series, []).append(metric)
+
+        self._warm(metrics, by_input)
+        with self._lock:
+            self.metrics, self.by_input, self.next_due = metrics, by_input, next_due
+
+    def _warm(self, metrics, by_input):
+        """Replays each input series' lookback from the database into the windows."""
+        if not metrics:
+            return
+        now = time.time()
+        lookback, cutoffs = {}, {}
+        for metric in metrics.values():
+            cutoffs[metric] = now - metric.lookback
+            for series in metric.inputs:
+                lookback[series] = max(lookback.get(series, 0), metric.lookback)
+        for series, seconds in lookback.items():
+            start = datetime.datetime.fromtimestamp(now - seconds, datetime.timezone.utc).isoformat()
+            for timestamp, _, _, _, value, _ in self.db.iter_readings(self.station_id, [series], start):
+                t = _epoch(timestamp)
+                for metric in by_input[series]:
+                    if t >= cutoffs[metric]:
+                        metric.add(series, t, value)
+        log.info("[%s] %d derived metrics ready.", self.name, len(metrics))
+
+    def record(self, sensor, metric, value, timestamp=None):
+        """Feeds one new reading from a local sensor into the derived metrics that use it."""
+        metrics = self.by_input.get((sensor, metric))
+        if not metrics:
+            return
+        t = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for derived in metrics:
+                derived.add((sensor, metric), t, value)
+
+    def loop(self):
+        while not self._stop_event.wait(1.0):
+            now = time.time()
+            due = []
+            with self._lock:
+                for name, metric in self.metrics.items():
+                    if now >= self.next_due[name]:
+                        self.next_due[name] = now + metric.interval
+                        due.append((name, metric.value(now)))
+            timestamp = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).isoformat()
+            for name, value in due:
+                if value is None:
+                    continue
+                self.ingest.submit(self.station_id, DERIVED_SENSOR, name, value, timestamp=timestamp)
+                log.debug("[%s] %s = %.2f", self.name, name, value)
+
+    def close(self):
+        if self.owns_ingest:
+            self.ingest.stop()
@@ -0,0 +1,201 @@
+# export.py
+import io
+import csv
+import sys
+import json
+import struct
+import argparse
+import datetime
+from array import array
+
+from database import DatabaseManager
+from derived import DERIVED_SENSOR
+
+CSV_HEADER = ('timestamp', 'station_id', 'sensor', 'metric', 'value', 'rssi')
+COLUMNAR_MAGIC = b"WSCOL1\n"
+EXPORT_BATCH_SIZE = 1000
+# Numbers below this (2001-09-09) are more likely a mistyped date than epoch seconds
+MIN_EPOCH_SECONDS = 1e9
+
+def split_sensor_key(sensor_key, sensor_names):
+    """
+    Splits a dashboard key like 'wind-speed-speed-ms' into (sensor, metric).
+    Longer sensor names are matched first so 'wind-speed' wins over 'wind'.
+    """
+    for s_name in sorted(sensor_names, key=len, reverse=True):
+        if sensor_key.startswith(s_name + '-'):
+            return s_name, sensor_key[len(s_name) + 1:]
+    raise ValueError(f"Could not determine sensor from key: '{sensor_key}'")
+
+def known_sensor_names(config):
+    """Returns the names of all Modbus sensors, the rain gauge and derived metrics in a config."""
+    names = [s['name'] for s in config.get('sensors', {}).values()]
+    if 'rain_gauge' in config:
+        names.append(config['rain_gauge']['name'])
+    if 'derived_metrics' in config:
+        names.append(DERIVED_SENSOR)
+    return names
+
+def normalize_timestamp(value):
+    """
+    Converts an ISO-8601 string or epoch seconds into the UTC ISO format used in
+    the readings table, so it can be compared directly against stored timestamps.
+    """
+    if value is None or value == '':
+        return None
+    # ISO first, so compact dates like '20240101' are not read as epoch seconds
+    try:
+        dt = datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        try:
+            seconds = float(value)
+        except ValueError:
+            raise ValueError(f"'{value}' is not an ISO-8601 time or epoch seconds") from None
+        if seconds < MIN_EPOCH_SECONDS:
+            raise ValueError(f"'{value}' is too small for epoch seconds; use an ISO-8601 date")
+        dt = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc).isoformat()
+
+def to_epoch_ms(timestamp):
+    """Converts a stored ISO timestamp into integer milliseconds since the epoch."""
+    dt = datetime.datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_csv(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Encodes reading tuples as CSV, yielding one chunk of text per batch."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_HEADER)
+    for batch in _batched(rows, batch_size):
+        writer.writerows(batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+def iter_columnar(rows, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Encodes reading tuples in a compact column-oriented binary format, yielding
+    one self-contained chunk per batch. Each chunk is:
+
+        uint32 row count, uint32 dictionary length, dictionary (JSON list of
+        "sensor/metric" names), then little-endian columns: int64 epoch-ms
+        timestamps, int32 station ids, uint16 series indexes into the
+        dictionary, float64 values and float64 RSSI (NaN when missing).
+
+    The stream starts with COLUMNAR_MAGIC and ends with a zero row count.
+    """
+    yield COLUMNAR_MAGIC
+    for batch in _batched(rows, batch_size):
+        series_index = {}
+        ts_col, station_col, series_col = array('q'), array('i'), array('H')
+        value_col, rssi_col = array('d'), array('d')
+        for timestamp, station_id, sensor, metric, value, rssi in batch:
+            key = f"{sensor}/{metric}"
+            idx = series_index.setdefault(key, len(series_index))
+            ts_col.append(to_epoch_ms(timestamp))
+            station_col.append(station_id)
+            series_col.append(idx)
+            value_col.append(value)
+            rssi_col.append(float('nan') if rssi is None else rssi)
+        dictionary = json.dumps(list(series_index)).encode('utf-8')
+        columns = [ts_col, station_col, series_col, value_col, rssi_col]
+        if sys.byteorder != 'little':
+            for col in columns:
+                col.byteswap()
+        yield struct.pack('<II', len(batch), len(dictionary)) + dictionary + b''.join(col.tobytes() for col in columns)
+    yield struct.pack('<II', 0, 0)
+
+def read_columnar(fileobj):
+    """Decodes a stream written by iter_columnar back into reading tuples."""
+    if fileobj.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a weather station columnar export.")
+    while True:
+        n_rows, dict_len = struct.unpack('<II', fileobj.read(8))
+        if n_rows == 0:
+            return
+        names = json.loads(fileobj.read(dict_len).decode('utf-8'))
+        columns = []
+        for typecode in ('q', 'i', 'H', 'd', 'd'):
+            col = array(typecode)
+            col.frombytes(fileobj.read(col.itemsize * n_rows))
+            if sys.byteorder != 'little':
+                col.byteswap()
+            columns.append(col)
+        for ts, station_id, idx, value, rssi in zip(*columns):
+            sensor, metric = names[idx].split('/', 1)
+            timestamp = datetime.datetime.fromtimestamp(ts / 1000, datetime.timezone.utc).isoformat()
+            yield timestamp, station_id, sensor, metric, value, (None if rssi != rssi else rssi)
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv', 'csv'),
+    'wsc': (iter_columnar, 'application/octet-stream', 'wsc'),
+}
+
+def iter_export(db_paths, fmt='csv', station_id=None, series=None, start=None, end=None):
+    """
+    Streams readings from one or more station databases in the requested format.
+    Each database is opened only while it is being read.
+    """
+    encoder = EXPORT_FORMATS[fmt][0]
+
+    def rows():
+        for db_path in db_paths:
+            db = DatabaseManager(db_path)
+            try:
+                yield from db.iter_readings(station_id, series, start, end, batch_size=EXPORT_BATCH_SIZE)
+            finally:
+                db.close()
+
+    return encoder(rows())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export weather station readings as CSV or columnar binary.")
+    parser.add_argument('--db', nargs='+', required=True, help="One or more station database files to export from.")
+    parser.add_argument('--config', default='config.json', help="Config file used to resolve --series keys.")
+    parser.add_argument('--station', type=int, help="Only export readings from this station ID.")
+    parser.add_argument('--series', action='append', help="Sensor key to export, e.g. 'soil-temp-c'. May be repeated.")
+    parser.add_argument('--start', help="Start of the time range (ISO-8601 or epoch seconds).")
+    parser.add_argument('--end', help="End of the time range, exclusive (ISO-8601 or epoch seconds).")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', help="Output format.")
+    parser.add_argument('-o', '--output', help="Output file (defaults to stdout).")
+    args = parser.parse_args(argv)
+
+    series = None
+    if args.series:
+        with open(args.config, 'r') as f:
+            names = known_sensor_names(json.load(f))
+        series = [split_sensor_key(key, names) for key in args.series]
+
+    chunks = iter_export(args.db, args.format, args.station, series,
+                         normalize_timestamp(args.start), normalize_timestamp(args.end))
+
+    binary = args.format != 'csv'
+    if args.output:
+        out = open(args.output, 'wb') if binary else open(args.output, 'w', newline='')
+    else:
+        out = sys.stdout.buffer if binary else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
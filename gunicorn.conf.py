@@ -0,0 +1,34 @@
+# gunicorn.conf.py
+# Loaded automatically by gunicorn when started from the project directory.
+import os
+import json
+import importlib.util
+
+project_dir = os.path.dirname(os.path.abspath(__file__))
+
+def _dashboard_config():
+    try:
+        with open(os.path.join(project_dir, 'config.json')) as f:
+            return json.load(f).get('dashboard', {})
+    except (OSError, ValueError):
+        return {}
+
+_dashboard = _dashboard_config()
+
+bind = _dashboard.get('bind', '0.0.0.0:5000')
+
+# One process, so every request shares the same open databases, station map,
+# caches and live-stream tailer. Threads serve history and SSE requests
+# concurrently, and SQLite releases the GIL while it reads. gevent is not the
+# default: the SQLite calls cannot yield, so one slow query would stall every
+# other request and stream. Each open /api/stream holds a thread, so app.py
+# caps the number of streams.
+workers = _dashboard.get('workers', 1)
+worker_class = _dashboard.get('worker_class', 'gthread')
+if worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+    worker_class = 'gthread'
+threads = _dashboard.get('threads', 16)
+worker_connections = _dashboard.get('worker_connections', 100)
+
+timeout = 120
+graceful_timeout = 10
@@ -2,28 +2,61 @@
 import time
 import json
 import os
+import math
+import queue
+import logging
 import datetime
 from threading import Thread, Event, Lock
 
-# Import hardware-specific libraries
-try:
-    import board
-    import busio
-    from digitalio import DigitalInOut
-    import adafruit_rfm9x
-    from Adafruit_IO import Client
-    HARDWARE_AVAILABLE = True
-except (ImportError, NotImplementedError, NameError):
-    print("[Warning] Hardware-specific or Adafruit IO libraries not found. LoRa/AIO will be disabled.")
-    HARDWARE_AVAILABLE = False
-
+import hardware
+import metrics
 from database import DatabaseManager # Import DatabaseManager
+from ingest import IngestPipeline
+from lora_schedule import AirtimeBudget, SlotScheduler, slot_window, BROADCAST_ADDRESS
+
+LORA_MODULES = ('board', 'busio', 'digitalio', 'adafruit_rfm9x')
+LORA_HEADER_BYTES = 4  # RadioHead to/from/id/flags header
+# Short enough that the receive loop notices config changes and shutdown promptly
+LORA_RECEIVE_TIMEOUT = 1.0
+LORA_DECODE_BATCH = 100
+LORA_ACK_BYTES = 1
+
+UPLOAD_SECONDS = metrics.histogram('ws_upload_seconds', "Latency of a single Adafruit IO upload.")
+UPLOAD_ERRORS = metrics.counter('ws_upload_errors_total', "Adafruit IO uploads that failed.")
+LORA_SEND_SECONDS = metrics.histogram('ws_lora_send_seconds', "Time to send one LoRa packet including ACK wait and retries.")
+LORA_PACKETS_SENT = metrics.counter('ws_lora_packets_sent_total', "LoRa packets sent, by whether they were acknowledged.", ('result',))
+LORA_PACKETS_RECEIVED = metrics.counter('ws_lora_packets_received_total', "LoRa data packets received, by remote station.", ('station',))
+LORA_MALFORMED = metrics.counter('ws_lora_malformed_packets_total', "LoRa packets that could not be decoded.")
+LORA_AIRTIME = metrics.counter('ws_lora_airtime_seconds_total', "Estimated LoRa time on air, excluding retries.", ('direction',))
+LORA_RSSI = metrics.histogram('ws_lora_rssi_dbm', "RSSI of received LoRa packets.",
+                              buckets=(-130, -120, -110, -100, -90, -80, -70, -60, -50))
+LORA_LAST_RSSI = metrics.gauge('ws_lora_last_rssi_dbm', "RSSI of the last packet from each remote station.", ('station',))
+LORA_LISTEN_SECONDS = metrics.counter('ws_lora_listen_seconds_total', "Time the base radio spent in receive; its rate is the receive duty cycle.")
+LORA_RX_QUEUE_DEPTH = metrics.gauge('ws_lora_rx_queue_depth', "Received LoRa packets waiting to be decoded.")
+LORA_RX_DROPPED = metrics.counter('ws_lora_rx_dropped_total', "Received LoRa packets dropped because the decode queue was full.")
+LORA_BEACONS = metrics.counter('ws_lora_beacons_total', "Schedule beacons sent or received, or missed by a remote.", ('result',))
+LORA_BUDGET_USED = metrics.gauge('ws_lora_airtime_budget_used', "Fraction of the duty-cycle airtime allowance spent in the current window.")
+LORA_BUDGET_DEFERRED = metrics.counter('ws_lora_budget_deferred_total', "Transmissions put off because the airtime budget was spent.")
+
+log = logging.getLogger(__name__)
+
+def lora_airtime(payload_bytes, sf=7, bw_hz=125000, cr=1, preamble=8, crc=True, explicit_header=True):
+    """Time on air in seconds for one LoRa packet (Semtech AN1200.13)."""
+    t_sym = (2 ** sf) / float(bw_hz)
+    de = 1 if t_sym > 0.016 else 0
+    ih = 0 if explicit_header else 1
+    numerator = 8 * payload_bytes - 4 * sf + 28 + 16 * int(crc) - 20 * ih
+    n_payload = 8 + max(math.ceil(numerator / (4.0 * (sf - 2 * de))) * (cr + 4), 0)
+    return (preamble + 4.25) * t_sym + n_payload * t_sym
 
 class BaseHandler(Thread):
     """
     A base class for all handler threads in the application.
     Manages the thread lifecycle, configuration updates, and database connection.
     """
+    # Top-level config sections this handler reads; None means all of them
+    config_sections = None
+
     def __init__(self, config, db_manager):
         super().__init__(daemon=True)
         self.db = db_manager
@@ -34,9 +67,9 @@ class BaseHandler(Thread):
 
     def run(self):
         """The main entry point for the thread."""
-        print(f"[{self.name}] Service started.")
+        log.info("[%s] Service started.", self.name)
         self.loop()
-        print(f"[{self.name}] Service stopped.")
+        log.info("[%s] Service stopped.", self.name)
 
     def stop(self):
         """Stops the thread gracefully."""
@@ -48,7 +81,7 @@ class BaseHandler(Thread):
         """Updates the handler's configuration."""
         self.config = new_config
         self.update_interval()
-        print(f"[{self.name}] Configuration updated.")
+        log.info("[%s] Configuration updated.", self.name)
 
     def update_interval(self):
         """Placeholder for updating timing intervals from config."""
@@ -64,6 +97,8 @@ class AdafruitIOHandler(BaseHandler):
     On a base station, this handler will find all station databases (.db files)
     and upload the latest reading for each sensor metric.
     """
+    config_sections = {'services', 'timing', 'sensors', 'rain_gauge'}
+
     def __init__(self, config, db_manager, aio_client, aio_prefix):
         self.aio_client = aio_client
         self.aio_prefix = aio_prefix
@@ -106,12 +141,12 @@ class AdafruitIOHandler(BaseHandler):
             if not self.config.get('services', {}).get('adafruit_io_enabled', False):
                 continue
             
-            print(f"[{self.name}] Checking for new data to upload...")
+            log.debug("[%s] Checking for new data to upload...", self.name)
 
             main_db_path = self.db.db_path
             db_dir = os.path.dirname(main_db_path)
             if not os.path.isdir(db_dir):
-                print(f"[{self.name}] Database directory not found, skipping: {db_dir}")
+                log.warning("[%s] Database directory not found, skipping: %s", self.name, db_dir)
                 continue
 
             all_db_files = [f for f in os.listdir(db_dir) if f.endswith('.db')]
@@ -121,61 +156,86 @@ class AdafruitIOHandler(BaseHandler):
                 try:
                     remote_db_path = os.path.join(db_dir, db_file)
                     temp_db_manager = DatabaseManager(remote_db_path)
-                    latest_readings = temp_db_manager.get_latest_readings_by_station()
-                    all_stations_latest_readings.update(latest_readings)
+                    for reading in temp_db_manager.iter_latest_readings():
+                        all_stations_latest_readings[(reading.station_id, reading.sensor, reading.metric)] = reading
                     temp_db_manager.close()
                 except Exception as e:
-                    print(f"[{self.name}] ERROR reading from {db_file}: {e}")
+                    log.error("[%s] Error reading from %s: %s", self.name, db_file, e)
             
-            for station_id, readings in all_stations_latest_readings.items():
-                for key, data in readings.items():
-                    unique_reading_key = f"station{station_id}-{key}-{data['id']}"
-                    if not self.last_sent_ids.get(unique_reading_key):
-                        try:
-                            feed_key = self._get_feed_key(data['sensor'], data['metric'])
-                            if not feed_key: continue
-                            
-                            full_feed_id = f"{self.aio_prefix}.station-{station_id}.{feed_key}"
-                            
-                            print(f"[{self.name}] Sending {data['value']:.2f} to {full_feed_id}")
-                            self.aio_client.send_data(full_feed_id, data['value'])
-                            self.last_sent_ids[unique_reading_key] = True
-                        except Exception as e:
-                            print(f"[{self.name}] ERROR sending data for {key}: {e}")
+            for (station_id, sensor, metric), data in all_stations_latest_readings.items():
+                key = f"{sensor}-{metric}"
+                unique_reading_key = f"station{station_id}-{key}-{data.id}"
+                if not self.last_sent_ids.get(unique_reading_key):
+                    try:
+                        feed_key = self._get_feed_key(sensor, metric)
+                        if not feed_key: continue
+                        
+                        full_feed_id = f"{self.aio_prefix}.station-{station_id}.{feed_key}"
+                        
+                        log.debug("[%s] Sending %.2f to %s", self.name, data.value, full_feed_id)
+                        with UPLOAD_SECONDS.time():
+                            self.aio_client.send_data(full_feed_id, data.value)
+                        self.last_sent_ids[unique_reading_key] = True
+                    except Exception as e:
+                        UPLOAD_ERRORS.inc()
+                        log.error("[%s] Error sending data for %s: %s", self.name, key, e)
 
 class LoRaHandler(BaseHandler):
     """
     Handles LoRa communication. 'remote' role sends data, 'base' role receives.
     """
-    def __init__(self, config, db_manager):
+    config_sections = {'services', 'timing', 'lora', 'station_info'}
+
+    def __init__(self, config, db_manager, recent=None, ingest=None):
         self.last_data_sent_id = 0
+        # Without a shared pipeline the handler owns one, stopped in close()
+        self.owns_ingest = ingest is None
+        self.ingest = ingest or IngestPipeline.from_config(config, db_manager, recent=recent)
         self.rfm9x = None
         self.lora_lock = Lock()
         self.db_connections = {'local': db_manager}
+        self.receive_thread = self.decode_thread = None
+        self.listen_seconds = 0.0
+        self.budget = AirtimeBudget()
+        self.scheduler = SlotScheduler()
+        # Recent time for an acknowledged send, used to stop before a slot ends
+        self._send_seconds = 0.0
+        # Monotonic start of the last frame a remote followed
+        self._frame_start = None
         super().__init__(config, db_manager)
+        LORA_BUDGET_USED.set_function(self.budget.used)
+        if self.owns_ingest:
+            self.ingest.start()
+        # (packet, rssi, arrival timestamp) from the receive thread to the decode thread
+        self.packets = queue.Queue(maxsize=self.lora_config.get('receive_queue_size', 1000))
+        LORA_RX_QUEUE_DEPTH.set_function(self.packets.qsize)
 
         self.init_lora_hardware()
 
         if self.rfm9x:
-            print(f"[{self.name}] Initialized in '{self.role}' role.")
+            log.info("[%s] Initialized in '%s' role.", self.name, self.role)
             if self.role == 'base':
-                self.receive_thread = Thread(target=self.receive_loop, daemon=True)
+                self.receive_thread = Thread(target=self.receive_loop, name="lora-receive", daemon=True)
+                self.decode_thread = Thread(target=self.decode_loop, name="lora-decode", daemon=True)
                 self.receive_thread.start()
+                self.decode_thread.start()
             elif self.role == 'remote':
                 self.send_thread = Thread(target=self.send_loop, daemon=True)
                 self.send_thread.start()
         else:
-            print(f"[{self.name}] LoRa hardware not found or disabled. Handler will be inactive.")
+            log.warning("[%s] LoRa hardware not found or disabled. Handler will be inactive.", self.name)
 
     def init_lora_hardware(self):
         """Initializes the RFM9x LoRa radio hardware."""
-        if not HARDWARE_AVAILABLE:
+        modules = hardware.load_all(LORA_MODULES, 'LoRa radio')
+        if not modules:
             self.rfm9x = None
             return
+        board, busio, digitalio, adafruit_rfm9x = modules
 
         try:
-            CS = DigitalInOut(board.CE1)
-            RESET = DigitalInOut(board.D25)
+            CS = digitalio.DigitalInOut(board.CE1)
+            RESET = digitalio.DigitalInOut(board.D25)
             spi = busio.SPI(board.SCK, MOSI=board.MOSI, MISO=board.MISO)
             self.rfm9x = adafruit_rfm9x.RFM9x(spi, CS, RESET, self.lora_config.get('frequency', 915.0))
             self.rfm9x.tx_power = self.lora_config.get('tx_power', 23)
@@ -184,17 +244,27 @@ class LoRaHandler(BaseHandler):
             if self.role == 'remote':
                 self.rfm9x.destination = self.lora_config.get('base_station_address', 1)
             
-            print(f"[{self.name}] RFM9x LoRa radio initialized. Node Address: {self.rfm9x.node}, Freq: {self.rfm9x.frequency_mhz}, Power: {self.rfm9x.tx_power}")
+            log.info("[%s] RFM9x LoRa radio initialized. Node Address: %s, Freq: %s, Power: %s",
+                     self.name, self.rfm9x.node, self.rfm9x.frequency_mhz, self.rfm9x.tx_power)
         except (ValueError, RuntimeError, FileNotFoundError) as e:
-            print(f"[{self.name}] ERROR: RFM9x radio not found or failed to initialize: {e}")
+            log.error("[%s] RFM9x radio not found or failed to initialize: %s", self.name, e)
             self.rfm9x = None
 
+    def airtime(self, payload_bytes):
+        """Estimated time on air for a packet with the radio's current settings."""
+        sf = getattr(self.rfm9x, 'spreading_factor', 7)
+        bw_hz = getattr(self.rfm9x, 'signal_bandwidth', 125000)
+        return lora_airtime(payload_bytes + LORA_HEADER_BYTES, sf, bw_hz)
+
     def get_remote_db(self, station_name):
         """Gets or creates a DatabaseManager for a remote station."""
+        if self.config.get('database', {}).get('single_store', False):
+            # All stations share the local store, partitioned by station_id
+            return self.db_connections['local']
         if station_name in self.db_connections:
             return self.db_connections[station_name]
 
-        print(f"[{self.name}] Creating new database connection for remote station: {station_name}")
+        log.info("[%s] Creating new database connection for remote station: %s", self.name, station_name)
         main_db_path = self.db_connections['local'].db_path
         base_dir = os.path.dirname(main_db_path)
         remote_db_path = os.path.join(base_dir, f"{station_name}.db")
@@ -204,8 +274,15 @@ class LoRaHandler(BaseHandler):
         return db_manager
 
     def close(self):
-        """Closes all remote database connections."""
-        print(f"[{self.name}] Closing all database connections.")
+        """Decodes and commits any queued packets, then closes all remote database connections."""
+        for thread in (self.receive_thread, self.decode_thread):
+            if thread and thread.is_alive():
+                thread.join(timeout=LORA_RECEIVE_TIMEOUT * 5)
+        if self.owns_ingest:
+            self.ingest.stop()
+        else:
+            self.ingest.flush(timeout=5.0)
+        log.info("[%s] Closing all database connections.", self.name)
         for name, db_conn in self.db_connections.items():
             if name != 'local':
                 db_conn.close()
@@ -215,6 +292,14 @@ class LoRaHandler(BaseHandler):
         self.interval = self.config.get('timing', {}).get('transmission_interval_seconds', 60)
         self.lora_config = self.config.get('lora', {})
         self.role = self.lora_config.get('role')
+        self.budget.duty_cycle = self.lora_config.get('duty_cycle', 1.0)
+        self.budget.window_seconds = self.lora_config.get('duty_cycle_window_seconds', 3600)
+        # One frame per transmission interval; the base's values are the ones remotes follow
+        self.schedule_config = self.lora_config.get('schedule', {})
+        self.scheduler.frame_seconds = self.interval
+        self.scheduler.slot_seconds = self.schedule_config.get('slot_seconds', 2.0)
+        self.scheduler.contention_slots = max(self.schedule_config.get('contention_slots', 1), 1)
+        self.scheduler.expire_frames = self.schedule_config.get('expire_frames', 10)
 
     def loop(self):
         """Main loop waits, as tasks are in dedicated threads."""
@@ -222,89 +307,240 @@ class LoRaHandler(BaseHandler):
             time.sleep(1)
 
     def send_loop(self):
-        """Periodically sends new data from a 'remote' station."""
+        """
+        Sends new data from a 'remote' station: in its slot of the base's
+        schedule when `lora.schedule.enabled` is set, otherwise every
+        transmission interval.
+        """
         if not self.rfm9x: return
-        print(f"[{self.name}] Starting send loop.")
-        while not self._stop_event.wait(self.interval):
-            if not self.config.get('services', {}).get('lora_enabled', False): continue
+        log.info("[%s] Starting send loop.", self.name)
+        while not self._stop_event.is_set():
+            enabled = self.config.get('services', {}).get('lora_enabled', False)
+            if enabled and self.schedule_config.get('enabled', False):
+                self.send_in_slot()
+            elif not self._stop_event.wait(self.interval) and enabled:
+                self.send_data_payload()
+
+    def send_in_slot(self):
+        """
+        Waits for the base's beacon, then sends in this station's slot of that
+        frame, or in a contention slot until the base has assigned one. With no
+        beacon for a whole interval it sends unscheduled, so a base that keeps
+        no schedule still gets the data.
+        """
+        beacon, frame_start = self.wait_for_beacon(self.interval)
+        if self._stop_event.is_set():
+            return
+        if beacon is None:
+            LORA_BEACONS.labels('missed').inc()
+            log.warning("[%s] No schedule beacon for %ss; sending unscheduled.", self.name, self.interval)
             self.send_data_payload()
+            return
+        guard_seconds = self.schedule_config.get('guard_seconds', 0.15)
+        if self._frame_start is not None:
+            # A beacon that waited in the radio's FIFO while this station was still
+            # sending reads late; keep to the frame clock instead of drifting into a neighbour's slot
+            frames = round((frame_start - self._frame_start) / beacon['frame'])
+            predicted = self._frame_start + frames * beacon['frame']
+            if frame_start - predicted > guard_seconds:
+                frame_start = predicted
+        self._frame_start = frame_start
+        station_id = self.config.get('station_info', {}).get('station_id', 0)
+        start, end = slot_window(beacon, station_id, frame_start, guard_seconds)
+        if self._stop_event.wait(max(start - time.monotonic(), 0.0)):
+            return
+        # A contention slot is shared, so only one packet goes out there; it is enough to be given a slot
+        assigned = station_id in beacon.get('ids', [])
+        self.send_data_payload(deadline=end, limit=None if assigned else 1)
+
+    def wait_for_beacon(self, timeout):
+        """Listens for a schedule beacon. Returns (beacon, monotonic arrival time), or (None, None)."""
+        deadline = time.monotonic() + timeout
+        while not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self.lora_lock:
+                try:
+                    packet = self.rfm9x.receive(timeout=min(remaining, LORA_RECEIVE_TIMEOUT))
+                except Exception as e:
+                    log.error("[%s] Error during receive: %s", self.name, e)
+                    packet = None
+            if not packet: continue
+            received_at = time.monotonic()
+            try:
+                data = json.loads(packet.decode())
+            except (ValueError, AttributeError):
+                LORA_MALFORMED.inc()
+                continue
+            if data.get('type') == 'beacon':
+                LORA_BEACONS.labels('received').inc()
+                return data, received_at
+        return None, None
+
+    def send_beacon(self):
+        """Broadcasts the schedule for the frame starting now ('base' role)."""
+        message = self.scheduler.next_beacon()
+        airtime = self.airtime(len(message))
+        if not self.budget.allow(airtime):
+            LORA_BUDGET_DEFERRED.inc()
+            log.warning("[%s] Airtime budget spent; skipped a schedule beacon.", self.name)
+            return
+        with self.lora_lock:
+            try:
+                self.rfm9x.send(message, destination=BROADCAST_ADDRESS)
+            except Exception as e:
+                log.error("[%s] Failed to send beacon: %s", self.name, e)
+                return
+        self.budget.spend(airtime)
+        LORA_AIRTIME.labels('tx').inc(airtime)
+        LORA_BEACONS.labels('sent').inc()
 
-    def send_data_payload(self):
-        """Sends a batch of unsent records with acknowledgements."""
-        records = self.db.get_unsent_lora_data(self.config['station_info']['station_id'], self.last_data_sent_id)
+    def send_data_payload(self, deadline=None, limit=None):
+        """
+        Sends a batch of unsent records (at most `limit`) with acknowledgements.
+        Stops early when the next send would run past `deadline` (the end of
+        this station's slot) or over the airtime budget; the rest go out next time.
+        """
+        records = list(self.db.iter_unsent_lora_data(self.config['station_info']['station_id'], self.last_data_sent_id))
         if not records: return
+        if limit is not None:
+            records = records[:limit]
 
-        print(f"[{self.name}] Found {len(records)} new records to send.")
+        log.debug("[%s] Found %d new records to send.", self.name, len(records))
         with self.lora_lock:
-            for record in records:
+            for i, record in enumerate(records):
                 packet = {
                     'type': 'data',
                     'station_name': self.config.get('station_info', {}).get('station_name', 'unknown'),
                     'station_id': self.config.get('station_info', {}).get('station_id', 0),
-                    'payload': [dict(record)]
+                    'payload': [record._asdict()]
                 }
                 message = json.dumps(packet).encode("utf-8")
+                # The first packet always goes out so the estimate keeps tracking the link
+                if i and deadline is not None and time.monotonic() + self._send_seconds > deadline:
+                    break
+                airtime = self.airtime(len(message))
+                if not self.budget.allow(airtime):
+                    LORA_BUDGET_DEFERRED.inc()
+                    log.info("[%s] Airtime budget spent (%s%% duty cycle); the remaining records wait.",
+                             self.name, self.budget.duty_cycle * 100)
+                    break
+                start = time.perf_counter()
                 try:
                     # Set destination for this message
                     self.rfm9x.destination = self.lora_config.get('base_station_address', 1)
                     success = self.rfm9x.send_with_ack(message)
                 except Exception as e:
-                    print(f"[{self.name}] ERROR: Failed to send message: {e}")
+                    log.error("[%s] Failed to send message: %s", self.name, e)
                     success = False
+                elapsed = time.perf_counter() - start
+                LORA_SEND_SECONDS.observe(elapsed)
+                if success:
+                    # Failed sends include every retry and say more about the channel than the link
+                    self._send_seconds = max(elapsed, self._send_seconds * 0.9)
+                self.budget.spend(airtime)
+                LORA_AIRTIME.labels('tx').inc(airtime)
+                LORA_PACKETS_SENT.labels('acked' if success else 'failed').inc()
                 
                 if success:
-                    print(f"[{self.name}] Successfully sent record id {record['id']} with ACK.")
-                    self.last_data_sent_id = record['id']
+                    log.debug("[%s] Successfully sent record id %s with ACK.", self.name, record.id)
+                    self.last_data_sent_id = record.id
                 else:
-                    print(f"[{self.name}] Failed to send record id {record['id']}. Will retry later.")
+                    log.warning("[%s] Failed to send record id %s. Will retry later.", self.name, record.id)
                     break # Stop trying for this interval
 
     def receive_loop(self):
-        """Listens for incoming data packets on a 'base' station."""
+        """
+        Listens for incoming packets on a 'base' station. This thread only does
+        radio I/O: each packet is queued with its RSSI and arrival time and the
+        radio is listening again straight away, so packets are not missed while
+        earlier ones are decoded and stored.
+        """
         if not self.rfm9x: return
-        print(f"[{self.name}] Starting receive loop.")
+        log.info("[%s] Starting receive loop.", self.name)
+        next_beacon = time.monotonic()
         while not self._stop_event.is_set():
             if not self.config.get('services', {}).get('lora_enabled', False):
-                time.sleep(5)
+                self._stop_event.wait(5)
                 continue
-            
+
+            timeout = LORA_RECEIVE_TIMEOUT
+            if self.schedule_config.get('enabled', False):
+                # Beacons go out from this thread between receives, at the start of each frame
+                now = time.monotonic()
+                if now >= next_beacon:
+                    self.send_beacon()
+                    next_beacon += self.scheduler.frame_seconds
+                    if next_beacon <= now:
+                        next_beacon = now + self.scheduler.frame_seconds
+                timeout = max(min(timeout, next_beacon - time.monotonic()), 0.001)
+
+            start = time.perf_counter()
             with self.lora_lock:
                 try:
-                    packet = self.rfm9x.receive(with_ack=True, timeout=5.0)
+                    packet = self.rfm9x.receive(with_ack=True, timeout=timeout)
                 except Exception as e:
-                    print(f"[{self.name}] Error during receive: {e}")
+                    log.error("[%s] Error during receive: %s", self.name, e)
                     packet = None
+            listened = time.perf_counter() - start
+            self.listen_seconds += listened
+            LORA_LISTEN_SECONDS.inc(listened)
 
             if not packet: continue
-
-            rssi = self.rfm9x.last_rssi
+            self.budget.spend(self.airtime(LORA_ACK_BYTES))
+            received_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
             try:
-                data = json.loads(packet.decode())
-                packet_type = data.get('type')
-                if packet_type == 'data':
-                    self.handle_data_packet(data, rssi)
-            except (json.JSONDecodeError, AttributeError):
-                print(f"[{self.name}] ERROR: Malformed LoRa packet received (RSSI: {rssi}).")
-            except Exception as e:
-                print(f"[{self.name}] ERROR in receive_loop: {e}")
-
-    def handle_data_packet(self, data, rssi):
+                self.packets.put_nowait((packet, self.rfm9x.last_rssi, received_at))
+            except queue.Full:
+                LORA_RX_DROPPED.inc()
+                log.warning("[%s] Decode queue full (%d packets); dropped a packet.", self.name, self.packets.maxsize)
+
+    def decode_loop(self):
+        """Decodes queued packets in batches and hands their readings to the ingest pipeline."""
+        while not self._stop_event.is_set() or not self.packets.empty():
+            try:
+                batch = [self.packets.get(timeout=LORA_RECEIVE_TIMEOUT)]
+            except queue.Empty:
+                continue
+            while len(batch) < LORA_DECODE_BATCH:
+                try:
+                    batch.append(self.packets.get_nowait())
+                except queue.Empty:
+                    break
+            for packet, rssi, received_at in batch:
+                self.handle_packet(packet, rssi, received_at)
+
+    def handle_packet(self, packet, rssi, received_at=None):
+        """Decodes one received packet and dispatches it by type."""
+        LORA_AIRTIME.labels('rx').inc(self.airtime(len(packet)))
+        LORA_RSSI.observe(rssi)
+        try:
+            data = json.loads(packet.decode())
+            packet_type = data.get('type')
+            if packet_type == 'data':
+                self.handle_data_packet(data, rssi, received_at)
+        except (json.JSONDecodeError, AttributeError):
+            LORA_MALFORMED.inc()
+            log.warning("[%s] Malformed LoRa packet received (RSSI: %s).", self.name, rssi)
+        except Exception as e:
+            log.error("[%s] Error handling LoRa packet: %s", self.name, e)
+
+    def handle_data_packet(self, data, rssi, received_at=None):
         """Processes a received data packet."""
         station_name = data.get('station_name', 'unknown_station')
         station_id = data.get('station_id')
         payload = data.get('payload', [])
 
         if not payload or not station_id:
-            print(f"[{self.name}] Received data packet with no payload or station_id.")
+            log.warning("[%s] Received data packet with no payload or station_id.", self.name)
             return
 
+        LORA_PACKETS_RECEIVED.labels(station_name).inc()
+        LORA_LAST_RSSI.labels(station_name).set(rssi)
+        self.scheduler.heard(station_id)
         remote_db = self.get_remote_db(station_name)
         for record in payload:
-            remote_db.write_reading(
-                station_id=record['station_id'],
-                sensor=record['sensor'],
-                metric=record['metric'],
-                value=record['value'],
-                rssi=rssi
-            )
-            print(f"[{self.name}] Received id:{record['id']} from '{station_name}' (ID: {station_id}) with RSSI: {rssi}")
+            self.ingest.submit(record['station_id'], record['sensor'], record['metric'], record['value'],
+                               rssi=rssi, timestamp=received_at, db=remote_db)
+            log.debug("[%s] Received id:%s from '%s' (ID: %s) with RSSI: %s", self.name, record['id'], station_name, station_id, rssi)
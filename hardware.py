@@ -0,0 +1,54 @@
+# hardware.py
+import os
+import time
+import logging
+import importlib
+
+log = logging.getLogger(__name__)
+
+# Hardware libraries are only imported the first time a feature needs them, so
+# a station without a rain gauge never pays for gpiozero and the dashboard never
+# imports any of them.
+_loaded = {}
+_failed = {}
+# Serial ports provided by a simulated backend rather than a device node
+simulated_ports = []
+
+def load(module_name, feature):
+    """
+    Imports a hardware backend module on first use and returns it, or None if
+    it is not installed or cannot run on this machine.
+    """
+    if module_name in _loaded:
+        return _loaded[module_name]
+    if module_name in _failed:
+        return None
+
+    start = time.monotonic()
+    try:
+        module = importlib.import_module(module_name)
+    except (ImportError, NotImplementedError, RuntimeError, NameError) as e:
+        log.warning("[Hardware] %s disabled: could not import %s (%s).", feature, module_name, e)
+        _failed[module_name] = e
+        return None
+    log.info("[Hardware] Loaded %s for %s in %.2fs", module_name, feature, time.monotonic() - start)
+    _loaded[module_name] = module
+    return module
+
+def load_all(module_names, feature):
+    """Loads several modules for one feature. Returns a list, or None if any is missing."""
+    modules = [load(name, feature) for name in module_names]
+    return None if any(m is None for m in modules) else modules
+
+def register(module_name, module):
+    """Installs a replacement backend (e.g. a simulation) under a module name."""
+    _loaded[module_name] = module
+    _failed.pop(module_name, None)
+
+def register_port(port):
+    if port not in simulated_ports:
+        simulated_ports.append(port)
+
+def serial_ports(candidates):
+    """Returns the simulated ports followed by the candidates that exist."""
+    return simulated_ports + [port for port in candidates if os.path.exists(port)]
@@ -0,0 +1,293 @@
+# ingest.py
+import os
+import time
+import queue
+import logging
+import datetime
+from threading import Thread, Event
+
+import metrics
+from spool import ReadingSpool
+from database import DatabaseManager
+
+log = logging.getLogger(__name__)
+
+POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+QUEUE_DEPTH = metrics.gauge('ws_ingest_queue_depth', "Readings waiting to be written to the database.", ('pipeline',))
+SUBMITTED = metrics.counter('ws_ingest_submitted_total', "Readings handed to the ingest queue.", ('pipeline',))
+WRITTEN = metrics.counter('ws_ingest_written_total', "Readings committed by the ingest writer.", ('pipeline',))
+DROPPED = metrics.counter('ws_ingest_dropped_total', "Readings discarded by the ingest pipeline.", ('pipeline', 'reason'))
+BATCH_SIZE = metrics.histogram('ws_ingest_batch_size', "Readings committed per database transaction.", ('pipeline',),
+                               buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+LATENCY = metrics.histogram('ws_ingest_latency_seconds', "Time from acquisition to commit.", ('pipeline',))
+SPOOLED = metrics.counter('ws_ingest_spooled_total', "Readings written to the local spool while their database was unavailable.", ('pipeline',))
+REPLAYED = metrics.counter('ws_ingest_replayed_total', "Spooled readings replayed into their database.", ('pipeline',))
+SPOOL_BYTES = metrics.gauge('ws_ingest_spool_bytes', "Size of the local spool file.", ('pipeline',))
+
+class IngestPipeline:
+    """
+    Decouples acquisition from storage. Producers (sensors, the rain gauge,
+    LoRa receive, derived metrics) submit() readings into a bounded queue and
+    return at once; a single writer thread commits them in batches of up to
+    `batch_size`, waiting at most `max_delay_seconds` to fill one, then feeds
+    the recent-readings buffer.
+
+    When the queue is full, `policy` decides what happens: 'drop_oldest'
+    discards the oldest queued reading, 'drop_newest' discards the reading
+    being submitted, and 'block' waits up to `block_timeout_seconds` for room
+    before discarding it. Every discard is counted in ws_ingest_dropped_total.
+
+    With a `spool_path`, a batch its database rejects (e.g. the USB drive was
+    unplugged) is appended to a local ReadingSpool instead of being lost, and
+    later batches for that database go straight to the spool. Every
+    `retry_seconds` the writer reconnects and replays the spool, one
+    transaction per chunk of `replay_chunk_size` readings; a spool left by a
+    crash is replayed on start().
+    """
+    def __init__(self, db_manager, **kwargs):
+        self.db = db_manager
+        self.name = kwargs.get('name', 'ingest')
+        self.recent = kwargs.get('recent')
+        self.batch_size = kwargs.get('batch_size', 500)
+        self.max_delay = kwargs.get('max_delay_seconds', 1.0)
+        self.policy = kwargs.get('policy', 'drop_oldest')
+        self.block_timeout = kwargs.get('block_timeout_seconds', 1.0)
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown ingest policy {self.policy!r}; expected one of {', '.join(POLICIES)}.")
+        self.queue = queue.Queue(maxsize=kwargs.get('queue_size', 10000))
+        self._stop_event = Event()
+        self.writer_thread = None
+
+        spool_path = kwargs.get('spool_path')
+        self.spool = ReadingSpool(spool_path) if spool_path else None
+        self.retry_seconds = kwargs.get('retry_seconds', 30)
+        self.replay_chunk_size = kwargs.get('replay_chunk_size', 1000)
+        self._next_retry = 0.0
+        self._unavailable = set()  # Paths of databases whose readings go to the spool
+        self._dbs = {db_manager.db_path: db_manager}
+
+        QUEUE_DEPTH.labels(self.name).set_function(self.queue.qsize)
+        self._submitted = SUBMITTED.labels(self.name)
+        self._written = WRITTEN.labels(self.name)
+        self._batch_size = BATCH_SIZE.labels(self.name)
+        self._latency = LATENCY.labels(self.name)
+        self._spooled = SPOOLED.labels(self.name)
+        self._replayed = REPLAYED.labels(self.name)
+        if self.spool is not None:
+            SPOOL_BYTES.labels(self.name).set_function(lambda: self.spool.size)
+
+    @classmethod
+    def from_config(cls, config, db_manager, recent=None):
+        """Builds a pipeline from the 'ingest' config section."""
+        section = config.get('ingest', {})
+        return cls(db_manager, recent=recent,
+                   queue_size=section.get('queue_size', 10000),
+                   batch_size=section.get('batch_size', 500),
+                   max_delay_seconds=section.get('max_delay_seconds', 1.0),
+                   policy=section.get('policy', 'drop_oldest'),
+                   block_timeout_seconds=section.get('block_timeout_seconds', 1.0),
+                   spool_path=section.get('spool_path'),
+                   retry_seconds=section.get('retry_seconds', 30),
+                   replay_chunk_size=section.get('replay_chunk_size', 1000))
+
+    def start(self):
+        """Starts the writer thread."""
+        if not self.writer_thread or not self.writer_thread.is_alive():
+            self._stop_event = Event()
+            self.writer_thread = Thread(target=self._write_loop, name=f"{self.name}-writer", daemon=True)
+            self.writer_thread.start()
+
+    def stop(self):
+        """Stops the writer thread and commits (or spools) everything still queued."""
+        self._stop_event.set()
+        if self.writer_thread and self.writer_thread.is_alive():
+            self.writer_thread.join(timeout=5.0)
+        self._drain()
+        if self.spool is not None:
+            self.spool.close()
+
+    def submit(self, station_id, sensor, metric, value, rssi=None, timestamp=None, db=None):
+        """
+        Queues one reading for `db` (the pipeline's database by default). The
+        timestamp defaults to now, i.e. the acquisition time, not the commit
+        time. Returns False if the reading was dropped.
+        """
+        now = time.time()
+        if timestamp is None:
+            timestamp = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).isoformat()
+        item = (db or self.db, timestamp, now, station_id, sensor, metric, value, rssi)
+        self._submitted.inc()
+
+        if not self.writer_thread or not self.writer_thread.is_alive():
+            # Not running (one-off tools, or after shutdown): write straight through
+            self._write([item])
+            return True
+
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        if self.policy == 'block':
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                return self._drop('block_timeout')
+        if self.policy == 'drop_newest':
+            return self._drop('drop_newest')
+        try:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self._drop('drop_oldest')
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return self._drop('drop_newest')
+
+    def submit_tips(self, station_id, sensor, tip_times, db=None):
+        """Stores a batch of rain gauge tip times. These are rare, so they are written directly."""
+        (db or self.db).write_tip_batch(station_id, sensor, tip_times)
+
+    def _drop(self, reason):
+        DROPPED.labels(self.name, reason).inc()
+        log.warning("[Ingest] Queue full (%d readings), %s.", self.queue.maxsize, reason.replace('_', ' '))
+        return False
+
+    def flush(self, timeout=None):
+        """Waits until every reading submitted so far is committed. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _write_loop(self):
+        while not self._stop_event.is_set():
+            if self.spool is not None and len(self.spool):
+                try:
+                    self._replay()
+                except Exception as e:
+                    log.exception("[Ingest] Spool replay failed: %s", e)
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _drain(self):
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            self._write(batch)
+        except Exception as e:
+            log.exception("[Ingest] Writer failed on a batch of %d readings: %s", len(batch), e)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, batch):
+        """Commits a batch, one transaction per target database."""
+        by_db = {}
+        for item in batch:
+            by_db.setdefault(id(item[0]), []).append(item)
+        for items in by_db.values():
+            db = items[0][0]
+            self._dbs.setdefault(db.db_path, db)
+            rows = [item[1:2] + item[3:] for item in items]
+            written = None if db.db_path in self._unavailable else db.write_readings(rows)
+            if written is not None:
+                committed = time.time()
+                self._written.inc(written)
+                self._batch_size.observe(written)
+                for item in items:
+                    self._latency.observe(committed - item[2])
+            elif self.spool is not None:
+                if db.db_path not in self._unavailable:
+                    log.warning("[Ingest] %s is unavailable; spooling readings to %s", db.db_path, self.spool.path)
+                    self._unavailable.add(db.db_path)
+                    self._next_retry = time.monotonic() + self.retry_seconds
+                self.spool.append(db.db_path, rows)
+                self._spooled.inc(len(rows))
+            else:
+                DROPPED.labels(self.name, 'write_error').inc(len(items))
+                continue
+            if self.recent:
+                for _, timestamp, _, station_id, sensor, metric, value, _ in items:
+                    self.recent.record(station_id, sensor, metric, value, timestamp)
+
+    def _replay(self):
+        """
+        Replays the spool into its databases once they can be reopened, in
+        chunks of `replay_chunk_size` rows with one transaction each. Queued
+        live readings are committed between chunks, so a long replay does not
+        hold them up. Returns True when the spool is empty.
+        """
+        if time.monotonic() < self._next_retry:
+            return False
+        self._next_retry = time.monotonic() + self.retry_seconds
+        total, ready, failed, owned = 0, set(), set(), {}
+        try:
+            for db_path, offsets, rows in self.spool.iter_chunks(self.replay_chunk_size):
+                if db_path in failed:
+                    continue
+                db = self._dbs.get(db_path) or owned.get(db_path)
+                if db is None:
+                    if not os.path.isdir(os.path.dirname(db_path) or '.'):
+                        failed.add(db_path)
+                        continue
+                    db = owned[db_path] = DatabaseManager(db_path)
+                elif db_path in self._unavailable and db_path not in ready and not db.reconnect():
+                    # A database that failed mid-run needs a fresh handle on the remounted drive
+                    failed.add(db_path)
+                    continue
+                replayed = db.replay_spool(self.spool.spool_id, rows, offsets)
+                if replayed is None:
+                    # Its marker keeps the chunks already in, so the next replay resumes after them
+                    failed.add(db_path)
+                    continue
+                ready.add(db_path)
+                total += replayed
+                self._drain()
+        finally:
+            for db in owned.values():
+                db.close()
+        # Back in use; every reading spooled for them is in
+        self._unavailable -= ready - failed
+        complete = not failed
+        if not complete:
+            if total:
+                log.info("[Ingest] Replayed %d spooled readings; other databases are still unavailable.", total)
+                self._replayed.inc(total)
+            return False
+        log.info("[Ingest] Replayed %d spooled readings (spool %s).", total, self.spool.spool_id)
+        self._replayed.inc(total)
+        self.spool.remove()
+        self._unavailable.clear()
+        return True
@@ -0,0 +1,152 @@
+# live_stream.py
+import os
+import json
+import time
+import queue
+import logging
+from threading import Thread, Event, Lock
+
+from database import DatabaseManager
+
+log = logging.getLogger(__name__)
+
+class ReadingTailer(Thread):
+    """
+    Watches every station database for rows with ids above the last one seen and
+    fans new readings out to subscriber queues. The thread only polls while at
+    least one client is subscribed, so an idle dashboard costs nothing; when the
+    first client arrives after an idle spell the tail skips to each database's
+    newest row, as clients load earlier readings from the history API. A poll
+    reads at most `max_rows` rows per database, and at most `max_subscribers`
+    clients are served at once, when set.
+    """
+    def __init__(self, db_paths_fn, interval=2.0, queue_size=100, max_subscribers=None, max_rows=1000):
+        super().__init__(daemon=True)
+        self.name = self.__class__.__name__
+        self.db_paths_fn = db_paths_fn
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.max_rows = max_rows
+        self._subscribers = set()
+        self._sub_lock = Lock()
+        self._has_subscribers = Event()
+        self._resync = Event()
+        self._stop_event = Event()
+        self._dbs = {}
+        self._last_ids = {}
+
+    def subscribe(self):
+        """Registers a new client and returns the queue its batches arrive on, or None when full."""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._sub_lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            if not self._subscribers:
+                self._resync.set()
+            self._subscribers.add(q)
+            self._has_subscribers.set()
+            if not self.is_alive():
+                self.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._sub_lock:
+            self._subscribers.discard(q)
+            if not self._subscribers:
+                self._has_subscribers.clear()
+
+    def stop(self):
+        self._stop_event.set()
+        self._has_subscribers.set()
+        for db in self._dbs.values():
+            db.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._has_subscribers.wait()
+            if self._stop_event.wait(self.interval):
+                break
+            if self._resync.is_set():
+                self._resync.clear()
+                self._skip_to_newest()
+                continue
+            self._refresh_databases()
+            batch = self._poll()
+            if batch:
+                self._publish(batch)
+
+    def _skip_to_newest(self):
+        """Drops rows written while no client was listening."""
+        self._refresh_databases()
+        for db_path, db in self._dbs.items():
+            self._last_ids[db_path] = db.get_max_id()
+
+    def _refresh_databases(self):
+        # A file that appears later (e.g. a merged store) also only streams new rows
+        for db_path in self.db_paths_fn():
+            if db_path in self._dbs:
+                continue
+            try:
+                db = DatabaseManager(db_path)
+            except Exception as e:
+                log.error("[%s] Error opening %s: %s", self.name, db_path, e)
+                continue
+            self._dbs[db_path] = db
+            self._last_ids[db_path] = db.get_max_id()
+
+    def _poll(self):
+        batch = []
+        for db_path, db in list(self._dbs.items()):
+            if not os.path.exists(db_path):
+                db.close()
+                del self._dbs[db_path]
+                continue
+            for reading in db.iter_readings_after(self._last_ids[db_path], limit=self.max_rows):
+                batch.append(reading._asdict())
+                self._last_ids[db_path] = reading.id
+        return batch
+
+    def _publish(self, batch):
+        message = json.dumps(batch)
+        with self._sub_lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # A stalled client loses its oldest update rather than blocking others
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+def sse_events(tailer, keepalive_seconds=15, lifetime_seconds=None, busy_retry_seconds=30):
+    """
+    Generator of Server-Sent Events for one client. Each event carries a JSON
+    list of new readings; a comment line is sent periodically to keep proxies
+    from closing the connection. The stream ends after `lifetime_seconds` and
+    the browser reconnects, so a connection (and the worker thread serving it)
+    is never held indefinitely. When the tailer is full the client is told to
+    retry in `busy_retry_seconds` instead.
+    """
+    q = tailer.subscribe()
+    if q is None:
+        yield f"retry: {int(busy_retry_seconds * 1000)}\n\n"
+        return
+    deadline = None if lifetime_seconds is None else time.monotonic() + lifetime_seconds
+    try:
+        yield "retry: 5000\n\n"
+        while deadline is None or time.monotonic() < deadline:
+            timeout = keepalive_seconds if deadline is None else max(min(keepalive_seconds, deadline - time.monotonic()), 0)
+            try:
+                message = q.get(timeout=timeout)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: readings\ndata: {message}\n\n"
+        # A planned close: come straight back
+        yield "retry: 1000\n\n"
+    finally:
+        tailer.unsubscribe(q)
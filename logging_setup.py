@@ -0,0 +1,192 @@
+# logging_setup.py
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from threading import Lock
+
+import metrics
+
+project_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+LOG_DROPPED = metrics.counter('ws_log_records_dropped_total', "Log records dropped because the log queue was full.")
+LOG_SUPPRESSED = metrics.counter('ws_log_records_suppressed_total', "Log records suppressed by rate limiting or sampling.", ('reason',))
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including any `extra` fields."""
+    _reserved = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._reserved:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` records with the same logger and message template
+    through per `window_seconds`. Repeated messages such as a sensor failing
+    every poll are reduced to a few lines per window; the first record of the
+    next window reports how many were suppressed. Keys leave out the arguments,
+    which may carry addresses or values, and expired windows are dropped, so
+    the table stays small on a long-running station.
+    DEBUG records are left to sampling, and records at or above `exempt_level`
+    are never limited.
+    """
+    def __init__(self, burst=5, window_seconds=60, exempt_level=logging.CRITICAL):
+        super().__init__()
+        self.burst = burst
+        self.window = window_seconds
+        self.exempt_level = exempt_level
+        self._windows = {}
+        self._next_sweep = time.monotonic() + window_seconds
+        self._lock = Lock()
+
+    def _sweep(self, now):
+        """
+        Drops expired windows. One with suppressed records is kept for another
+        window, so the count can still be reported if the message recurs.
+        """
+        self._windows = {key: (started, count, suppressed) for key, (started, count, suppressed) in self._windows.items()
+                         if now - started < (2 * self.window if suppressed else self.window)}
+        self._next_sweep = now + self.window
+
+    def filter(self, record):
+        if self.burst <= 0 or not logging.INFO <= record.levelno < self.exempt_level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            started, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+                    suppressed = 0
+            if count >= self.burst:
+                self._windows[key] = (started, count, suppressed + 1)
+                LOG_SUPPRESSED.labels('rate_limit').inc()
+                return False
+            self._windows[key] = (started, count + 1, suppressed)
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes one in every N records below WARNING for the configured loggers,
+    e.g. {"weather_station_library": 10} keeps every tenth per-reading message.
+    """
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {name: int(rate) for name, rate in rates.items() if int(rate) > 1}
+        self._counts = {}
+        self._lock = Lock()
+
+    def _rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate_for(record.name)
+        if rate <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % rate:
+            LOG_SUPPRESSED.labels('sampling').inc()
+            return False
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that never blocks the caller: records are dropped when the queue is full."""
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+def apply_levels(config):
+    """Sets the root and per-module log levels from the 'logging' config section."""
+    log_conf = config.get('logging', {})
+    logging.getLogger().setLevel(log_conf.get('level', 'INFO').upper())
+    levels = dict(log_conf.get('levels', {}))
+    # 'debug' turns on the per-reading sensor messages
+    levels.setdefault('weather_station_library', 'DEBUG' if log_conf.get('debug', False) else 'NOTSET')
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+def setup_logging(config, component='collector'):
+    """
+    Routes all logging through a bounded queue to a background listener thread,
+    so callers never wait on disk. The listener writes to a size-rotated file
+    when one is configured for `component`, and to stderr otherwise.
+    Safe to call again, e.g. after the config changes.
+    """
+    global _listener
+    log_conf = config.get('logging', {})
+
+    if log_conf.get('format', 'text') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(log_conf.get('format_string', DEFAULT_FORMAT))
+
+    handlers = []
+    log_file = log_conf.get('files', {}).get(component)
+    if log_file:
+        log_file = os.path.join(project_dir, log_file)
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=log_conf.get('max_bytes', 1048576), backupCount=log_conf.get('backup_count', 5)))
+    if not log_file or log_conf.get('console', False):
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    shutdown_logging()
+    queue_handler = DroppingQueueHandler(queue.Queue(log_conf.get('queue_size', 10000)))
+    rate_conf = log_conf.get('rate_limit', {})
+    queue_handler.addFilter(RateLimitFilter(rate_conf.get('burst', 5), rate_conf.get('window_seconds', 60)))
+    queue_handler.addFilter(SamplingFilter(log_conf.get('sample_every', {})))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    apply_levels(config)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(shutdown_logging)
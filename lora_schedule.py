@@ -0,0 +1,126 @@
+# lora_schedule.py
+import json
+import time
+import random
+import logging
+from collections import deque, OrderedDict
+from threading import Lock
+
+log = logging.getLogger(__name__)
+
+BROADCAST_ADDRESS = 0xFF
+# Largest RFM9x payload once the RadioHead header is taken off
+MAX_PAYLOAD_BYTES = 251
+
+class AirtimeBudget:
+    """
+    Tracks a node's own time on air over a sliding window and refuses
+    transmissions that would take it over `duty_cycle` of that window (e.g.
+    0.01 for the 1% limit of most EU868 sub-bands). A duty cycle of 1.0 or
+    more never limits.
+    """
+    def __init__(self, duty_cycle=1.0, window_seconds=3600):
+        self.duty_cycle = duty_cycle
+        self.window_seconds = window_seconds
+        self._spent = deque()  # (monotonic time, airtime seconds)
+        self._total = 0.0
+        self._lock = Lock()
+
+    def _expire(self, now):
+        cutoff = now - self.window_seconds
+        while self._spent and self._spent[0][0] < cutoff:
+            self._total -= self._spent.popleft()[1]
+
+    @property
+    def limit(self):
+        return self.duty_cycle * self.window_seconds
+
+    def used(self):
+        """Fraction of the window's allowance spent."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._total / self.limit if self.limit else 1.0
+
+    def allow(self, airtime):
+        if self.duty_cycle >= 1.0:
+            return True
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._total + airtime <= self.limit
+
+    def spend(self, airtime):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            self._spent.append((now, airtime))
+            self._total += airtime
+
+class SlotScheduler:
+    """
+    The base station's side of the TDMA schedule. A frame of `frame_seconds`
+    is split into slots of `slot_seconds`: slot 0 carries the base's beacon,
+    the last `contention_slots` are open to any remote, and the rest are each
+    given to one remote, in the order they were first heard. A remote that
+    has not been heard for `expire_frames` frames loses its slot.
+    """
+    def __init__(self, frame_seconds=60, slot_seconds=2.0, contention_slots=1, expire_frames=10):
+        self.frame_seconds = frame_seconds
+        self.slot_seconds = slot_seconds
+        # At least one, or a new remote could never be heard and given a slot
+        self.contention_slots = max(contention_slots, 1)
+        self.expire_frames = expire_frames
+        self.frame = 0
+        self._assigned = OrderedDict()  # station id -> frame it was last heard in
+        self._lock = Lock()
+
+    @property
+    def slot_count(self):
+        return max(int(self.frame_seconds // self.slot_seconds), 2)
+
+    @property
+    def assignable_slots(self):
+        return max(self.slot_count - 1 - self.contention_slots, 0)
+
+    def heard(self, station_id):
+        """Records a packet from a remote; it gets a slot in the next beacon if one is free."""
+        with self._lock:
+            if station_id in self._assigned:
+                self._assigned[station_id] = self.frame
+            elif len(self._assigned) < self.assignable_slots:
+                self._assigned[station_id] = self.frame
+                log.info("[LoRa] Assigned slot %d to station %s.", len(self._assigned), station_id)
+
+    def next_beacon(self):
+        """Starts a new frame and returns its beacon packet."""
+        with self._lock:
+            self.frame += 1
+            for station_id, last in list(self._assigned.items()):
+                if self.frame - last > self.expire_frames:
+                    del self._assigned[station_id]
+                    log.info("[LoRa] Station %s not heard for %d frames; freed its slot.", station_id, self.expire_frames)
+            beacon = {'type': 'beacon', 'frame': self.frame_seconds, 'slot': self.slot_seconds,
+                      'n': self.slot_count, 'c': self.contention_slots, 'ids': list(self._assigned)}
+        message = json.dumps(beacon, separators=(',', ':')).encode('utf-8')
+        while len(message) > MAX_PAYLOAD_BYTES and beacon['ids']:
+            # Keep the earliest assignments; later stations fall back to contention slots
+            beacon['ids'].pop()
+            message = json.dumps(beacon, separators=(',', ':')).encode('utf-8')
+        return message
+
+def slot_window(beacon, station_id, frame_start, guard_seconds):
+    """
+    A remote's side of the schedule: the (start, end) monotonic times it may
+    transmit in this frame, from a beacon received at `frame_start`. Stations
+    without a slot pick a contention slot at random, and a random start in its
+    first half, so that several new stations rarely collide.
+    """
+    ids = beacon.get('ids', [])
+    slot_seconds = beacon['slot']
+    if station_id in ids:
+        slot = ids.index(station_id) + 1
+        offset = 0.0
+    else:
+        slot = random.randrange(beacon['n'] - beacon['c'], beacon['n'])
+        offset = random.uniform(0, slot_seconds / 2 - guard_seconds)
+    start = frame_start + slot * slot_seconds + guard_seconds
+    return start + offset, start + slot_seconds - 2 * guard_seconds
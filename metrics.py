@@ -0,0 +1,308 @@
+# metrics.py
+import sys
+import time
+import logging
+import argparse
+import urllib.request
+from bisect import bisect_left
+from threading import Thread, Lock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_METRICS_PORT = 9101
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ('fn',)
+
+    def __init__(self):
+        super().__init__()
+        self.fn = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, fn):
+        """Reads the value from `fn` at render time, e.g. a queue's current size."""
+        self.fn = fn
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+class _Timer:
+    """Context manager that observes the elapsed time of its block."""
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+class Metric:
+    """A named metric family. Use labels() to get the child that is updated."""
+    def __init__(self, kind, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = Lock()
+        if not self.label_names:
+            self._default = self.labels()
+
+    def labels(self, *values, **kwargs):
+        key = tuple(str(v) for v in values) or tuple(str(kwargs[n]) for n in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    if self.kind == 'histogram':
+                        child = _HistogramChild(self.buckets)
+                    elif self.kind == 'gauge':
+                        child = _GaugeChild()
+                    else:
+                        child = _CounterChild()
+                    self._children[key] = child
+        return child
+
+    # Shortcuts for metrics without labels
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def set_function(self, fn):
+        self._default.set_function(fn)
+
+    def time(self):
+        return self._default.time()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            if self.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+                lines.append(f"{self.name}_count{labels} {child.count}")
+            else:
+                value = child.fn() if getattr(child, 'fn', None) else child.value
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+class Registry:
+    """Holds every metric in the process. Metrics are created on first declaration."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get(self, kind, name, help_text, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(kind, name, help_text, label_names, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get('counter', name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get('gauge', name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get('histogram', name, help_text, label_names, buckets=buckets)
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+LOCK_WAIT = histogram('ws_lock_wait_seconds', "Time spent waiting to acquire a shared lock.", ('lock',),
+                      buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+
+class InstrumentedLock:
+    """
+    A threading.Lock that records how long callers waited to acquire it.
+    Supports the same `with` and acquire/release usage as a plain Lock.
+    """
+    def __init__(self, name):
+        self._lock = Lock()
+        self._wait = LOCK_WAIT.labels(name)
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._wait.observe(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port=DEFAULT_METRICS_PORT, host='127.0.0.1'):
+    """Serves this process's metrics at http://host:port/metrics on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    log.info("[Metrics] Serving metrics on http://%s:%s/metrics", host, port)
+    return server
+
+def fetch(url, timeout=0.5):
+    """Returns the metrics text served at `url`, or None if it cannot be reached."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read().decode('utf-8')
+    except (OSError, ValueError):
+        return None
+
+def _parse(text):
+    """Parses Prometheus text into {(name, labels): value}."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name_labels, _, value = line.rpartition(' ')
+        name, _, labels = name_labels.partition('{')
+        samples[(name, labels.rstrip('}'))] = float(value)
+    return samples
+
+def _bucket_quantile(buckets, q):
+    """Estimates a quantile from cumulative (upper bound, count) pairs."""
+    total = buckets[-1][1] if buckets else 0
+    if not total:
+        return 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= q * total:
+            return bound
+    return buckets[-1][0]
+
+def snapshot(text):
+    """Summarizes metrics text as readable lines: totals, and count/mean/p50/p95 for histograms."""
+    samples = _parse(text)
+    histograms, lines = {}, []
+    for (name, labels), value in sorted(samples.items()):
+        if name.endswith('_bucket'):
+            parts = labels.split(',')
+            le = next(p for p in parts if p.startswith('le='))[4:-1]
+            key = (name[:-7], ','.join(p for p in parts if not p.startswith('le=')))
+            histograms.setdefault(key, []).append((float(le.replace('+Inf', 'inf')), value))
+        elif not name.endswith(('_sum', '_count')):
+            lines.append(f"{name}{{{labels}}} = {value:g}" if labels else f"{name} = {value:g}")
+    for (name, labels), buckets in sorted(histograms.items()):
+        buckets.sort()
+        count = samples.get((f"{name}_count", labels), 0)
+        total = samples.get((f"{name}_sum", labels), 0.0)
+        mean = total / count if count else 0.0
+        label_text = f"{{{labels}}}" if labels else ''
+        lines.append(f"{name}{label_text}: count={count:g} mean={mean:.4g} "
+                     f"p50<={_bucket_quantile(buckets, 0.5):g} p95<={_bucket_quantile(buckets, 0.95):g}")
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print a snapshot of a running weather station's metrics.")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{DEFAULT_METRICS_PORT}/metrics", help="Metrics endpoint to read.")
+    parser.add_argument('--raw', action='store_true', help="Print the Prometheus text unchanged.")
+    args = parser.parse_args(argv)
+
+    text = fetch(args.url, timeout=2.0)
+    if text is None:
+        print(f"Could not read metrics from {args.url}", file=sys.stderr)
+        sys.exit(1)
+    print(text if args.raw else '\n'.join(snapshot(text)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# migrate_store.py
+import os
+import sys
+import json
+import logging
+import argparse
+
+from database import DatabaseManager
+
+log = logging.getLogger(__name__)
+
+MERGED_DIR_NAME = 'merged'
+
+def find_station_databases(store_path):
+    """Returns the other .db files next to the store, i.e. the per-station files."""
+    db_dir = os.path.dirname(store_path) or '.'
+    if not os.path.isdir(db_dir):
+        return []
+    return sorted(
+        os.path.join(db_dir, name) for name in os.listdir(db_dir)
+        if name.endswith('.db') and os.path.abspath(os.path.join(db_dir, name)) != os.path.abspath(store_path)
+    )
+
+def merge_into_store(db_manager, source_paths=None):
+    """
+    Merges per-station database files into the single store managed by
+    `db_manager`. Each file is merged in one transaction and then moved into a
+    `merged/` folder next to it, so it is kept as a backup but is not found by
+    the dashboard. The store records each merged file, so one left in place by
+    a crash is only moved on the next run. Returns the total rows copied.
+    """
+    if source_paths is None:
+        source_paths = find_station_databases(db_manager.db_path)
+    total = 0
+    for source_path in source_paths:
+        copied = db_manager.merge_from(source_path)
+        if copied is None:
+            log.error("[Migration] Left %s in place; it will be retried on the next run.", source_path)
+            continue
+        merged_dir = os.path.join(os.path.dirname(source_path), MERGED_DIR_NAME)
+        os.makedirs(merged_dir, exist_ok=True)
+        os.replace(source_path, os.path.join(merged_dir, os.path.basename(source_path)))
+        log.info("[Migration] Merged %d readings from %s", copied, os.path.basename(source_path))
+        total += copied
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge per-station database files into a single store.")
+    parser.add_argument('--store', help="Path of the single store. Defaults to the path from the config.")
+    parser.add_argument('--config', default='config.json', help="Config file used to locate the store.")
+    parser.add_argument('sources', nargs='*', help="Database files to merge. Defaults to every other .db file next to the store.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    store_path = args.store
+    if not store_path:
+        from run_weather_station import get_dynamic_db_path
+        with open(args.config) as f:
+            config = json.load(f)
+        config.setdefault('database', {})['single_store'] = True
+        store_path = get_dynamic_db_path(config)
+
+    db_manager = DatabaseManager(store_path)
+    try:
+        total = merge_into_store(db_manager, args.sources or None)
+    finally:
+        db_manager.close()
+    print(f"Merged {total} readings into {store_path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
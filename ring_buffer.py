@@ -0,0 +1,203 @@
+# ring_buffer.py
+import os
+import json
+import time
+import socket
+import logging
+import datetime
+import socketserver
+from array import array
+from bisect import bisect_left
+from threading import Thread, Lock
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = '/tmp/weather-station-recent.sock'
+
+def _to_iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+def _from_iso(timestamp):
+    dt = datetime.datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+class SeriesBuffer:
+    """
+    A fixed-capacity ring buffer of (epoch seconds, value) pairs for one series,
+    stored in two flat array('d') columns so it costs 16 bytes per point.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0     # Index of the next slot to write
+        self.count = 0
+        self.in_order = True
+        self.evicted_before = None  # Newest timestamp that has been overwritten
+
+    def append(self, ts, value):
+        if self.count:
+            last = self.times[(self.head - 1) % self.capacity]
+            if ts < last:
+                self.in_order = False
+        if self.count == self.capacity:
+            evicted = self.times[self.head]
+            if self.evicted_before is None or evicted > self.evicted_before:
+                self.evicted_before = evicted
+        else:
+            self.count += 1
+        self.times[self.head] = ts
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+
+    def since(self, cutoff):
+        """Returns (ts, value) pairs newer than `cutoff`, oldest first."""
+        start = (self.head - self.count) % self.capacity
+        if start + self.count <= self.capacity:
+            times = self.times[start:start + self.count]
+            values = self.values[start:start + self.count]
+        else:
+            times = self.times[start:] + self.times[:self.head]
+            values = self.values[start:] + self.values[:self.head]
+        if self.in_order:
+            i = bisect_left(times, cutoff)
+            return list(zip(times[i:], values[i:]))
+        return sorted(p for p in zip(times, values) if p[0] >= cutoff)
+
+class RecentReadings:
+    """
+    In-process store of the last few hours of readings for every
+    (station, sensor, metric) series, so short-range charts never touch SQLite.
+    """
+    def __init__(self, retention_hours=48, capacity=4096):
+        self.retention_hours = retention_hours
+        self.capacity = capacity
+        self._series = {}
+        self._lock = Lock()
+        # Readings older than this were never seen by the buffer
+        self.covered_since = time.time()
+
+    def record(self, station_id, sensor, metric, value, timestamp=None):
+        """Appends a reading. `timestamp` may be epoch seconds or an ISO string."""
+        if timestamp is None:
+            ts = time.time()
+        elif isinstance(timestamp, str):
+            ts = _from_iso(timestamp)
+        else:
+            ts = timestamp
+        key = (station_id, sensor, metric)
+        with self._lock:
+            buf = self._series.get(key)
+            if buf is None:
+                buf = self._series[key] = SeriesBuffer(self.capacity)
+            buf.append(ts, float(value))
+
+    def warm_from_db(self, db_manager):
+        """
+        Pre-loads the retention window from a station database, one series at
+        a time, so each read is a range of the series index rather than a scan
+        of the whole table.
+        """
+        cutoff = time.time() - self.retention_hours * 3600
+        start = _to_iso(cutoff)
+        count = 0
+        for station_id, sensor, metric in db_manager.get_series():
+            for timestamp, _, _, _, value, _ in db_manager.iter_readings(station_id, [(sensor, metric)], start):
+                self.record(station_id, sensor, metric, value, timestamp)
+                count += 1
+        with self._lock:
+            self.covered_since = min(self.covered_since, cutoff)
+        log.info("[RecentReadings] Loaded %d readings from %s", count, os.path.basename(db_manager.db_path))
+
+    def query(self, station_id, sensor, metric, hours):
+        """
+        Returns history in the same shape as DatabaseManager.get_historical_data,
+        or None if the buffer does not cover the whole requested window.
+        """
+        points = self._points(station_id, sensor, metric, hours)
+        if points is None:
+            return None
+        return [{'timestamp': _to_iso(ts), 'value': value} for ts, value in points]
+
+    def query_columns(self, station_id, sensor, metric, hours):
+        """Like query(), but as {'t': [epoch ms], 'v': [values]} columns."""
+        points = self._points(station_id, sensor, metric, hours)
+        if points is None:
+            return None
+        return {'t': [round(ts * 1000) for ts, _ in points], 'v': [value for _, value in points]}
+
+    def _points(self, station_id, sensor, metric, hours):
+        cutoff = time.time() - hours * 3600
+        with self._lock:
+            if hours > self.retention_hours or cutoff < self.covered_since:
+                return None
+            buf = self._series.get((station_id, sensor, metric))
+            if buf is None:
+                return []
+            if buf.evicted_before is not None and cutoff <= buf.evicted_before:
+                return None
+            return buf.since(cutoff)
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            req = json.loads(self.rfile.readline())
+            query = self.server.recent.query_columns if req.get('columns') else self.server.recent.query
+            data = query(req['station_id'], req['sensor'], req['metric'], req['hours'])
+            response = {'covered': data is not None, 'data': data or []}
+        except (ValueError, KeyError, TypeError) as e:
+            response = {'covered': False, 'data': [], 'error': str(e)}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class RecentReadingsServer:
+    """
+    Serves RecentReadings queries to the dashboard process over a local Unix
+    socket. Each request and response is a single line of JSON.
+    """
+    def __init__(self, recent, socket_path=DEFAULT_SOCKET_PATH):
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.server = _UnixServer(socket_path, _RequestHandler)
+        self.server.recent = recent
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        log.info("[RecentReadings] Serving recent history on %s", self.socket_path)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+def query_recent(station_id, sensor, metric, hours, socket_path=DEFAULT_SOCKET_PATH, timeout=0.5, columns=False):
+    """
+    Asks the collector for recent history, as points or (with `columns`) as
+    epoch-ms / value columns. Returns None if the collector is not reachable or
+    its buffer does not cover the window, so callers can fall back to the database.
+    """
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            request = {'station_id': station_id, 'sensor': sensor, 'metric': metric, 'hours': hours, 'columns': columns}
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as f:
+                response = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    if not response.get('covered'):
+        return None
+    if columns and not isinstance(response['data'], dict):
+        # A collector from before the columns format answered with points
+        return None
+    return response['data']
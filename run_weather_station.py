@@ -2,14 +2,26 @@
 import os
 import time
 import json
+import logging
 import argparse
+import getpass
 from dotenv import load_dotenv
-from Adafruit_IO import Client
 from threading import Thread, Event
 
-from weather_station_library import WeatherStation
+import hardware
+import metrics
+import logging_setup
+
+from weather_station_library import WeatherStation, PORTS_TO_SCAN
 from database import DatabaseManager
 from handlers import AdafruitIOHandler, LoRaHandler
+from derived import DerivedMetricsHandler
+from ingest import IngestPipeline
+from config_watcher import FileWatcher, diff_config
+from migrate_store import merge_into_store
+from ring_buffer import RecentReadings, RecentReadingsServer, DEFAULT_SOCKET_PATH
+
+log = logging.getLogger(__name__)
 
 def load_config(path='config.json'):
     if not os.path.exists(path):
@@ -27,12 +39,19 @@ def load_config(path='config.json'):
 
 def get_dynamic_db_path(config):
     try:
-        username = os.getlogin()
+        try:
+            username = os.getlogin()
+        except OSError:
+            # No controlling terminal, e.g. when started by systemd
+            username = getpass.getuser()
         db_config = config.get('database', {})
         drive_label = db_config.get('drive_label')
         
         station_name = config.get('station_info', {}).get('station_name', 'default-station')
         db_filename = f"{station_name}.db"
+        if db_config.get('single_store', False):
+            # Every station shares one file, partitioned by station_id
+            db_filename = db_config.get('store_filename', 'stations.db')
         
         if not drive_label:
             raise ValueError("Database 'drive_label' not specified in config.")
@@ -40,58 +59,153 @@ def get_dynamic_db_path(config):
         path = os.path.join('/media', username, drive_label, db_filename)
         
         if not os.path.exists(os.path.dirname(path)):
-            print(f"[Warning] Database directory not found: {os.path.dirname(path)}")
+            log.warning("[Database] Database directory not found: %s", os.path.dirname(path))
             
         return path
     except Exception as e:
-        print(f"[Error] Could not determine database path: {e}")
+        log.error("[Database] Could not determine database path: %s", e)
         station_name = config.get('station_info', {}).get('station_name', 'default-station')
         return f"{station_name}.db"
 
-def config_watcher_loop(config_path, weather_station, services, stop_event):
-    from threading import Lock
-    file_lock = Lock()
-    
-    with file_lock:
-        last_mtime = os.path.getmtime(config_path)
+def wait_until_ready(config, db_path, timeout):
+    """
+    Waits for the database drive to be mounted and, if Modbus sensors are
+    enabled, for at least one serial adapter to appear. Returns as soon as both
+    are present, or after `timeout` seconds so the station still starts degraded.
+    """
+    db_dir = os.path.dirname(db_path)
+    needs_serial = any(s.get('enabled', False) for s in config.get('sensors', {}).values())
+    start = time.monotonic()
+    while True:
+        drive_ready = not db_dir or os.path.isdir(db_dir)
+        serial_ready = not needs_serial or bool(hardware.serial_ports(PORTS_TO_SCAN))
+        if drive_ready and serial_ready:
+            log.info("[Startup] Devices ready after %.1fs", time.monotonic() - start)
+            return True
+        if time.monotonic() - start >= timeout:
+            if not drive_ready:
+                log.warning("[Startup] Database directory still missing after %ss: %s", timeout, db_dir)
+            if not serial_ready:
+                log.warning("[Startup] No serial adapters found after %ss.", timeout)
+            return False
+        time.sleep(0.5)
+
+def start_recent_readings(config, db_manager):
+    """
+    Creates the in-memory buffer of recent readings, warms it from every station
+    database next to the local one and starts the socket the dashboard queries.
+    """
+    rr_config = config.get('recent_readings', {})
+    if not rr_config.get('enabled', False):
+        return None, None
 
-    while not stop_event.wait(10):
+    recent = RecentReadings(rr_config.get('retention_hours', 48), rr_config.get('capacity', 4096))
+    db_dir = os.path.dirname(db_manager.db_path)
+    for db_file in sorted(os.listdir(db_dir or '.')):
+        if not db_file.endswith('.db'):
+            continue
+        db_file = os.path.join(db_dir, db_file)
+        if os.path.abspath(db_file) == os.path.abspath(db_manager.db_path):
+            recent.warm_from_db(db_manager)
+            continue
         try:
-            with file_lock:
-                mtime = os.path.getmtime(config_path)
-                if mtime > last_mtime:
-                    print("\n[ConfigWatcher] Detected config file change. Reloading all services...")
-                    last_mtime = mtime
-                    
-                    new_config = load_config(config_path)
-                    
-                    weather_station.update_config(new_config)
-                    
-                    for service in services:
-                        if hasattr(service, 'update_config'):
-                            service.update_config(new_config)
-        except OSError as e:
-            print(f"[ConfigWatcher] ERROR: {e}")
+            temp_db_manager = DatabaseManager(db_file)
+            recent.warm_from_db(temp_db_manager)
+            temp_db_manager.close()
+        except Exception as e:
+            log.error("[RecentReadings] Error reading from %s: %s", db_file, e)
+
+    try:
+        server = RecentReadingsServer(recent, rr_config.get('socket_path', DEFAULT_SOCKET_PATH))
+        server.start()
+    except OSError as e:
+        log.error("[RecentReadings] Could not open socket: %s", e)
+        server = None
+    return recent, server
+
+def create_aio_handler(config, db_manager):
+    """Returns an AdafruitIOHandler using the credentials from .env, or None if they are missing."""
+    aio_user = os.getenv("ADAFRUIT_IO_USERNAME")
+    aio_key = os.getenv("ADAFRUIT_IO_KEY")
+    aio_prefix = os.getenv("ADAFRUIT_FEED_PREFIX", "default-weather")
+    Adafruit_IO = hardware.load('Adafruit_IO', 'Adafruit IO uploads')
+    if aio_user and aio_key and Adafruit_IO:
+        aio_client = Adafruit_IO.Client(aio_user, aio_key)
+        return AdafruitIOHandler(config, db_manager, aio_client, aio_prefix)
+    if Adafruit_IO:
+        log.warning("[Startup] Adafruit IO is enabled in config, but credentials are not in .env file.")
+    return None
+
+def config_watcher_loop(config_path, weather_station, services, stop_event, config=None, component='collector'):
+    """
+    Waits for the config file to change and applies only what changed: the
+    weather station (if any) gets a structural diff, and each service is only
+    updated when one of the sections it reads is different.
+    """
+    watcher = FileWatcher(config_path)
+    current_config = weather_station.config if weather_station else config
+    try:
+        while watcher.wait(stop_event):
+            try:
+                new_config = load_config(config_path)
+            except (OSError, ValueError) as e:
+                log.error("[ConfigWatcher] Could not load config, keeping the current one: %s", e)
+                continue
+
+            diff = diff_config(current_config, new_config)
+            if not diff.sections:
+                continue
+            log.info("[ConfigWatcher] Detected config change in: %s", ', '.join(sorted(diff.sections)))
+            current_config = new_config
+
+            # A change one component cannot apply must not stop the others, or the watcher
+            try:
+                if 'logging' in diff.sections:
+                    logging_setup.setup_logging(new_config, component)
+                if weather_station:
+                    weather_station.update_config(new_config, diff)
+            except Exception as e:
+                log.exception("[ConfigWatcher] Could not apply config change: %s", e)
+            for service in services:
+                sections = getattr(service, 'config_sections', None)
+                if hasattr(service, 'update_config') and (sections is None or diff.sections & sections):
+                    try:
+                        service.update_config(new_config)
+                    except Exception as e:
+                        log.exception("[ConfigWatcher] Could not apply config change to %s: %s",
+                                      getattr(service, 'name', type(service).__name__), e)
+    finally:
+        watcher.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the Weather Station application.")
     parser.add_argument('--name', type=str, help="The name of this station (overrides config file).")
     parser.add_argument('--role', type=str, choices=['base', 'remote'], help="The LoRa role for this station (overrides config file).")
     parser.add_argument('--id', type=int, help="The unique ID of this station (overrides config file).")
+    parser.add_argument('--simulate', action='store_true', help="Use simulated sensors, rain gauge and LoRa radio instead of hardware.")
+    parser.add_argument('--processes', action='store_true', help="Run Modbus, LoRa, uploads and the database writer as separate processes.")
     args = parser.parse_args()
 
+    startup_begin = time.monotonic()
     load_dotenv()
     config = load_config()
+    logging_setup.setup_logging(config)
     
     if args.name:
         config['station_info']['station_name'] = args.name
-        print(f"[Startup] Overriding station name with command-line arg: {args.name}")
+        log.info("[Startup] Overriding station name with command-line arg: %s", args.name)
     if args.role:
         config['lora']['role'] = args.role
-        print(f"[Startup] Overriding LoRa role with command-line arg: {args.role}")
+        log.info("[Startup] Overriding LoRa role with command-line arg: %s", args.role)
     if args.id is not None:
         config['station_info']['station_id'] = args.id
-        print(f"[Startup] Overriding station ID with command-line arg: {args.id}")
+        log.info("[Startup] Overriding station ID with command-line arg: %s", args.id)
+
+    sim_config = config.get('simulation', {})
+    simulate = args.simulate or sim_config.get('enabled', False)
+    if simulate:
+        from simulation import use_simulation
+        use_simulation(sim_config, config)
 
     station_id = config.get('station_info', {}).get('station_id')
     db_path = get_dynamic_db_path(config)
@@ -101,31 +215,62 @@ if __name__ == "__main__":
     print(f"  Station ID: {station_id}")
     print(f"  LoRa Role: {config['lora']['role']}")
 
+    wait_until_ready(config, db_path, config.get('timing', {}).get('startup_ready_timeout_seconds', 60))
+    devices_ready = time.monotonic()
+
+    if args.processes or config.get('supervisor', {}).get('enabled', False):
+        from supervisor import Supervisor
+        Supervisor(config, db_path, simulate=simulate).run()
+        raise SystemExit(0)
+
+    metrics_server = None
+    metrics_config = config.get('metrics', {})
+    if metrics_config.get('enabled', False):
+        try:
+            metrics_server = metrics.start_http_server(metrics_config.get('port', metrics.DEFAULT_METRICS_PORT))
+        except OSError as e:
+            log.error("[Metrics] Could not start metrics server: %s", e)
+
     db_manager = DatabaseManager(db_path)
+    if config.get('database', {}).get('single_store', False):
+        merge_into_store(db_manager)
+    recent, recent_server = start_recent_readings(config, db_manager)
+    # Every producer hands its readings to one writer thread
+    ingest = IngestPipeline.from_config(config, db_manager, recent=recent)
+    ingest.start()
 
-    weather_station = WeatherStation(config, db_manager=db_manager)
+    derived = DerivedMetricsHandler(config, db_manager, ingest=ingest) if 'derived_metrics' in config else None
+
+    weather_station = WeatherStation(config, db_manager=db_manager, derived=derived, ingest=ingest)
     weather_station.discover_and_add_sensors()
-    
-    all_services = []
+    discovery_done = time.monotonic()
+
+    all_services = [derived] if derived else []
     services_config = config.get('services', {})
 
     if services_config.get('adafruit_io_enabled'):
-        aio_user = os.getenv("ADAFRUIT_IO_USERNAME")
-        aio_key = os.getenv("ADAFRUIT_IO_KEY")
-        aio_prefix = os.getenv("ADAFRUIT_FEED_PREFIX", "default-weather")
-        if aio_user and aio_key:
-            aio_client = Client(aio_user, aio_key)
-            aio_handler = AdafruitIOHandler(config, db_manager, aio_client, aio_prefix)
+        aio_handler = create_aio_handler(config, db_manager)
+        if aio_handler:
             all_services.append(aio_handler)
-        else:
-            print("[Warning] Adafruit IO is enabled in config, but credentials are not in .env file.")
 
     if services_config.get('lora_enabled'):
-        lora_handler = LoRaHandler(config, db_manager)
+        lora_handler = LoRaHandler(config, db_manager, ingest=ingest)
         all_services.append(lora_handler)
 
     stop_event = Event()
 
+    def shutdown():
+        stop_event.set()
+        weather_station.stop()
+        for service in all_services:
+            service.stop()
+        ingest.stop()
+        if recent_server:
+            recent_server.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        db_manager.close()
+
     try:
         weather_station.start()
         for service in all_services:
@@ -134,22 +279,17 @@ if __name__ == "__main__":
         watcher_thread = Thread(target=config_watcher_loop, args=('config.json', weather_station, all_services, stop_event), daemon=True)
         watcher_thread.start()
             
+        now = time.monotonic()
+        log.info("[Startup] Ready in %.2fs (waiting for devices %.2fs, discovery %.2fs, services %.2fs)",
+                 now - startup_begin, devices_ready - startup_begin, discovery_done - devices_ready, now - discovery_done)
         print("\n--- All Services are Running --- (Press Ctrl+C to stop)")
         while True:
             time.sleep(1)
             
     except KeyboardInterrupt:
         print("\nShutting down gracefully...")
-        stop_event.set()
-        weather_station.stop()
-        for service in all_services:
-            service.stop()
-        db_manager.close()
+        shutdown()
         print("Shutdown complete.")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        stop_event.set()
-        weather_station.stop()
-        for service in all_services:
-            service.stop()
-        db_manager.close()
\ No newline at end of file
+        log.exception("An unexpected error occurred: %s", e)
+        shutdown()
@@ -0,0 +1,139 @@
+# set_baud.py
+import sys
+import json
+import time
+import logging
+import argparse
+
+import hardware
+from config_watcher import write_config
+from weather_station_library import PORTS_TO_SCAN, SERIAL_DEFAULTS, BAUD_RATE_REGISTER, BAUD_RATE_CODES
+
+log = logging.getLogger(__name__)
+
+# Time given to a sensor to switch rates after acknowledging the change
+SWITCH_SECONDS = 0.5
+
+def serial_settings(config, s_conf):
+    """A sensor's serial line settings, resolved the same way the collector does."""
+    defaults = config.get('modbus', {})
+    return {key: s_conf.get(key, defaults.get(key, default)) for key, default in SERIAL_DEFAULTS.items()}
+
+def open_instrument(port, address, settings, timeout=1.0):
+    minimalmodbus = hardware.load('minimalmodbus', 'Modbus sensors')
+    inst = minimalmodbus.Instrument(port, address)
+    for key, value in settings.items():
+        setattr(inst.serial, key, value)
+    inst.serial.timeout = timeout
+    return inst
+
+def find_port(address, settings, register):
+    """Returns the first serial port where `address` answers with these settings."""
+    for port in hardware.serial_ports(PORTS_TO_SCAN):
+        try:
+            open_instrument(port, address, settings).read_register(register)
+            return port
+        except (IOError, ValueError):
+            continue
+    return None
+
+def check_link(inst, register, reads):
+    """Reads one register `reads` times. Returns (reads answered, mean seconds per answered read)."""
+    answered, elapsed = 0, 0.0
+    for _ in range(reads):
+        start = time.perf_counter()
+        try:
+            inst.read_register(register)
+        except (IOError, ValueError):
+            continue
+        elapsed += time.perf_counter() - start
+        answered += 1
+    return answered, (elapsed / answered if answered else None)
+
+def change_baud(port, address, settings, baudrate, register, reads):
+    """
+    Switches one sensor to `baudrate` and checks the link at the new rate.
+    Returns (reads answered, mean seconds per read), or None if the sensor
+    does not answer at the new rate.
+    """
+    try:
+        open_instrument(port, address, settings).write_register(BAUD_RATE_REGISTER, BAUD_RATE_CODES[baudrate], functioncode=6)
+    except IOError as e:
+        # Some sensors switch before their acknowledgement is sent
+        log.info("[Baud] No acknowledgement from addr %s (%s); checking the new rate anyway.", address, e)
+    time.sleep(SWITCH_SECONDS)
+    answered, mean = check_link(open_instrument(port, address, dict(settings, baudrate=baudrate)), register, reads)
+    if not answered:
+        return None
+    return answered, mean
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f} ms" if seconds is not None else "n/a"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reprogram Modbus sensors to a faster baud rate and check the link. "
+                                                 "Stop the collector first so it does not share the bus.")
+    parser.add_argument('--config', default='config.json', help="Config file listing the sensors; updated with each new rate unless simulating.")
+    parser.add_argument('--baud', type=int, choices=sorted(BAUD_RATE_CODES), default=max(BAUD_RATE_CODES),
+                        help="Target baud rate (default: the highest the sensors support).")
+    parser.add_argument('--sensor', action='append', help="Sensor name or Modbus address to change. May be repeated (default: all enabled).")
+    parser.add_argument('--reads', type=int, default=20, help="Reads used to check each link.")
+    parser.add_argument('--check-only', action='store_true', help="Only check the links at the configured rates.")
+    parser.add_argument('--simulate', action='store_true', help="Run against the simulated Modbus bus. The config is not changed.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with open(args.config) as f:
+        config = json.load(f)
+    if args.simulate:
+        from simulation import use_simulation
+        use_simulation(config.get('simulation', {}), config)
+    if not hardware.load('minimalmodbus', 'Modbus sensors'):
+        sys.exit("minimalmodbus is not installed.")
+
+    def selected(addr, s_conf):
+        if args.sensor:
+            return s_conf['name'] in args.sensor or addr in args.sensor
+        return s_conf.get('enabled', False)
+    sensors = {addr: s_conf for addr, s_conf in config.get('sensors', {}).items() if selected(addr, s_conf)}
+    changed, failed = 0, 0
+    for addr_str, s_conf in sensors.items():
+        address, name = int(addr_str), s_conf['name']
+        register = min(m['register'] for m in s_conf['metrics'].values())
+        settings = serial_settings(config, s_conf)
+        port = find_port(address, settings, register)
+        if not port:
+            print(f"{name} (addr {address}): no answer at {settings['baudrate']} baud on any port")
+            failed += 1
+            continue
+
+        answered, mean = check_link(open_instrument(port, address, settings), register, args.reads)
+        if args.check_only or settings['baudrate'] == args.baud:
+            print(f"{name} (addr {address}, {port}): {settings['baudrate']} baud, {answered}/{args.reads} reads, {_ms(mean)}/read")
+            continue
+
+        result = change_baud(port, address, settings, args.baud, register, args.reads)
+        if result is None:
+            still_old = check_link(open_instrument(port, address, settings), register, 1)[0]
+            hint = "still answers at the old rate" if still_old else "may need a power cycle to apply the new rate"
+            print(f"{name} (addr {address}, {port}): no answer at {args.baud} baud; {hint}")
+            failed += 1
+            continue
+
+        new_answered, new_mean = result
+        # The collector reads the rate from the config, so record it as soon as the sensor has switched;
+        # a simulated sensor has no real rate to record
+        s_conf['baudrate'] = args.baud
+        if not args.simulate:
+            write_config(args.config, config)
+        changed += 1
+        print(f"{name} (addr {address}, {port}): {settings['baudrate']} -> {args.baud} baud, "
+              f"{new_answered}/{args.reads} reads, {_ms(new_mean)}/read (was {_ms(mean)})")
+
+    print(f"Changed {changed} sensor(s), {failed} failed.", file=sys.stderr)
+    if args.simulate and changed:
+        print(f"Simulated run: {args.config} was not updated.", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
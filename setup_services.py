@@ -15,6 +15,7 @@ GUNICORN_EXEC = os.path.join(os.path.dirname(PYTHON_EXEC), 'gunicorn')
 WEATHER_STATION_SERVICE_TPL = """
 [Unit]
 Description=Weather Station Data Collector (%(name)s)
+After=local-fs.target
 StartLimitIntervalSec=0
 
 [Service]
@@ -22,10 +23,10 @@ User=%(user)s
 Group=%(user)s
 WorkingDirectory=%(path)s
 TimeoutStartSec=0
-ExecStartPre=/bin/sleep 90
+# The collector waits for the database drive and serial adapters itself
 ExecStart=%(python_exec)s %(path)s/run_weather_station.py --name "%(name)s" --id %(id)s --role %(role)s
 Restart=always
-RestartSec=90s
+RestartSec=5s
 
 [Install]
 WantedBy=multi-user.target
@@ -40,7 +41,7 @@ After=network-online.target
 User=%(user)s
 Group=%(user)s
 WorkingDirectory=%(path)s
-ExecStart=%(gunicorn_exec)s --workers 3 --bind 0.0.0.0:5000 app:app
+ExecStart=%(gunicorn_exec)s --config %(path)s/gunicorn.conf.py app:app
 Restart=always
 RestartSec=10s
 
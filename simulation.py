@@ -0,0 +1,321 @@
+# simulation.py
+import math
+import time
+import queue
+import random
+import types
+import logging
+from threading import Thread, Event, Lock
+
+import hardware
+from handlers import lora_airtime
+from lora_schedule import BROADCAST_ADDRESS
+from weather_station_library import SERIAL_DEFAULTS, BAUD_RATE_REGISTER, BAUD_RATE_CODES
+
+log = logging.getLogger(__name__)
+
+# Register maps follow the example scripts in `sensor examples/`. Each entry maps
+# a register to (value generator, decimals, signed). Generators take the current
+# epoch time and return a physical value.
+def _diurnal(mean, amplitude, noise, phase_hours=15):
+    def value(now):
+        angle = 2 * math.pi * ((now / 3600.0 - phase_hours) % 24) / 24
+        return mean + amplitude * math.cos(angle) + random.gauss(0, noise)
+    return value
+
+def _uniform(low, high):
+    return lambda now: random.uniform(low, high)
+
+DEFAULT_REGISTER_MAPS = {
+    # RS-WS-N01-TR soil transmitter: temperature (signed) then humidity, tenths
+    'soil': {0: (_diurnal(18, 4, 0.2), 1, True), 1: (_diurnal(35, 3, 0.5), 1, False)},
+    # Air temperature/humidity: humidity then temperature, tenths
+    'atmosphere': {0: (_diurnal(60, 20, 1.0, phase_hours=3), 1, False), 1: (_diurnal(20, 8, 0.3), 1, True)},
+    'co2': {2: (_diurnal(450, 60, 10, phase_hours=5), 0, False)},
+    'light': {6: (lambda now: max(0.0, _diurnal(20000, 30000, 500, phase_hours=13)(now)), 0, False)},
+    # Barometer: pressure in kPa then temperature, tenths
+    'pressure': {0: (_diurnal(101.3, 0.4, 0.05), 1, False), 1: (_diurnal(20, 8, 0.3), 1, True)},
+    # Wind vane: direction gear (0-7) then degrees
+    'wind-direction': {0: (lambda now: random.randrange(8), 0, False), 1: (lambda now: random.randrange(0, 360, 45), 0, False)},
+    'wind-speed': {0: (lambda now: abs(random.gauss(3, 2)), 1, False)},
+}
+
+SIMULATED_PORT = '/dev/ttySIM0'
+
+# The minimalmodbus 2 exceptions the simulated bus raises
+class NoResponseError(IOError):
+    pass
+
+class InvalidResponseError(IOError):
+    pass
+
+class SimulatedSerial:
+    """Holds the serial settings a minimalmodbus Instrument exposes."""
+    def __init__(self):
+        self.baudrate = 19200
+        self.bytesize = 8
+        self.parity = 'N'
+        self.stopbits = 1
+        self.timeout = 0.05
+
+class SimulatedModbusBus:
+    """
+    A set of simulated RS-485 devices keyed by Modbus address. Every transaction
+    costs the configured latency plus the frame time at the instrument's baud
+    rate, and fails with the configured error rate. A device only answers at
+    its own baud rate, which can be changed through BAUD_RATE_REGISTER.
+    """
+    def __init__(self, latency_ms=20, error_rate=0.0, time_scale=1.0):
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.time_scale = time_scale
+        self.devices = {}
+        self.baud_rates = {}
+
+    def add_device(self, address, register_map, baudrate=SERIAL_DEFAULTS['baudrate']):
+        self.devices[address] = register_map
+        self.baud_rates[address] = baudrate
+
+    def add_devices_from_config(self, config):
+        default_baudrate = config.get('modbus', {}).get('baudrate', SERIAL_DEFAULTS['baudrate'])
+        for addr_str, s_conf in config.get('sensors', {}).items():
+            register_map = DEFAULT_REGISTER_MAPS.get(s_conf.get('name'))
+            if register_map is None:
+                register_map = {m['register']: (_uniform(0, 100), m.get('decimals', 0), m.get('signed', False))
+                                for m in s_conf.get('metrics', {}).values()}
+            self.add_device(int(addr_str), register_map, s_conf.get('baudrate', default_baudrate))
+
+    def transact(self, address, register, serial):
+        # 8-byte request and 7-byte response, 10 bits per character on the wire
+        frame_time = 15 * 10 / float(serial.baudrate)
+        device = self._answer(address, serial, frame_time)
+        if register not in device:
+            raise ValueError(f"Illegal data address {register}")
+        generator, decimals, signed = device[register]
+        raw = int(round(generator(time.time()) * 10 ** decimals))
+        return raw & 0xFFFF if signed else max(0, min(raw, 0xFFFF))
+
+    def write(self, address, register, value, serial):
+        frame_time = 16 * 10 / float(serial.baudrate)
+        self._answer(address, serial, frame_time)
+        if register == BAUD_RATE_REGISTER:
+            rates = {code: rate for rate, code in BAUD_RATE_CODES.items()}
+            if value not in rates:
+                raise ValueError(f"Illegal data value {value}")
+            # Acknowledged at the old rate, then the device switches
+            self.baud_rates[address] = rates[value]
+
+    def _answer(self, address, serial, frame_time):
+        """Waits out one transaction and returns the device's register map, or raises like a real bus."""
+        device = self.devices.get(address)
+        if device is None or serial.baudrate != self.baud_rates[address]:
+            time.sleep(serial.timeout * self.time_scale)
+            raise NoResponseError("No communication with the instrument (no answer)")
+        time.sleep((self.latency + frame_time) * self.time_scale)
+        if random.random() < self.error_rate:
+            raise InvalidResponseError("Checksum error in rtu mode")
+        return device
+
+class SimulatedInstrument:
+    """Drop-in for minimalmodbus.Instrument backed by a SimulatedModbusBus."""
+    bus = None
+
+    def __init__(self, port, slaveaddress, mode='rtu'):
+        self.port = port
+        self.address = slaveaddress
+        self.mode = mode
+        self.serial = SimulatedSerial()
+
+    def read_register(self, registeraddress, number_of_decimals=0, functioncode=3, signed=False):
+        raw = self.bus.transact(self.address, registeraddress, self.serial)
+        if signed and raw >= 0x8000:
+            raw -= 0x10000
+        return raw / float(10 ** number_of_decimals) if number_of_decimals else raw
+
+    def write_register(self, registeraddress, value, number_of_decimals=0, functioncode=16, signed=False):
+        self.bus.write(self.address, registeraddress, value, self.serial)
+
+class SimulatedButton:
+    """
+    Drop-in for gpiozero.Button that fires `when_pressed` like a tipping bucket,
+    with exponentially distributed gaps at `tips_per_hour`.
+    """
+    tips_per_hour = 20.0
+    time_scale = 1.0
+
+    def __init__(self, pin, pull_up=True, bounce_time=None):
+        self.pin = types.SimpleNamespace(number=pin)
+        self.when_pressed = None
+        self._closed = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self.tips_per_hour > 0:
+            gap = random.expovariate(self.tips_per_hour / 3600.0) * self.time_scale
+            if self._closed.wait(gap):
+                return
+            callback = self.when_pressed
+            if callback:
+                callback()
+
+    def close(self):
+        self._closed.set()
+
+class _Transmission:
+    def __init__(self, sender, destination, data, airtime):
+        self.sender = sender
+        self.destination = destination
+        self.data = data
+        self.airtime = airtime
+        self.collided = False
+        self.acked = Event()
+
+class RadioChannel:
+    """
+    A shared in-process LoRa channel. Overlapping transmissions collide and are
+    both lost, and each delivered packet is additionally dropped with `loss_rate`.
+    A packet that arrives while the receiver's FIFO still holds one it has not
+    read is lost too (an overrun). Airtime is accumulated per node so duty
+    cycle can be checked.
+    """
+    HEADER_BYTES = 4  # RadioHead to/from/id/flags header
+
+    def __init__(self, loss_rate=0.0, time_scale=1.0, sf=7, bw_hz=125000):
+        self.loss_rate = loss_rate
+        self.time_scale = time_scale
+        self.sf = sf
+        self.bw_hz = bw_hz
+        self.radios = {}
+        self.airtime_by_node = {}
+        self.stats = {'sent': 0, 'delivered': 0, 'collisions': 0, 'lost': 0, 'overruns': 0}
+        self._active = []
+        self._lock = Lock()
+
+    def airtime(self, payload_bytes):
+        return lora_airtime(payload_bytes + self.HEADER_BYTES, self.sf, self.bw_hz)
+
+    def attach(self, radio):
+        with self._lock:
+            self.radios[radio.node] = radio
+
+    def transmit(self, sender, destination, data, deliver=True):
+        """
+        Puts a packet on air, blocking for its airtime. Returns the transmission.
+        ACKs are not delivered to an inbox; the sender waits on the data packet's `acked`.
+        """
+        tx = _Transmission(sender, destination, data, self.airtime(len(data)))
+        with self._lock:
+            for other in self._active:
+                other.collided = tx.collided = True
+            self._active.append(tx)
+            self.stats['sent'] += 1
+            self.airtime_by_node[sender] = self.airtime_by_node.get(sender, 0.0) + tx.airtime
+        time.sleep(tx.airtime * self.time_scale)
+        with self._lock:
+            self._active.remove(tx)
+            if tx.collided:
+                self.stats['collisions'] += 1
+                return tx
+            if random.random() < self.loss_rate:
+                self.stats['lost'] += 1
+                return tx
+            if destination == BROADCAST_ADDRESS:
+                receivers = [radio for node, radio in self.radios.items() if node != sender]
+            else:
+                receivers = [self.radios[destination]] if destination in self.radios else []
+        if not deliver:
+            return tx
+        for receiver in receivers:
+            if receiver.node == sender:
+                continue
+            try:
+                receiver._inbox.put_nowait(tx)
+            except queue.Full:
+                with self._lock:
+                    self.stats['overruns'] += 1
+                continue
+            with self._lock:
+                self.stats['delivered'] += 1
+        return tx
+
+class SimulatedRFM9x:
+    """
+    Drop-in for adafruit_rfm9x.RFM9x on a RadioChannel, covering the parts of
+    the API the LoRa handler uses.
+    """
+    channel = None
+    ack_wait = 0.5
+    ack_retries = 5
+
+    def __init__(self, spi, cs, reset, frequency, **kwargs):
+        self.frequency_mhz = frequency
+        self.tx_power = 13
+        self.destination = 0xFF
+        self.last_rssi = 0.0
+        self._node = 0xFF
+        # The radio's FIFO holds a single received packet
+        self._inbox = queue.Queue(maxsize=1)
+
+    @property
+    def node(self):
+        return self._node
+
+    @node.setter
+    def node(self, value):
+        self._node = value
+        self.channel.attach(self)
+
+    def send(self, data, destination=None):
+        self.channel.transmit(self.node, self.destination if destination is None else destination, bytes(data))
+        return True
+
+    def send_with_ack(self, data):
+        for _ in range(self.ack_retries + 1):
+            tx = self.channel.transmit(self.node, self.destination, bytes(data))
+            if tx.acked.wait(self.ack_wait * self.channel.time_scale):
+                return True
+        return False
+
+    def receive(self, keep_listening=True, with_header=False, with_ack=False, timeout=None):
+        try:
+            tx = self._inbox.get(timeout=None if timeout is None else timeout * self.channel.time_scale)
+        except queue.Empty:
+            return None
+        self.last_rssi = random.uniform(-115.0, -60.0)
+        if with_ack:
+            ack = self.channel.transmit(self.node, tx.sender, b'!', deliver=False)
+            if not ack.collided:
+                tx.acked.set()
+        return tx.data
+
+def use_simulation(sim_config, config):
+    """
+    Registers simulated Modbus, GPIO and LoRa backends with the hardware loader
+    so the rest of the code runs unchanged without any devices attached.
+    """
+    time_scale = sim_config.get('time_scale', 1.0)
+
+    bus = SimulatedModbusBus(sim_config.get('modbus_latency_ms', 20), sim_config.get('modbus_error_rate', 0.0), time_scale)
+    bus.add_devices_from_config(config)
+    SimulatedInstrument.bus = bus
+    hardware.register('minimalmodbus', types.SimpleNamespace(
+        Instrument=SimulatedInstrument, MODE_RTU='rtu', MODE_ASCII='ascii',
+        NoResponseError=NoResponseError, InvalidResponseError=InvalidResponseError))
+    hardware.register_port(SIMULATED_PORT)
+
+    SimulatedButton.tips_per_hour = sim_config.get('rain_tips_per_hour', 20.0)
+    SimulatedButton.time_scale = time_scale
+    hardware.register('gpiozero', types.SimpleNamespace(Button=SimulatedButton))
+
+    channel = RadioChannel(sim_config.get('lora_loss_rate', 0.0), time_scale)
+    SimulatedRFM9x.channel = channel
+    pins = types.SimpleNamespace(CE1='CE1', D25='D25', SCK='SCK', MOSI='MOSI', MISO='MISO')
+    hardware.register('board', pins)
+    hardware.register('busio', types.SimpleNamespace(SPI=lambda *args, **kwargs: None))
+    hardware.register('digitalio', types.SimpleNamespace(DigitalInOut=lambda pin: pin))
+    hardware.register('adafruit_rfm9x', types.SimpleNamespace(RFM9x=SimulatedRFM9x))
+
+    log.info("[Simulation] Using simulated hardware (%d Modbus devices on %s, LoRa loss rate %.0f%%, time scale %s).",
+             len(bus.devices), SIMULATED_PORT, channel.loss_rate * 100, time_scale)
+    return bus, channel
@@ -0,0 +1,215 @@
+# spool.py
+import os
+import uuid
+import zlib
+import struct
+import logging
+import datetime
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'WSSPOOL1'
+HEADER_SIZE = len(MAGIC) + 16   # Magic, then the spool id as 16 raw uuid bytes
+FRAME = struct.Struct('<HI')    # Payload length, CRC-32 of the payload
+STRING = struct.Struct('<cH')   # b'S', string id, then UTF-8 text
+READING = struct.Struct('<cHqiHHdd')  # b'R', db, microseconds, station, sensor, metric, value, rssi
+TEXT_READING = struct.Struct('<cHiHHddH')  # b'T', as above with the timestamp kept as text
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+NO_RSSI = float('nan')
+
+def _to_micros(timestamp):
+    """Microseconds since the epoch, or None if the ISO text would not round-trip exactly."""
+    try:
+        dt = datetime.datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        return None
+    micros = (dt - EPOCH) // datetime.timedelta(microseconds=1)
+    return micros if _from_micros(micros) == timestamp else None
+
+def _from_micros(micros):
+    return (EPOCH + datetime.timedelta(microseconds=micros)).isoformat()
+
+class ReadingSpool:
+    """
+    Append-only file of readings that could not be written to their database,
+    e.g. while the USB drive is unplugged. Each append is one batch followed by
+    a single fsync. Records are framed with their length and a CRC-32, so a
+    write torn by a power cut is detected and cut off when the file is reopened;
+    strings (database paths, sensor and metric names) are written once per file
+    and then referenced by id, keeping a reading at about 40 bytes.
+
+    `spool_id` identifies the file, and each reading's end offset its place in
+    it; both are stored alongside replayed rows, so no reading is applied to a
+    database twice, even when more are appended after a partial replay.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.spool_id = None
+        self.strings = {}
+        self.count = 0
+        if os.path.exists(path):
+            self._recover()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size(self):
+        return self.file.tell() if self.file else 0
+
+    def _recover(self):
+        """Rebuilds the string table from an existing file and truncates any torn tail."""
+        self.strings, self.count = {}, 0
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+                good_end = 0
+            else:
+                self.spool_id = str(uuid.UUID(bytes=header[len(MAGIC):]))
+                good_end = HEADER_SIZE
+                for payload, end in self._iter_frames(f):
+                    if payload[:1] == b'S':
+                        _, string_id = STRING.unpack_from(payload)
+                        self.strings[payload[STRING.size:].decode('utf-8')] = string_id
+                    else:
+                        self.count += 1
+                    good_end = end
+        if good_end == 0:
+            log.warning("[Spool] %s is not a spool file; moving it aside.", self.path)
+            os.replace(self.path, self.path + '.corrupt')
+            self.spool_id, self.strings, self.count = None, {}, 0
+            return
+        self.file = open(self.path, 'r+b')
+        self.file.truncate(good_end)
+        self.file.seek(good_end)
+        log.info("[Spool] Recovered %d readings from %s", self.count, self.path)
+
+    @staticmethod
+    def _iter_frames(f):
+        """Yields (payload, end offset) for every intact record, stopping at the first bad one."""
+        while True:
+            frame = f.read(FRAME.size)
+            if len(frame) < FRAME.size:
+                return
+            length, crc = FRAME.unpack(frame)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            yield payload, f.tell()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        spool_id = uuid.uuid4()
+        self.file = open(self.path, 'w+b')
+        self.file.write(MAGIC + spool_id.bytes)
+        self.spool_id = str(spool_id)
+
+    def _frame(self, payload):
+        return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _string_id(self, text, out):
+        string_id = self.strings.get(text)
+        if string_id is None:
+            string_id = self.strings[text] = len(self.strings)
+            out.append(self._frame(STRING.pack(b'S', string_id) + text.encode('utf-8')))
+        return string_id
+
+    def append(self, db_path, rows):
+        """
+        Durably appends readings destined for `db_path`. `rows` are
+        (timestamp, station_id, sensor, metric, value, rssi) tuples, as for
+        DatabaseManager.write_readings.
+        """
+        if not rows:
+            return
+        if self.file is None and os.path.exists(self.path):
+            self._recover()  # Reopened after close(), e.g. a write during shutdown
+        if self.file is None:
+            self._open()
+        out = []
+        db_id = self._string_id(db_path, out)
+        for timestamp, station_id, sensor, metric, value, rssi in rows:
+            sensor_id = self._string_id(sensor, out)
+            metric_id = self._string_id(metric, out)
+            rssi = NO_RSSI if rssi is None else rssi
+            micros = _to_micros(timestamp)
+            if micros is not None:
+                payload = READING.pack(b'R', db_id, micros, station_id, sensor_id, metric_id, value, rssi)
+            else:
+                text = timestamp.encode('utf-8')
+                payload = TEXT_READING.pack(b'T', db_id, station_id, sensor_id, metric_id, value, rssi, len(text)) + text
+            out.append(self._frame(payload))
+        self.file.write(b''.join(out))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.count += len(rows)
+
+    def read(self):
+        """
+        Returns every spooled reading as {db_path: (offsets, rows)} in the order
+        they were spooled, where offsets[i] is the file offset just after rows[i].
+        """
+        by_db = {}
+        for db_path, offsets, rows in self.iter_chunks():
+            all_offsets, all_rows = by_db.setdefault(db_path, ([], []))
+            all_offsets.extend(offsets)
+            all_rows.extend(rows)
+        return by_db
+
+    def iter_chunks(self, chunk_size=1000):
+        """
+        Yields the spooled readings as (db_path, offsets, rows) chunks of at most
+        `chunk_size` rows for one database each, in spool order per database,
+        so memory use stays bounded however long the outage was. Readings
+        appended while the chunks are consumed are yielded too.
+        """
+        if not self.count:
+            return
+        if self.file:
+            self.file.flush()
+        names, pending = {}, {}
+        with open(self.path, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            while True:
+                for payload, end in self._iter_frames(f):
+                    kind = payload[:1]
+                    if kind == b'S':
+                        _, string_id = STRING.unpack_from(payload)
+                        names[string_id] = payload[STRING.size:].decode('utf-8')
+                        continue
+                    if kind == b'R':
+                        _, db_id, micros, station_id, sensor_id, metric_id, value, rssi = READING.unpack(payload)
+                        timestamp = _from_micros(micros)
+                    else:
+                        _, db_id, station_id, sensor_id, metric_id, value, rssi, _ = TEXT_READING.unpack_from(payload)
+                        timestamp = payload[TEXT_READING.size:].decode('utf-8')
+                    rssi = None if rssi != rssi else rssi  # NaN marks a missing RSSI
+                    offsets, rows = pending.setdefault(names[db_id], ([], []))
+                    offsets.append(end)
+                    rows.append((timestamp, station_id, names[sensor_id], names[metric_id], value, rssi))
+                    if len(rows) >= chunk_size:
+                        del pending[names[db_id]]
+                        yield names[db_id], offsets, rows
+                if not pending:
+                    return
+                # Yield the rest, then look for readings appended in the meantime
+                for db_path, (offsets, rows) in list(pending.items()):
+                    del pending[db_path]
+                    yield db_path, offsets, rows
+    def remove(self):
+        """Deletes the spool once its readings are safely in their databases."""
+        if self.file:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.spool_id, self.strings, self.count = None, {}, 0
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,293 @@
+# supervisor.py
+import os
+import time
+import queue
+import signal
+import logging
+import datetime
+import multiprocessing
+from threading import Thread
+
+import metrics
+import logging_setup
+
+log = logging.getLogger(__name__)
+
+# Offsets from metrics.port for each worker's metrics server. The writer uses
+# the configured port itself, so the dashboard's /metrics keeps working.
+WORKER_PORT_OFFSETS = {'writer': 0, 'modbus': 1, 'lora': 2, 'upload': 3}
+
+FORWARD_DROPPED = metrics.counter('ws_supervisor_forward_dropped_total',
+                                  "Readings a worker could not hand to the writer process.", ('worker',))
+WORKER_RESTARTS = metrics.counter('ws_supervisor_worker_restarts_total', "Worker processes restarted after exiting.", ('worker',))
+
+class QueueIngest:
+    """
+    Stands in for IngestPipeline inside a worker process: readings are sent to
+    the writer process, which owns the database, over a multiprocessing queue.
+    When the queue is full, 'block' waits up to `block_timeout_seconds`; the
+    other policies drop the reading being submitted, since the oldest one has
+    already left this process.
+    """
+    def __init__(self, readings, db_path, config, worker):
+        self.readings = readings
+        self.db_path = db_path
+        section = config.get('ingest', {})
+        self.block = section.get('policy', 'drop_oldest') == 'block'
+        self.block_timeout = section.get('block_timeout_seconds', 1.0)
+        self._dropped = FORWARD_DROPPED.labels(worker)
+
+    def _put(self, message):
+        try:
+            if self.block:
+                self.readings.put(message, timeout=self.block_timeout)
+            else:
+                self.readings.put_nowait(message)
+            return True
+        except queue.Full:
+            self._dropped.inc()
+            log.warning("[Supervisor] Writer queue full, dropped a reading.")
+            return False
+
+    def submit(self, station_id, sensor, metric, value, rssi=None, timestamp=None, db=None):
+        if timestamp is None:
+            timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        db_path = db.db_path if db else self.db_path
+        return self._put(('reading', db_path, timestamp, station_id, sensor, metric, value, rssi))
+
+    def submit_tips(self, station_id, sensor, tip_times, db=None):
+        db_path = db.db_path if db else self.db_path
+        return self._put(('tips', db_path, station_id, sensor, list(tip_times)))
+
+    def flush(self, timeout=None):
+        return True
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+def _init_worker(config, name, simulate):
+    """Per-process setup: logging, simulated hardware and this worker's metrics server."""
+    # Ctrl+C reaches the whole process group; workers stop when the supervisor says so
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging_setup.setup_logging(config, name)
+    if simulate:
+        from simulation import use_simulation
+        use_simulation(config.get('simulation', {}), config)
+    metrics_config = config.get('metrics', {})
+    if metrics_config.get('enabled', False):
+        port = metrics_config.get('port', metrics.DEFAULT_METRICS_PORT) + WORKER_PORT_OFFSETS[name]
+        try:
+            return metrics.start_http_server(port)
+        except OSError as e:
+            log.error("[Metrics] Could not start metrics server for %s: %s", name, e)
+    return None
+
+def _run_services(name, config, stop, weather_station, services):
+    """Starts a worker's services, applies config changes and stops them when the supervisor asks."""
+    from run_weather_station import config_watcher_loop
+
+    if weather_station:
+        weather_station.start()
+    for service in services:
+        service.start()
+    watcher = Thread(target=config_watcher_loop, args=('config.json', weather_station, services, stop),
+                     kwargs={'config': config, 'component': name}, daemon=True)
+    watcher.start()
+    log.info("[Supervisor] %s worker running (pid %d).", name, os.getpid())
+    stop.wait()
+    if weather_station:
+        weather_station.stop()
+    for service in services:
+        service.stop()
+
+def writer_main(config, db_path, readings, stop, simulate):
+    """The only process that writes to the database. Exits after the supervisor sends None."""
+    from database import DatabaseManager
+    from ingest import IngestPipeline
+    from migrate_store import merge_into_store
+    from run_weather_station import start_recent_readings
+
+    metrics_server = _init_worker(config, 'writer', simulate)
+    db_manager = DatabaseManager(db_path)
+    if config.get('database', {}).get('single_store', False):
+        merge_into_store(db_manager)
+    recent, recent_server = start_recent_readings(config, db_manager)
+    ingest = IngestPipeline.from_config(config, db_manager, recent=recent)
+    ingest.start()
+    dbs = {db_path: db_manager}
+    parent = multiprocessing.parent_process()
+    log.info("[Supervisor] writer worker running (pid %d).", os.getpid())
+
+    while True:
+        try:
+            message = readings.get(timeout=1.0)
+        except queue.Empty:
+            if parent and not parent.is_alive():
+                break
+            continue
+        if message is None:
+            break
+        kind, path = message[0], message[1]
+        db = dbs.get(path)
+        if db is None:
+            db = dbs[path] = DatabaseManager(path)
+        if kind == 'reading':
+            timestamp, station_id, sensor, metric, value, rssi = message[2:]
+            ingest.submit(station_id, sensor, metric, value, rssi=rssi, timestamp=timestamp, db=db)
+        elif kind == 'tips':
+            station_id, sensor, tip_times = message[2:]
+            ingest.submit_tips(station_id, sensor, tip_times, db=db)
+
+    ingest.stop()
+    if recent_server:
+        recent_server.stop()
+    for db in dbs.values():
+        db.close()
+    if metrics_server:
+        metrics_server.shutdown()
+
+def modbus_main(config, db_path, readings, stop, simulate):
+    """Modbus sensors, the rain gauge and derived metrics."""
+    from database import DatabaseManager
+    from weather_station_library import WeatherStation
+    from derived import DerivedMetricsHandler
+
+    metrics_server = _init_worker(config, 'modbus', simulate)
+    # Read-only use here: derived metrics warm their windows from history
+    db_manager = DatabaseManager(db_path)
+    ingest = QueueIngest(readings, db_path, config, 'modbus')
+    derived = DerivedMetricsHandler(config, db_manager, ingest=ingest) if 'derived_metrics' in config else None
+    weather_station = WeatherStation(config, db_manager=db_manager, derived=derived, ingest=ingest)
+    weather_station.discover_and_add_sensors()
+    _run_services('modbus', config, stop, weather_station, [derived] if derived else [])
+    db_manager.close()
+    if metrics_server:
+        metrics_server.shutdown()
+
+def lora_main(config, db_path, readings, stop, simulate):
+    """LoRa send (remote role) or receive (base role)."""
+    from database import DatabaseManager
+    from handlers import LoRaHandler
+
+    metrics_server = _init_worker(config, 'lora', simulate)
+    db_manager = DatabaseManager(db_path)
+    lora_handler = LoRaHandler(config, db_manager, ingest=QueueIngest(readings, db_path, config, 'lora'))
+    _run_services('lora', config, stop, None, [lora_handler])
+    db_manager.close()
+    if metrics_server:
+        metrics_server.shutdown()
+
+def upload_main(config, db_path, readings, stop, simulate):
+    """Adafruit IO uploads, so slow HTTP calls never share a GIL with acquisition."""
+    from database import DatabaseManager
+    from run_weather_station import create_aio_handler
+
+    metrics_server = _init_worker(config, 'upload', simulate)
+    db_manager = DatabaseManager(db_path)
+    aio_handler = create_aio_handler(config, db_manager)
+    if aio_handler:
+        _run_services('upload', config, stop, None, [aio_handler])
+    else:
+        stop.wait()
+    db_manager.close()
+    if metrics_server:
+        metrics_server.shutdown()
+
+WORKERS = {'writer': writer_main, 'modbus': modbus_main, 'lora': lora_main, 'upload': upload_main}
+
+class Supervisor:
+    """
+    Runs the collector as separate processes so acquisition, radio I/O and
+    uploads each get their own interpreter and core: a 'writer' process owns
+    the database (ingest pipeline, spool and recent readings), and 'modbus',
+    'lora' and 'upload' workers send it readings over one bounded
+    multiprocessing queue. A worker that exits unexpectedly is restarted
+    after `restart_delay_seconds` without disturbing the others; the queue
+    lives in the supervisor, so readings sent while the writer restarts wait
+    for it.
+    """
+    def __init__(self, config, db_path, simulate=False):
+        self.config = config
+        self.db_path = db_path
+        self.simulate = simulate
+        section = config.get('supervisor', {})
+        self.restart_delay = section.get('restart_delay_seconds', 5)
+        self.shutdown_timeout = section.get('shutdown_timeout_seconds', 10)
+        # Spawned workers start from a clean interpreter rather than a fork of this one
+        self.context = multiprocessing.get_context('spawn')
+        self.readings = self.context.Queue(maxsize=section.get('queue_size', 10000))
+        self.stop_event = self.context.Event()
+        self.processes = {}
+        self.restart_at = {}
+
+    def worker_names(self):
+        """The workers this configuration needs; the writer always runs."""
+        names = ['writer']
+        services = self.config.get('services', {})
+        sensors_enabled = any(s.get('enabled', False) for s in self.config.get('sensors', {}).values())
+        if (sensors_enabled or self.config.get('rain_gauge', {}).get('enabled', False)
+                or self.config.get('derived_metrics', {}).get('enabled', False)):
+            names.append('modbus')
+        if services.get('lora_enabled'):
+            names.append('lora')
+        if services.get('adafruit_io_enabled'):
+            names.append('upload')
+        return names
+
+    def start_worker(self, name):
+        process = self.context.Process(
+            target=WORKERS[name], name=f"ws-{name}",
+            args=(self.config, self.db_path, self.readings, self.stop_event, self.simulate))
+        process.start()
+        self.processes[name] = process
+        log.info("[Supervisor] Started %s worker (pid %d).", name, process.pid)
+
+    def run(self):
+        """Starts the workers and keeps them running until Ctrl+C."""
+        for name in self.worker_names():
+            self.start_worker(name)
+        print("\n--- All Services are Running in Worker Processes --- (Press Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+                self.check_workers()
+        except KeyboardInterrupt:
+            print("\nShutting down gracefully...")
+        finally:
+            self.shutdown()
+        print("Shutdown complete.")
+
+    def check_workers(self):
+        """Restarts any worker that has exited, after the restart delay."""
+        now = time.monotonic()
+        for name, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            if name not in self.restart_at:
+                log.error("[Supervisor] %s worker exited with code %s; restarting in %ss.",
+                          name, process.exitcode, self.restart_delay)
+                self.restart_at[name] = now + self.restart_delay
+            elif now >= self.restart_at[name]:
+                del self.restart_at[name]
+                WORKER_RESTARTS.labels(name).inc()
+                self.start_worker(name)
+
+    def shutdown(self):
+        """Stops the producers first, then lets the writer drain the queue and exit."""
+        self.stop_event.set()
+        producers = [p for name, p in self.processes.items() if name != 'writer']
+        for process in producers:
+            process.join(self.shutdown_timeout)
+            if process.is_alive():
+                log.warning("[Supervisor] %s did not stop in time; terminating it.", process.name)
+                process.terminate()
+        writer = self.processes.get('writer')
+        if writer and writer.is_alive():
+            self.readings.put(None)
+            writer.join(self.shutdown_timeout * 3)
+            if writer.is_alive():
+                log.warning("[Supervisor] Writer did not finish in time; terminating it.")
+                writer.terminate()
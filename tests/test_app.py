@@ -0,0 +1,62 @@
+# tests/test_app.py
+import time
+import sqlite3
+import threading
+import http.client
+from werkzeug.serving import make_server
+
+import app
+from database import DatabaseManager
+from live_stream import ReadingTailer
+
+SLOW_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 3000000) SELECT count(*) FROM c"
+
+def test_slow_query_does_not_stall_an_open_stream(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / 'station.db'))
+    tailer = ReadingTailer(lambda: [db.db_path], interval=0.02)
+    query_started, query_done = threading.Event(), threading.Event()
+
+    def slow_aggregate(*args):
+        query_started.set()
+        try:
+            sqlite3.connect(':memory:').execute(SLOW_QUERY).fetchone()
+        finally:
+            query_done.set()
+        return {}
+
+    monkeypatch.setattr(app, 'reading_tailer', tailer)
+    monkeypatch.setattr(app, 'get_all_db_paths', lambda path: [db.db_path])
+    monkeypatch.setattr(app, 'aggregate_series', slow_aggregate)
+    # Threaded like the gthread worker
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        stream = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+        stream.request('GET', '/api/stream')
+        events = stream.getresponse()
+        assert events.readline() == b"retry: 5000\n"
+        time.sleep(0.2)  # The tailer starts from the newest row once the stream is open
+
+        statuses = []
+        def aggregate():
+            conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=30)
+            conn.request('GET', '/api/aggregate/soil-temp-c')
+            statuses.append(conn.getresponse().status)
+        request = threading.Thread(target=aggregate)
+        request.start()
+        assert query_started.wait(5)
+
+        db.write_readings([("2024-01-01T00:00:00+00:00", 1, 'soil', 'temp-c', 21.5, None)])
+        line = events.readline()
+        while not line.startswith(b"data:"):
+            line = events.readline()
+        assert b'21.5' in line
+        assert not query_done.is_set()  # The reading arrived while the query was still running
+
+        request.join(30)
+        assert statuses == [200]
+        stream.close()
+    finally:
+        server.shutdown()
+        tailer.stop()
+        db.close()
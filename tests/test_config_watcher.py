@@ -0,0 +1,50 @@
+# tests/test_config_watcher.py
+import json
+import threading
+
+import run_weather_station
+
+class ScriptedWatcher:
+    """Stands in for FileWatcher: runs `steps` (file writes) one per wait() call."""
+    steps = []
+
+    def __init__(self, path):
+        self.steps = list(ScriptedWatcher.steps)
+
+    def wait(self, stop_event):
+        if not self.steps:
+            return False
+        self.steps.pop(0)()
+        return True
+
+    def close(self):
+        pass
+
+class RecordingService:
+    config_sections = {'timing'}
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.configs = []
+
+    def update_config(self, config):
+        self.configs.append(config)
+        if self.fail:
+            raise RuntimeError("cannot apply")
+
+def test_watcher_keeps_running_after_bad_files_and_failing_services(tmp_path, monkeypatch):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'timing': {'interval': 1}}))
+    ScriptedWatcher.steps = [
+        lambda: path.write_text('{"timing": {'),  # half-written
+        lambda: path.write_text(json.dumps({'timing': {'interval': 2}})),
+        lambda: path.write_text(json.dumps({'timing': {'interval': 3}})),
+    ]
+    monkeypatch.setattr(run_weather_station, 'FileWatcher', ScriptedWatcher)
+    failing, working = RecordingService(fail=True), RecordingService()
+
+    run_weather_station.config_watcher_loop(str(path), None, [failing, working], threading.Event(),
+                                            config=json.loads(path.read_text()))
+
+    assert [c['timing']['interval'] for c in working.configs] == [2, 3]
+    assert len(failing.configs) == 2
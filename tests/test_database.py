@@ -0,0 +1,32 @@
+# tests/test_database.py
+import os
+
+from database import DatabaseManager
+
+def make_db(tmp_path, rows=0):
+    db = DatabaseManager(os.path.join(tmp_path, 'station.db'))
+    db.write_readings([(f"2024-01-01T00:00:{i % 60:02d}+00:00", 1, 'soil', 'temp-c', float(i), None)
+                       for i in range(rows)])
+    return db
+
+def test_streaming_query_survives_writes_and_rollbacks(tmp_path):
+    db = make_db(tmp_path, rows=2000)
+    readings = db.iter_readings(station_id=1, batch_size=100)
+    seen = [next(readings) for _ in range(150)]
+
+    # A commit and a failed batch (NOT NULL value) on the writer connection mid-scan
+    assert db.write_readings([("2024-01-02T00:00:00+00:00", 1, 'soil', 'temp-c', 1.0, None)]) == 1
+    assert db.write_readings([("2024-01-02T00:00:00+00:00", 1, 'soil', 'temp-c', None, None)]) is None
+
+    seen.extend(readings)
+    assert [r[4] for r in seen] == [float(i) for i in range(2000)]
+    db.close()
+
+def test_streaming_query_does_not_hold_the_lock(tmp_path):
+    db = make_db(tmp_path, rows=10)
+    readings = db.iter_readings(batch_size=2)
+    next(readings)
+    assert db._lock.acquire(blocking=False)
+    db._lock.release()
+    assert sum(1 for _ in readings) == 9
+    db.close()
@@ -0,0 +1,77 @@
+# tests/test_derived.py
+import datetime
+
+import pytest
+
+from derived import SlidingWindow, WindowMetric, VectorMeanMetric, DewPointMetric, GrowingDegreeDaysMetric
+
+def local(*args):
+    return datetime.datetime(*args).timestamp()
+
+def feed_day(gdd, day, low, high):
+    gdd.add(gdd.inputs[0], local(day.year, day.month, day.day, 6), low)
+    gdd.add(gdd.inputs[0], local(day.year, day.month, day.day, 15), high)
+
+def test_sliding_window_tracks_sum_and_max():
+    window = SlidingWindow(10)
+    for t, value in [(0, 5.0), (3, 9.0), (6, 2.0), (12, 4.0)]:
+        window.add(t, value)
+    window.evict(12)
+    assert len(window) == 3
+    assert window.total == 15.0
+    assert window.maxima[0][1] == 9.0
+    window.evict(14)
+    assert window.maxima[0][1] == 4.0
+
+def test_rate_scales_the_window_sum():
+    rain = WindowMetric({'type': 'rate', 'input': {'sensor': 'rain', 'metric': 'tip-mm'},
+                         'window_seconds': 600, 'per_seconds': 3600})
+    for t in range(0, 600, 60):
+        rain.add(rain.inputs[0], t, 0.2)
+    assert rain.value(599) == pytest.approx(12.0)
+    assert rain.value(2000) == 0.0
+
+def test_vector_mean_wraps_around_north():
+    wind = VectorMeanMetric({'input': {'sensor': 'wind', 'metric': 'dir-deg'}})
+    wind.add(wind.inputs[0], 0, 350.0)
+    wind.add(wind.inputs[0], 1, 10.0)
+    direction = wind.value(2)
+    assert min(direction, 360 - direction) == pytest.approx(0.0, abs=1e-6)
+
+def test_dew_point_needs_recent_inputs():
+    dew = DewPointMetric({'temperature': {'sensor': 'air', 'metric': 'temp-c'},
+                          'humidity': {'sensor': 'air', 'metric': 'rh'}, 'max_age_seconds': 60})
+    dew.add(dew.temperature, 0, 20.0)
+    dew.add(dew.humidity, 0, 50.0)
+    assert dew.value(30) == pytest.approx(9.26, abs=0.01)
+    assert dew.value(120) is None
+
+def make_gdd():
+    return GrowingDegreeDaysMetric({'input': {'sensor': 'air', 'metric': 'temp-c'}, 'base_c': 10.0,
+                                    'season_start': '03-01'})
+
+def test_gdd_accumulates_days_in_a_season():
+    gdd = make_gdd()
+    feed_day(gdd, datetime.date(2024, 5, 1), 10.0, 20.0)  # 5
+    feed_day(gdd, datetime.date(2024, 5, 2), 12.0, 24.0)  # 8
+    assert gdd.value(local(2024, 5, 2, 18)) == pytest.approx(13.0)
+
+def test_gdd_resets_when_the_start_day_has_no_readings():
+    gdd = make_gdd()
+    feed_day(gdd, datetime.date(2024, 2, 27), 10.0, 20.0)
+    feed_day(gdd, datetime.date(2024, 2, 28), 10.0, 20.0)
+    # Nothing on 03-01: the sensor was down
+    feed_day(gdd, datetime.date(2024, 3, 3), 10.0, 14.0)
+    assert gdd.value(local(2024, 3, 3, 18)) == pytest.approx(2.0)
+
+def test_gdd_resets_over_more_than_one_rollover():
+    gdd = make_gdd()
+    feed_day(gdd, datetime.date(2024, 6, 1), 10.0, 20.0)
+    feed_day(gdd, datetime.date(2025, 6, 1), 10.0, 20.0)
+    feed_day(gdd, datetime.date(2026, 6, 1), 10.0, 30.0)
+    assert gdd.value(local(2026, 6, 1, 18)) == pytest.approx(10.0)
+
+def test_gdd_reports_zero_in_a_new_season_before_any_reading():
+    gdd = make_gdd()
+    feed_day(gdd, datetime.date(2024, 2, 20), 10.0, 20.0)
+    assert gdd.value(local(2024, 3, 2, 12)) == 0.0
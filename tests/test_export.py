@@ -0,0 +1,22 @@
+# tests/test_export.py
+import pytest
+
+from export import normalize_timestamp
+
+def test_iso_dates_are_not_read_as_epoch_seconds():
+    assert normalize_timestamp('20240101') == '2024-01-01T00:00:00+00:00'
+
+def test_iso_times_are_converted_to_utc():
+    assert normalize_timestamp('2024-01-01T05:00:00+02:00') == '2024-01-01T03:00:00+00:00'
+
+def test_epoch_seconds():
+    assert normalize_timestamp('1700000000') == '2023-11-14T22:13:20+00:00'
+    assert normalize_timestamp(1700000000.5) == '2023-11-14T22:13:20.500000+00:00'
+
+def test_small_numbers_are_rejected():
+    with pytest.raises(ValueError):
+        normalize_timestamp('2024')
+
+def test_empty_values():
+    assert normalize_timestamp(None) is None
+    assert normalize_timestamp('') is None
@@ -0,0 +1,82 @@
+# tests/test_ingest.py
+import threading
+
+import pytest
+
+from database import DatabaseManager
+from ingest import IngestPipeline
+
+class StalledDatabase(DatabaseManager):
+    """Holds the writer on its first batch until `release` is set, so the queue fills."""
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.release = threading.Event()
+        self.writing = threading.Event()
+
+    def write_readings(self, rows):
+        self.writing.set()
+        self.release.wait(5)
+        return super().write_readings(rows)
+
+def stalled_pipeline(tmp_path, policy, **kwargs):
+    db = StalledDatabase(str(tmp_path / 'station.db'))
+    pipeline = IngestPipeline(db, queue_size=2, batch_size=1, max_delay_seconds=0, policy=policy, **kwargs)
+    pipeline.start()
+    pipeline.submit(1, 'soil', 'temp-c', 0.0)
+    assert db.writing.wait(5)  # The writer now holds reading 0
+    return db, pipeline
+
+def stored(db):
+    return [r[4] for r in db.iter_readings()]
+
+def finish(db, pipeline):
+    db.release.set()
+    assert pipeline.flush(timeout=5)
+    pipeline.stop()
+
+def test_drop_oldest_keeps_the_newest_readings(tmp_path):
+    db, pipeline = stalled_pipeline(tmp_path, 'drop_oldest')
+    results = [pipeline.submit(1, 'soil', 'temp-c', float(v)) for v in range(1, 5)]
+    assert results == [True] * 4
+    finish(db, pipeline)
+    assert stored(db) == [0.0, 3.0, 4.0]
+
+def test_drop_newest_keeps_the_queued_readings(tmp_path):
+    db, pipeline = stalled_pipeline(tmp_path, 'drop_newest')
+    results = [pipeline.submit(1, 'soil', 'temp-c', float(v)) for v in range(1, 5)]
+    assert results == [True, True, False, False]
+    finish(db, pipeline)
+    assert stored(db) == [0.0, 1.0, 2.0]
+
+def test_block_waits_for_room_then_gives_up(tmp_path):
+    db, pipeline = stalled_pipeline(tmp_path, 'block', block_timeout_seconds=0.05)
+    assert pipeline.submit(1, 'soil', 'temp-c', 1.0)
+    assert pipeline.submit(1, 'soil', 'temp-c', 2.0)
+    assert not pipeline.submit(1, 'soil', 'temp-c', 3.0)
+    threading.Timer(0.05, db.release.set).start()
+    pipeline.block_timeout = 5
+    assert pipeline.submit(1, 'soil', 'temp-c', 4.0)
+    finish(db, pipeline)
+    assert stored(db) == [0.0, 1.0, 2.0, 4.0]
+
+def test_unknown_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        IngestPipeline(DatabaseManager(str(tmp_path / 'station.db')), policy='drop_all')
+
+def test_readings_are_committed_in_batches_per_database(tmp_path):
+    a = DatabaseManager(str(tmp_path / 'a.db'))
+    b = DatabaseManager(str(tmp_path / 'b.db'))
+    pipeline = IngestPipeline(a, batch_size=100, max_delay_seconds=0.05)
+    pipeline.start()
+    for v in range(10):
+        pipeline.submit(1, 'soil', 'temp-c', float(v))
+        pipeline.submit(2, 'soil', 'temp-c', float(v), db=b)
+    assert pipeline.flush(timeout=5)
+    pipeline.stop()
+    assert stored(a) == stored(b) == [float(v) for v in range(10)]
+
+def test_submit_writes_through_when_not_started(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'station.db'))
+    pipeline = IngestPipeline(db)
+    assert pipeline.submit(1, 'soil', 'temp-c', 1.0, timestamp="2024-01-01T00:00:00+00:00")
+    assert list(db.iter_readings()) == [("2024-01-01T00:00:00+00:00", 1, 'soil', 'temp-c', 1.0, None)]
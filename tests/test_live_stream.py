@@ -0,0 +1,91 @@
+# tests/test_live_stream.py
+import json
+import time
+
+from database import DatabaseManager
+from live_stream import ReadingTailer, sse_events
+
+class IdleTailer(ReadingTailer):
+    """A tailer whose polling thread is never started; batches are published by hand."""
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return True
+
+def test_streams_beyond_the_cap_are_told_to_retry_later():
+    tailer = IdleTailer(lambda: [], max_subscribers=1)
+    first = sse_events(tailer, keepalive_seconds=0.01)
+    assert next(first) == "retry: 5000\n\n"
+    busy = list(sse_events(tailer, busy_retry_seconds=30))
+    assert busy == ["retry: 30000\n\n"]
+    first.close()
+    assert tailer._subscribers == set()
+    second = sse_events(tailer)
+    assert next(second) == "retry: 5000\n\n"
+    second.close()
+
+def test_streams_end_after_their_lifetime():
+    tailer = IdleTailer(lambda: [])
+    events = sse_events(tailer, keepalive_seconds=0.01, lifetime_seconds=0.05)
+    assert next(events) == "retry: 5000\n\n"
+    tailer._publish([{'value': 1.0}])
+    assert next(events) == f"event: readings\ndata: {json.dumps([{'value': 1.0}])}\n\n"
+    rest = list(events)
+    assert rest[-1] == "retry: 1000\n\n"
+    assert tailer._subscribers == set()
+
+def write(db, values, station_id=1):
+    db.write_readings([("2024-01-01T00:00:00+00:00", station_id, 'soil', 'temp-c', float(v), None) for v in values])
+
+def values(q, timeout=2):
+    return [reading['value'] for reading in json.loads(q.get(timeout=timeout))]
+
+def test_client_after_an_idle_spell_only_gets_new_rows(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'station.db'))
+    tailer = ReadingTailer(lambda: [db.db_path], interval=0.02)
+    try:
+        q = tailer.subscribe()
+        time.sleep(0.1)
+        write(db, [1])
+        assert values(q) == [1.0]
+        tailer.unsubscribe(q)
+        write(db, range(100, 600))  # Written while nobody is listening
+        q = tailer.subscribe()
+        time.sleep(0.1)
+        write(db, [2])
+        assert values(q) == [2.0]
+    finally:
+        tailer.stop()
+        db.close()
+
+def test_new_database_files_only_stream_new_rows(tmp_path):
+    paths = [str(tmp_path / 'station.db')]
+    db = DatabaseManager(paths[0])
+    merged = DatabaseManager(str(tmp_path / 'stations.db'))
+    write(merged, range(100))
+    tailer = ReadingTailer(lambda: list(paths), interval=0.02)
+    try:
+        q = tailer.subscribe()
+        time.sleep(0.1)
+        paths.append(merged.db_path)
+        time.sleep(0.1)
+        write(merged, [1])
+        assert values(q) == [1.0]
+    finally:
+        tailer.stop()
+        db.close()
+        merged.close()
+
+def test_poll_reads_at_most_max_rows_per_database(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'station.db'))
+    tailer = ReadingTailer(lambda: [db.db_path], max_rows=10)
+    try:
+        tailer._refresh_databases()
+        write(db, range(25))
+        assert [r['value'] for r in tailer._poll()] == [float(v) for v in range(10)]
+        assert [r['value'] for r in tailer._poll()] == [float(v) for v in range(10, 20)]
+        assert len(tailer._poll()) == 5
+    finally:
+        tailer.stop()
+        db.close()
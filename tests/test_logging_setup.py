@@ -0,0 +1,51 @@
+# tests/test_logging_setup.py
+import logging
+import threading
+
+import logging_setup
+from logging_setup import RateLimitFilter, SamplingFilter
+
+def make_record(msg, *args, level=logging.INFO, name='weather_station_library'):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+def test_rate_limit_keys_on_the_template_not_the_arguments():
+    limiter = RateLimitFilter(burst=2, window_seconds=60)
+    passed = [limiter.filter(make_record("[Modbus] No answer from addr %s: %s", addr, 0.5)) for addr in range(10)]
+    assert passed == [True, True] + [False] * 8
+    assert len(limiter._windows) == 1
+
+def test_rate_limit_drops_expired_windows(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logging_setup.time, 'monotonic', lambda: now[0])
+    limiter = RateLimitFilter(burst=1, window_seconds=60)
+    for i in range(50):
+        limiter.filter(make_record(f"message {i}"))
+    assert len(limiter._windows) == 50
+    now[0] += 61
+    assert limiter.filter(make_record("later"))
+    assert list(limiter._windows) == [('weather_station_library', 'later')]
+
+def test_rate_limit_reports_suppressed_records(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logging_setup.time, 'monotonic', lambda: now[0])
+    limiter = RateLimitFilter(burst=1, window_seconds=60)
+    assert limiter.filter(make_record("Sensor failed"))
+    assert not limiter.filter(make_record("Sensor failed"))
+    now[0] += 30
+    assert not limiter.filter(make_record("Sensor failed"))
+    now[0] += 31
+    record = make_record("Sensor failed")
+    assert limiter.filter(record)
+    assert record.msg == "Sensor failed (2 similar messages suppressed)"
+
+def test_sampling_counts_are_exact_across_threads():
+    sampler = SamplingFilter({'weather_station_library': 10})
+    passed = []
+
+    def log_many():
+        passed.append(sum(sampler.filter(make_record("Reading %s", 1.0, level=logging.DEBUG)) for _ in range(1000)))
+
+    threads = [threading.Thread(target=log_many) for _ in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert sum(passed) == 800
@@ -0,0 +1,80 @@
+# tests/test_lora_schedule.py
+import json
+import types
+
+import pytest
+
+import lora_schedule
+from lora_schedule import AirtimeBudget, SlotScheduler, slot_window, MAX_PAYLOAD_BYTES
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lora_schedule, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+def test_budget_refuses_airtime_over_the_duty_cycle(clock):
+    budget = AirtimeBudget(duty_cycle=0.01, window_seconds=100)  # 1 s of airtime per window
+    assert budget.allow(0.6)
+    budget.spend(0.6)
+    assert budget.used() == pytest.approx(0.6)
+    assert budget.allow(0.4)
+    assert not budget.allow(0.5)
+
+def test_budget_frees_airtime_as_the_window_moves_on(clock):
+    budget = AirtimeBudget(duty_cycle=0.01, window_seconds=100)
+    budget.spend(0.8)
+    clock[0] += 50
+    budget.spend(0.2)
+    assert not budget.allow(0.1)
+    clock[0] += 51  # The first transmission has left the window
+    assert budget.allow(0.7)
+    assert budget.used() == pytest.approx(0.2)
+
+def test_full_duty_cycle_never_limits(clock):
+    budget = AirtimeBudget(duty_cycle=1.0, window_seconds=10)
+    budget.spend(10)
+    assert budget.allow(100)
+
+def beacon(scheduler):
+    return json.loads(scheduler.next_beacon())
+
+def test_scheduler_assigns_slots_in_the_order_remotes_are_heard():
+    scheduler = SlotScheduler(frame_seconds=10, slot_seconds=2, contention_slots=1)
+    assert scheduler.slot_count == 5 and scheduler.assignable_slots == 3
+    for station_id in (7, 3, 7, 9, 4):
+        scheduler.heard(station_id)
+    message = beacon(scheduler)
+    assert message['ids'] == [7, 3, 9]  # Station 4 waits for a free slot
+    assert (message['n'], message['c'], message['slot'], message['frame']) == (5, 1, 2, 10)
+
+def test_scheduler_frees_the_slot_of_a_silent_remote():
+    scheduler = SlotScheduler(frame_seconds=10, slot_seconds=2, expire_frames=2)
+    scheduler.heard(1)
+    scheduler.heard(2)
+    for _ in range(2):
+        beacon(scheduler)
+        scheduler.heard(2)
+    assert beacon(scheduler)['ids'] == [2]
+    scheduler.heard(3)
+    assert beacon(scheduler)['ids'] == [2, 3]
+
+def test_beacon_is_trimmed_to_one_packet():
+    scheduler = SlotScheduler(frame_seconds=3600, slot_seconds=1)
+    for station_id in range(100000, 100100):
+        scheduler.heard(station_id)
+    message = scheduler.next_beacon()
+    assert len(message) <= MAX_PAYLOAD_BYTES
+    ids = json.loads(message)['ids']
+    assert ids and ids == list(range(100000, 100000 + len(ids)))  # The earliest assignments are kept
+
+def test_assigned_remote_transmits_in_its_own_slot():
+    message = {'slot': 2.0, 'n': 5, 'c': 1, 'ids': [7, 3]}
+    assert slot_window(message, 3, 100.0, 0.1) == pytest.approx((104.1, 105.9))
+
+def test_unassigned_remote_picks_a_contention_slot():
+    message = {'slot': 2.0, 'n': 5, 'c': 2, 'ids': [7]}
+    for _ in range(50):
+        start, end = slot_window(message, 9, 100.0, 0.1)
+        assert 106.1 <= start <= 107.1 or 108.1 <= start <= 109.1
+        assert end - start <= 1.8 and end > start
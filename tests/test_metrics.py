@@ -0,0 +1,28 @@
+# tests/test_metrics.py
+import socket
+from collections import Counter
+
+import metrics
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def type_lines(text):
+    return Counter(line.split()[2] for line in text.splitlines() if line.startswith('# TYPE'))
+
+def test_dashboard_metrics_do_not_repeat_collector_families(monkeypatch):
+    import app
+    port = free_port()
+    # The collector's families are registered in this process by app's imports, as in production
+    server = metrics.start_http_server(port)
+    try:
+        monkeypatch.setattr(app, 'load_config', lambda: {'metrics': {'enabled': True, 'port': port}})
+        body = app.app.test_client().get('/metrics').get_data(as_text=True)
+    finally:
+        server.shutdown()
+    families = type_lines(body)
+    assert 'ws_dashboard_cache_requests_total' in families
+    assert 'ws_db_commit_seconds' in families
+    assert [name for name, count in families.items() if count > 1] == []
@@ -0,0 +1,64 @@
+# tests/test_migrate_store.py
+import os
+
+from database import DatabaseManager
+from migrate_store import merge_into_store, MERGED_DIR_NAME
+
+def make_station_db(path, values):
+    db = DatabaseManager(str(path))
+    db.write_readings([("2024-01-01T00:00:00+00:00", 2, 'soil', 'temp-c', v, None) for v in values])
+    db.close()
+
+def readings(db):
+    return [r[4] for r in db.iter_readings()]
+
+def test_merge_moves_sources_aside(tmp_path):
+    store = DatabaseManager(str(tmp_path / 'store.db'))
+    make_station_db(tmp_path / 'remote.db', [1.0, 2.0])
+    assert merge_into_store(store) == 2
+    assert readings(store) == [1.0, 2.0]
+    assert os.path.exists(tmp_path / MERGED_DIR_NAME / 'remote.db')
+    assert not os.path.exists(tmp_path / 'remote.db')
+    store.close()
+
+def test_source_left_in_place_after_commit_is_not_merged_twice(tmp_path):
+    store = DatabaseManager(str(tmp_path / 'store.db'))
+    source = tmp_path / 'remote.db'
+    make_station_db(source, [1.0, 2.0])
+    # As if the collector crashed between the commit and moving the file
+    assert store.merge_from(str(source)) == 2
+    assert merge_into_store(store) == 0
+    assert readings(store) == [1.0, 2.0]
+    assert not os.path.exists(source)
+    store.close()
+
+def test_failed_merge_leaves_the_connection_usable(tmp_path):
+    store = DatabaseManager(str(tmp_path / 'store.db'))
+    bad = tmp_path / 'broken.db'
+    bad.write_bytes(b'not a database' * 100)
+    assert store.merge_from(str(bad)) is None
+    assert os.path.exists(bad)
+    make_station_db(tmp_path / 'remote.db', [3.0])
+    assert store.merge_from(str(tmp_path / 'remote.db')) == 1
+    store.close()
+
+def test_merge_run_twice_copies_each_source_once(tmp_path):
+    store = DatabaseManager(str(tmp_path / 'store.db'))
+    source = tmp_path / 'remote.db'
+    make_station_db(source, [1.0, 2.0])
+    assert store.merge_from(str(source)) == 2
+    # Opening the source can checkpoint its WAL, changing its size and mtime
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime, stat.st_mtime + 60))
+    with open(source, 'ab') as f:
+        f.write(b'\0' * 4096)
+    assert merge_into_store(store) == 0
+    assert merge_into_store(store) == 0
+    assert readings(store) == [1.0, 2.0]
+    store.close()
+
+def test_missing_source_is_not_created(tmp_path):
+    store = DatabaseManager(str(tmp_path / 'store.db'))
+    assert store.merge_from(str(tmp_path / 'gone.db')) is None
+    assert not os.path.exists(tmp_path / 'gone.db')
+    store.close()
@@ -0,0 +1,130 @@
+# tests/test_modbus.py
+import types
+
+import pytest
+
+import hardware
+from weather_station_library import ResponseTimer, CircuitBreaker, ModbusSensor
+
+# The minimalmodbus 2 exception hierarchy
+class ModbusException(IOError):
+    pass
+
+class SlaveReportedException(ModbusException):
+    pass
+
+class IllegalRequestError(SlaveReportedException):
+    pass
+
+class MasterReportedException(ModbusException):
+    pass
+
+class NoResponseError(MasterReportedException):
+    pass
+
+class InvalidResponseError(MasterReportedException):
+    pass
+
+class ScriptedInstrument:
+    """Answers each read with the next entry of `script[register]`: a value, or an exception to raise."""
+    script = {}
+
+    def __init__(self, port, address):
+        self.serial = types.SimpleNamespace(baudrate=4800, parity='N', stopbits=1, bytesize=8, timeout=0.05)
+        self.timeouts = []
+
+    def read_register(self, registeraddress, number_of_decimals=0, signed=False):
+        self.timeouts.append(self.serial.timeout)
+        outcome = self.script[registeraddress].pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+class FakeIngest:
+    def submit(self, *args, **kwargs):
+        return True
+
+@pytest.fixture
+def make_sensor(monkeypatch):
+    fake = types.SimpleNamespace(Instrument=ScriptedInstrument, MODE_RTU='rtu',
+                                 NoResponseError=NoResponseError, InvalidResponseError=InvalidResponseError)
+    monkeypatch.setitem(hardware._loaded, 'minimalmodbus', fake)
+
+    def make(script, **config):
+        ScriptedInstrument.script = script
+        sensor_config = {'name': 'soil', 'enabled': True, 'polling_rate': 60, 'retries': 1, 'failure_threshold': 2,
+                         'metrics': {f'm{register}': {'register': register} for register in script}}
+        sensor_config.update(config)
+        return ModbusSensor('/dev/ttyTEST0', 1, sensor_config, ingest=FakeIngest())
+    return make
+
+def test_timer_before_the_first_answer_stays_within_its_bounds():
+    assert ResponseTimer(min_timeout=0.01, max_timeout=1.0).timeout == 0.05
+    assert ResponseTimer(min_timeout=0.1, max_timeout=1.0).timeout == 0.1
+    assert ResponseTimer(min_timeout=0.1, max_timeout=0.5, initial_timeout=2.0).timeout == 0.5
+
+def test_timer_adapts_after_the_first_answer():
+    timer = ResponseTimer(min_timeout=0.1, max_timeout=1.0)
+    timer.observe(0.2)
+    assert timer.timeout == pytest.approx(0.2 + 4 * 0.1)
+    for _ in range(50):
+        timer.observe(0.01)
+    assert timer.timeout == 0.1
+
+def test_timer_never_exceeds_max_timeout():
+    timer = ResponseTimer(min_timeout=0.1, max_timeout=0.5)
+    timer.observe(3.0)
+    assert timer.timeout == 0.5
+
+def test_breaker_opens_after_threshold_and_backs_off():
+    breaker = CircuitBreaker(failure_threshold=2, base_delay=10, max_delay=25)
+    assert breaker.record_failure() is None
+    assert not breaker.is_open and breaker.delay(60) == 60
+    assert breaker.record_failure() == 10
+    assert breaker.is_open and 0 < breaker.delay(60) <= 10
+    assert breaker.record_failure() == 20
+    assert breaker.record_failure() == 25
+    breaker.record_success()
+    assert not breaker.is_open and breaker.failures == 0 and breaker.delay(60) == 60
+
+def test_no_answer_is_retried_with_a_doubled_timeout(make_sensor):
+    sensor = make_sensor({1: [NoResponseError("no answer"), 21.5]})
+    assert sensor._read_metrics() == [('m1', 21.5)]
+    assert sensor.instrument.timeouts == [0.1, 0.2]
+    assert sensor.breaker.failures == 0
+
+def test_no_answer_ends_the_poll_and_counts_towards_the_breaker(make_sensor):
+    sensor = make_sensor({1: [NoResponseError("no answer")] * 4, 2: [5.0] * 2})
+    assert sensor._read_metrics() == []
+    assert sensor.breaker.failures == 1 and not sensor.breaker.is_open
+    assert sensor.instrument.script[2] == [5.0] * 2  # Never asked
+    sensor._read_metrics()
+    assert sensor.breaker.is_open
+
+def test_sensor_exception_skips_only_that_register(make_sensor):
+    sensor = make_sensor({1: [IllegalRequestError("illegal data address")], 2: [5.0]})
+    assert sensor._read_metrics() == [('m2', 5.0)]
+    assert sensor.instrument.timeouts == [0.1, 0.1]  # Not retried
+    assert sensor.breaker.failures == 0
+
+def test_corrupt_frames_are_retried_but_never_trip_the_breaker(make_sensor):
+    sensor = make_sensor({1: [InvalidResponseError("checksum error")] * 4, 2: [5.0] * 2})
+    for _ in range(2):
+        assert sensor._read_metrics() == [('m2', 5.0)]
+    assert sensor.instrument.script[1] == []  # Two attempts per poll
+    assert sensor.breaker.failures == 0 and not sensor.breaker.is_open
+
+def test_older_minimalmodbus_treats_any_io_error_as_no_answer(make_sensor, monkeypatch):
+    monkeypatch.setitem(hardware._loaded, 'minimalmodbus', types.SimpleNamespace(Instrument=ScriptedInstrument, MODE_RTU='rtu'))
+    sensor = make_sensor({1: [IOError("no answer")] * 2, 2: [ValueError("checksum error"), 5.0]})
+    assert sensor._read_metrics() == []
+    assert sensor.breaker.failures == 1
+
+def test_fixed_timeout_is_used_from_the_first_read(make_sensor):
+    sensor = make_sensor({1: [1.0]}, timeout_seconds=0.3)
+    sensor._read_metrics()
+    assert sensor.instrument.timeouts == [0.3]
+
+def test_sensor_writes_only_through_the_ingest_pipeline(make_sensor):
+    sensor = make_sensor({1: [21.5]})
+    assert not hasattr(sensor, 'db_manager')
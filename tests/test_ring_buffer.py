@@ -0,0 +1,25 @@
+# tests/test_ring_buffer.py
+import datetime
+
+from database import DatabaseManager
+from ring_buffer import RecentReadings
+
+def iso(hours_ago):
+    return (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=hours_ago)).isoformat()
+
+def test_get_series_lists_each_series_once(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'station.db'))
+    db.write_readings([(iso(1), station_id, sensor, metric, 1.0, None)
+                       for station_id in (2, 1) for sensor, metric in (('soil', 'temp-c'), ('air', 'rh'), ('soil', 'temp-c'))])
+    assert db.get_series() == [(1, 'air', 'rh'), (1, 'soil', 'temp-c'), (2, 'air', 'rh'), (2, 'soil', 'temp-c')]
+    db.close()
+
+def test_warm_from_db_loads_only_the_retention_window(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'station.db'))
+    db.write_readings([(iso(50), 1, 'soil', 'temp-c', 1.0, None), (iso(3), 1, 'soil', 'temp-c', 2.0, None),
+                       (iso(2), 1, 'air', 'rh', 60.0, None), (iso(1), 1, 'soil', 'temp-c', 3.0, None)])
+    recent = RecentReadings(retention_hours=48)
+    recent.warm_from_db(db)
+    assert [p['value'] for p in recent.query(1, 'soil', 'temp-c', 48)] == [2.0, 3.0]
+    assert [p['value'] for p in recent.query(1, 'air', 'rh', 24)] == [60.0]
+    db.close()
@@ -0,0 +1,40 @@
+# tests/test_set_baud.py
+import os
+import json
+
+import hardware
+import set_baud
+from config_watcher import write_config
+
+def test_write_config_replaces_the_file_and_leaves_no_temp_file(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text('{"old": true}')
+    os.chmod(path, 0o640)
+    write_config(str(path), {'sensors': {'1': {'baudrate': 9600}}})
+    assert json.loads(path.read_text()) == {'sensors': {'1': {'baudrate': 9600}}}
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ['config.json']
+
+def test_write_config_keeps_the_old_file_if_the_config_cannot_be_written(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text('{"old": true}')
+    try:
+        write_config(str(path), {'bad': object()})
+    except TypeError:
+        pass
+    assert json.loads(path.read_text()) == {'old': True}
+    assert os.listdir(tmp_path) == ['config.json']
+
+def test_simulated_run_does_not_change_the_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(hardware, '_loaded', dict(hardware._loaded))
+    monkeypatch.setattr(hardware, 'simulated_ports', [])
+    monkeypatch.setattr(set_baud, 'SWITCH_SECONDS', 0)
+    config = {
+        'modbus': {'baudrate': 4800},
+        'simulation': {'time_scale': 0.01, 'modbus_error_rate': 0.0},
+        'sensors': {'1': {'name': 'soil', 'enabled': True, 'metrics': {'temp-c': {'register': 0}}}},
+    }
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(config))
+    assert set_baud.main(['--config', str(path), '--simulate', '--baud', '9600', '--reads', '2']) == 0
+    assert json.loads(path.read_text()) == config
@@ -0,0 +1,141 @@
+# tests/test_spool.py
+import os
+
+from database import DatabaseManager
+from ingest import IngestPipeline
+from spool import ReadingSpool, HEADER_SIZE
+
+ROWS = [
+    ("2024-01-01T00:00:00+00:00", 1, 'soil', 'temp-c', 12.5, None),
+    ("2024-01-01T00:00:01.250000+00:00", 1, 'soil', 'moisture', 31.0, -97.5),
+    ("2024-01-01 00:00:02", 2, 'air', 'rh', 55.0, None),  # Kept as text, no timezone
+]
+
+def test_spool_round_trips_readings(tmp_path):
+    spool = ReadingSpool(str(tmp_path / 'spool.bin'))
+    spool.append('/data/a.db', ROWS[:2])
+    spool.append('/data/b.db', ROWS[2:])
+    by_db = spool.read()
+    assert by_db['/data/a.db'][1] == ROWS[:2]
+    assert by_db['/data/b.db'][1] == ROWS[2:]
+    offsets = by_db['/data/a.db'][0] + by_db['/data/b.db'][0]
+    assert offsets == sorted(offsets) and len(set(offsets)) == 3
+    assert len(spool) == 3
+
+def test_spool_recovers_and_cuts_a_torn_tail(tmp_path):
+    path = str(tmp_path / 'spool.bin')
+    spool = ReadingSpool(path)
+    spool.append('/data/a.db', ROWS[:2])
+    spool_id = spool.spool_id
+    spool.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x30\x00\x01\x02')  # Half a frame, as after a power cut
+    reopened = ReadingSpool(path)
+    assert reopened.spool_id == spool_id
+    assert len(reopened) == 2
+    reopened.append('/data/a.db', ROWS[2:])
+    assert reopened.read()['/data/a.db'][1] == ROWS
+    reopened.close()
+
+def test_spool_moves_a_foreign_file_aside(tmp_path):
+    path = tmp_path / 'spool.bin'
+    path.write_bytes(b'x' * HEADER_SIZE)
+    spool = ReadingSpool(str(path))
+    assert len(spool) == 0
+    assert os.path.exists(str(path) + '.corrupt')
+
+def test_replay_skips_rows_already_replayed(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'a.db'))
+    spool = ReadingSpool(str(tmp_path / 'spool.bin'))
+    spool.append(db.db_path, ROWS[:2])
+    offsets, rows = spool.read()[db.db_path]
+    assert db.replay_spool(spool.spool_id, rows, offsets) == 2
+    assert db.replay_spool(spool.spool_id, rows, offsets) == 0
+    spool.append(db.db_path, ROWS[2:])
+    offsets, rows = spool.read()[db.db_path]
+    assert db.replay_spool(spool.spool_id, rows, offsets) == 1
+    assert sum(1 for _ in db.iter_readings()) == 3
+    db.close()
+
+def unplug(monkeypatch, db):
+    monkeypatch.setattr(db, 'write_readings', lambda rows: None)
+    monkeypatch.setattr(db, 'reconnect', lambda: False)
+
+def plug_in(monkeypatch, db):
+    monkeypatch.delattr(db, 'write_readings')
+    monkeypatch.delattr(db, 'reconnect')
+
+def test_partial_replay_then_more_appends_loses_nothing(tmp_path, monkeypatch):
+    a = DatabaseManager(str(tmp_path / 'a.db'))
+    b = DatabaseManager(str(tmp_path / 'b.db'))
+    pipeline = IngestPipeline(a, spool_path=str(tmp_path / 'spool.bin'), retry_seconds=0)
+
+    unplug(monkeypatch, a)
+    unplug(monkeypatch, b)
+    for value in (1.0, 2.0):
+        pipeline.submit(1, 'soil', 'temp-c', value)
+        pipeline.submit(2, 'soil', 'temp-c', value, db=b)
+    assert len(pipeline.spool) == 4
+
+    # a comes back and replays under the spool's id; b is still missing
+    plug_in(monkeypatch, a)
+    assert pipeline._replay() is False
+    assert [r[4] for r in a.iter_readings()] == [1.0, 2.0]
+
+    # a fails again, so more of its readings join the same spool
+    unplug(monkeypatch, a)
+    pipeline.submit(1, 'soil', 'temp-c', 3.0)
+    pipeline.submit(2, 'soil', 'temp-c', 3.0, db=b)
+
+    plug_in(monkeypatch, a)
+    plug_in(monkeypatch, b)
+    assert pipeline._replay() is True
+    assert [r[4] for r in a.iter_readings()] == [1.0, 2.0, 3.0]
+    assert [r[4] for r in b.iter_readings()] == [1.0, 2.0, 3.0]
+    assert not os.path.exists(tmp_path / 'spool.bin')
+    a.close()
+    b.close()
+
+def row(value):
+    return ("2024-01-01T00:00:00+00:00", 1, 'soil', 'temp-c', float(value), None)
+
+def test_spool_reads_in_bounded_chunks(tmp_path):
+    spool = ReadingSpool(str(tmp_path / 'spool.bin'))
+    spool.append('/data/a.db', [row(v) for v in range(25)])
+    spool.append('/data/b.db', [row(v) for v in range(5)])
+    chunks = spool.iter_chunks(10)
+    sizes = []
+    for db_path, offsets, rows in chunks:
+        sizes.append((db_path, len(rows)))
+        if len(sizes) == 1:
+            spool.append('/data/b.db', [row(5)])  # Appended while the chunks are consumed
+    assert sizes == [('/data/a.db', 10), ('/data/a.db', 10), ('/data/a.db', 5), ('/data/b.db', 6)]
+    assert spool.read()['/data/a.db'][1] == [row(v) for v in range(25)]
+    spool.close()
+
+def test_chunked_replay_resumes_after_a_failure(tmp_path, monkeypatch):
+    a = DatabaseManager(str(tmp_path / 'a.db'))
+    b = DatabaseManager(str(tmp_path / 'b.db'))
+    pipeline = IngestPipeline(a, spool_path=str(tmp_path / 'spool.bin'), retry_seconds=0, replay_chunk_size=10)
+    unplug(monkeypatch, a)
+    for value in range(25):
+        pipeline.submit(1, 'soil', 'temp-c', float(value))
+    plug_in(monkeypatch, a)
+
+    replay_spool, live_rows = a.replay_spool, []
+    def fail_second_chunk(spool_id, rows, offsets):
+        live_rows.append(sum(1 for _ in b.iter_readings()))
+        return None if len(live_rows) == 2 else replay_spool(spool_id, rows, offsets)
+    monkeypatch.setattr(a, 'replay_spool', fail_second_chunk)
+    # A live reading queued before the replay is committed after its first chunk
+    pipeline.queue.put_nowait((b, "2024-01-01T00:00:00+00:00", 0.0, 2, 'soil', 'temp-c', 99.0, None))
+    assert pipeline._replay() is False
+    assert live_rows == [0, 1]
+    assert [r[4] for r in a.iter_readings()] == [float(v) for v in range(10)]
+
+    monkeypatch.setattr(a, 'replay_spool', replay_spool)
+    assert pipeline._replay() is True
+    assert [r[4] for r in a.iter_readings()] == [float(v) for v in range(25)]
+    assert not os.path.exists(tmp_path / 'spool.bin')
+    a.close()
+    b.close()
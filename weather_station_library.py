@@ -1,121 +1,273 @@
 # weather_station_library.py
-import os
 import time
 import logging
+from collections import deque
 from threading import Thread, Event, Lock
 
-# Import hardware-specific libraries
-try:
-    import minimalmodbus
-    from gpiozero import Button
-    HARDWARE_AVAILABLE = True
-except (ImportError, NotImplementedError):
-    print("[Warning] Hardware-specific libraries not found. All sensor functionality will be disabled.")
-    HARDWARE_AVAILABLE = False
+import hardware
+import metrics
+from config_watcher import diff_config
+from ingest import IngestPipeline
+
+PORTS_TO_SCAN = ['/dev/ttyACM0', '/dev/ttyACM1', '/dev/ttyACM2', '/dev/ttyACM3', '/dev/ttyACM4', '/dev/ttyACM5', '/dev/ttyACM6', '/dev/ttyACM7', '/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyUSB2',
+                 '/dev/ttyUSB3', '/dev/ttyUSB4', '/dev/ttyUSB5', '/dev/ttyUSB6', '/dev/ttyUSB7', '/dev/ttyCH9344USB0', '/dev/ttyCH9344USB1', '/dev/ttyCH9344USB2', '/dev/ttyCH9344USB3',
+                 '/dev/ttyCH9344USB4', '/dev/ttyCH9344USB5', '/dev/ttyCH9344USB6', '/dev/ttyCH9344USB7']
+
+# Serial line settings for each sensor; a sensor's config (or the 'modbus' section) overrides them
+SERIAL_DEFAULTS = {'baudrate': 4800, 'parity': 'N', 'stopbits': 1, 'bytesize': 8}
+# Holding register that selects the line speed on the RS-485 sensors in 'sensor examples/'
+BAUD_RATE_REGISTER = 0x07D1
+BAUD_RATE_CODES = {2400: 0, 4800: 1, 9600: 2}
+# End of the last transaction on each port, for sensors that need a longer gap between frames
+_last_frame_end = {}
+
+MODBUS_READ_SECONDS = metrics.histogram('ws_modbus_read_seconds', "Latency of a single Modbus register read.", ('sensor', 'port'))
+MODBUS_READ_ERRORS = metrics.counter('ws_modbus_read_errors_total', "Modbus reads that failed.", ('sensor', 'port'))
+MODBUS_RETRIES = metrics.counter('ws_modbus_retries_total', "Modbus reads retried after no or a corrupt answer.", ('sensor', 'port'))
+MODBUS_TIMEOUT_SECONDS = metrics.gauge('ws_modbus_timeout_seconds', "Current adaptive read timeout per sensor.", ('sensor',))
+MODBUS_CIRCUIT_OPEN = metrics.gauge('ws_modbus_circuit_open', "1 while a sensor's circuit breaker is open.", ('sensor',))
+RAIN_TIPS = metrics.counter('ws_rain_gauge_tips_total', "Rain gauge bucket tips recorded.", ('sensor',))
+
+log = logging.getLogger(__name__)
+
+class ResponseTimer:
+    """
+    Adaptive read timeout for one sensor: the smoothed response time plus four
+    times its mean deviation (the TCP retransmission timer), kept between
+    `min_timeout` and `max_timeout`. Until the first answer, `initial_timeout`
+    (minimalmodbus' own default), within the same bounds, is used, and retries
+    double it from there.
+    """
+    def __init__(self, min_timeout=0.1, max_timeout=1.0, initial_timeout=0.05):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.initial_timeout = initial_timeout
+        self.srtt = None
+        self.rttvar = 0.0
+
+    def observe(self, seconds):
+        if self.srtt is None:
+            self.srtt, self.rttvar = seconds, seconds / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - seconds)
+            self.srtt = 0.875 * self.srtt + 0.125 * seconds
+
+    @property
+    def timeout(self):
+        if self.srtt is None:
+            return min(max(self.initial_timeout, self.min_timeout), self.max_timeout)
+        return min(max(self.srtt + 4 * self.rttvar, self.min_timeout), self.max_timeout)
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed polls. While open, the
+    sensor is only probed after a delay that starts at `base_delay` and doubles
+    with every failed probe up to `max_delay`; one good poll closes it again.
+    """
+    def __init__(self, failure_threshold=3, base_delay=60, max_delay=3600):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+
+    @property
+    def is_open(self):
+        return self.failures >= self.failure_threshold
+
+    def delay(self, interval):
+        """Seconds until the next poll: the normal interval, or the rest of the backoff."""
+        if not self.is_open:
+            return interval
+        return max(self.open_until - time.monotonic(), 0.0)
+
+    def record_success(self):
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+
+    def record_failure(self):
+        """Counts a failed poll. Returns the backoff in seconds if the breaker is now open."""
+        self.failures += 1
+        if not self.is_open:
+            return None
+        backoff = min(self.base_delay * 2 ** self.trips, self.max_delay)
+        self.trips += 1
+        self.open_until = time.monotonic() + backoff
+        return backoff
 
 class WeatherStation:
     """
     Manages all sensors for a weather station, including discovery, polling, and configuration updates.
     """
-    def __init__(self, initial_config, db_manager=None):
+    def __init__(self, initial_config, db_manager=None, recent=None, derived=None, ingest=None):
         self.sensors = {}
+        self.modbus_sensors = {}  # Keyed by the Modbus address string used in the config
+        self.rain_gauge = None
         self._stop_event = Event()
-        self.shared_modbus_lock = Lock()
+        self.shared_modbus_lock = metrics.InstrumentedLock('modbus')
         self.db_manager = db_manager
+        self.recent = recent
+        self.derived = derived
         if not self.db_manager:
             raise ValueError("A DatabaseManager instance is required.")
         
         self.config = initial_config
+        # Without a shared pipeline the station owns one, started and stopped with it
+        self.owns_ingest = ingest is None
+        self.ingest = ingest or IngestPipeline.from_config(initial_config, db_manager, recent=recent)
         self.station_id = self.config.get('station_info', {}).get('station_id', 0)
+        self.debug = self.config.get('logging', {}).get('debug', False)
 
     def discover_and_add_sensors(self):
         """
         Scans for and initializes all sensors defined and enabled in the configuration.
         """
-        if not HARDWARE_AVAILABLE:
-            print("  [Discovery] Skipped due to missing hardware libraries.")
-            return
-
         config = self.config
-        ports_to_scan = ['/dev/ttyACM0', '/dev/ttyACM1', '/dev/ttyACM2', '/dev/ttyACM3', '/dev/ttyACM4', '/dev/ttyACM5', '/dev/ttyACM6', '/dev/ttyACM7', '/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyUSB2',
-                         '/dev/ttyUSB3', '/dev/ttyUSB4', '/dev/ttyUSB5', '/dev/ttyUSB6', '/dev/ttyUSB7', '/dev/ttyCH9344USB0', '/dev/ttyCH9344USB1', '/dev/ttyCH9344USB2', '/dev/ttyCH9344USB3',
-                         '/dev/ttyCH9344USB4', '/dev/ttyCH9344USB5', '/dev/ttyCH9344USB6', '/dev/ttyCH9344USB7']
-        
-        print("  [Discovery] Performing initial discovery of Modbus sensors...")
-        logging.basicConfig(level=logging.INFO)
-        logging.info("Sensor discovery has started.")
-        found_addrs = {}
-        for addr_str, s_conf in config.get('sensors', {}).items():
-            if not s_conf.get('enabled', False):
-                continue
-            addr = int(addr_str)
-            for port in ports_to_scan:
-                if os.path.exists(port) and self._test_sensor_at_location(port, addr):
-                    print(f"  [Discovery] Found '{s_conf['name']}' (addr {addr}) on {port}")
-                    found_addrs[addr] = port
-                    break
-        
-        for addr, port in found_addrs.items():
-            s_conf = config['sensors'][str(addr)]
-            sensor = ModbusSensor(port, addr, s_conf, lock=self.shared_modbus_lock, db_manager=self.db_manager, station_id=self.station_id, debug=True)
-            self.sensors[s_conf['name']] = sensor
+        enabled_sensors = {a: c for a, c in config.get('sensors', {}).items() if c.get('enabled', False)}
+        if enabled_sensors and not hardware.load('minimalmodbus', 'Modbus sensors'):
+            log.warning("[Discovery] Skipped due to missing hardware libraries.")
+            enabled_sensors = {}
+
+        if enabled_sensors:
+            log.info("[Discovery] Performing initial discovery of Modbus sensors...")
+        for addr_str, s_conf in enabled_sensors.items():
+            self._add_modbus_sensor(addr_str, s_conf)
 
         rg_conf = config.get('rain_gauge')
         if rg_conf and rg_conf.get('enabled', False):
-            try:
-                rain_sensor = RainGaugeSensor(rg_conf, db_manager=self.db_manager, station_id=self.station_id, debug=True)
-                self.sensors[rg_conf['name']] = rain_sensor
-            except Exception as e:
-                print(f"  [Discovery] ERROR: Failed to initialize Rain Gauge: {e}")
+            self._add_rain_gauge(rg_conf)
+
+    def serial_settings(self, s_conf):
+        """A sensor's serial line settings: its own config, then the 'modbus' section, then SERIAL_DEFAULTS."""
+        defaults = self.config.get('modbus', {})
+        return {key: s_conf.get(key, defaults.get(key, default)) for key, default in SERIAL_DEFAULTS.items()}
+
+    def _find_sensor_port(self, addr, serial_settings=None, register=0):
+        """Returns the first serial port with a Modbus device answering at `addr`."""
+        for port in hardware.serial_ports(PORTS_TO_SCAN):
+            if self._test_sensor_at_location(port, addr, serial_settings, register):
+                return port
+        return None
 
+    def _add_modbus_sensor(self, addr_str, s_conf):
+        """Locates a Modbus sensor on the bus and registers it. Returns the sensor or None."""
+        if not hardware.load('minimalmodbus', 'Modbus sensors'):
+            return None
+        addr = int(addr_str)
+        # Probe a register the sensor is configured to have; not every model has register 0
+        registers = [m['register'] for m in s_conf.get('metrics', {}).values()]
+        port = self._find_sensor_port(addr, self.serial_settings(s_conf), min(registers, default=0))
+        if not port:
+            log.warning("[Discovery] '%s' (addr %s) not found on any port.", s_conf['name'], addr)
+            return None
+        log.info("[Discovery] Found '%s' (addr %s) on %s", s_conf['name'], addr, port)
+        sensor = ModbusSensor(port, addr, s_conf, lock=self.shared_modbus_lock, ingest=self.ingest, station_id=self.station_id, derived=self.derived, debug=self.debug,
+                              modbus=self.config.get('modbus', {}))
+        self.sensors[s_conf['name']] = sensor
+        self.modbus_sensors[addr_str] = sensor
+        return sensor
+
+    def _add_rain_gauge(self, rg_conf):
+        try:
+            rain_sensor = RainGaugeSensor(rg_conf, ingest=self.ingest, station_id=self.station_id, derived=self.derived, debug=self.debug)
+            self.sensors[rg_conf['name']] = rain_sensor
+            self.rain_gauge = rain_sensor
+            return rain_sensor
+        except Exception as e:
+            log.error("[Discovery] Failed to initialize Rain Gauge: %s", e)
+            return None
+
+    def _remove_sensor(self, sensor):
+        log.info("[Config Update] Removing sensor '%s'.", sensor.name)
+        sensor.stop()
+        self.sensors.pop(sensor.name, None)
 
     def start(self):
         """Starts the polling threads for all registered sensors."""
-        print("\n--- Starting Sensor Polling Services ---")
+        log.info("Starting sensor polling services")
+        if self.owns_ingest:
+            self.ingest.start()
         for sensor_name, sensor in self.sensors.items():
-            print(f"  - Starting polling for '{sensor_name}'")
+            log.info("Starting polling for '%s'", sensor_name)
             sensor.start()
 
     def stop(self):
         """Stops all sensor polling threads gracefully."""
         self._stop_event.set()
         for sensor_name, sensor in self.sensors.items():
-            print(f"  - Stopping polling for '{sensor_name}'")
+            log.info("Stopping polling for '%s'", sensor_name)
             sensor.stop()
+        if self.owns_ingest:
+            self.ingest.stop()
 
-    def update_config(self, new_config):
+    def update_config(self, new_config, diff=None):
         """
-        Updates the configuration for the weather station and all its sensors.
-        Note: This does not currently add or remove sensors on the fly.
+        Applies a new configuration. Only sensors whose settings changed are
+        updated; sensors added to the config are discovered and started, and
+        sensors removed from it are stopped.
         """
+        if diff is None:
+            diff = diff_config(self.config, new_config)
         self.config = new_config
-        for sensor in self.sensors.values():
-            if hasattr(sensor, 'name'):
-                # Find corresponding config for Modbus sensors
-                sensor_found = False
-                for s_conf in self.config.get('sensors', {}).values():
-                    if s_conf['name'] == sensor.name:
-                        sensor.update_config(s_conf)
-                        sensor_found = True
-                        break
-                # Find config for rain gauge
-                rg_conf = self.config.get('rain_gauge', {})
-                if rg_conf.get('name') == sensor.name:
-                    sensor.update_config(rg_conf)
-                    sensor_found = True
-                
-                if not sensor_found:
-                    print(f"[Config Update] Warning: No config found for running sensor '{sensor.name}'. It may become disabled.")
-
-
-    def _test_sensor_at_location(self, port, address):
-        """Tests for the presence of a Modbus device at a specific port and address."""
+        new_sensors = new_config.get('sensors', {})
+
+        if 'logging' in diff.sections:
+            self.debug = new_config.get('logging', {}).get('debug', False)
+            for sensor in self.sensors.values():
+                sensor.debug = self.debug
+
+        if 'modbus' in diff.sections:
+            for addr_str, sensor in self.modbus_sensors.items():
+                if addr_str in new_sensors:
+                    sensor.modbus_defaults = new_config.get('modbus', {})
+                    sensor.update_config(new_sensors[addr_str])
+
+        for addr_str in diff.removed:
+            sensor = self.modbus_sensors.pop(addr_str, None)
+            if sensor:
+                self._remove_sensor(sensor)
+
+        for addr_str in diff.changed | diff.added:
+            s_conf = new_sensors[addr_str]
+            sensor = self.modbus_sensors.get(addr_str)
+            if sensor:
+                if sensor.name != s_conf['name']:
+                    self.sensors[s_conf['name']] = self.sensors.pop(sensor.name)
+                sensor.update_config(s_conf)
+                sensor.start()
+            elif s_conf.get('enabled', False):
+                # Sensors that were added, or disabled at startup, are hot-added
+                sensor = self._add_modbus_sensor(addr_str, s_conf)
+                if sensor:
+                    sensor.start()
+
+        if 'rain_gauge' in diff.sections:
+            rg_conf = new_config.get('rain_gauge')
+            if self.rain_gauge and not rg_conf:
+                self._remove_sensor(self.rain_gauge)
+                self.rain_gauge = None
+            elif self.rain_gauge:
+                if self.rain_gauge.name != rg_conf['name']:
+                    self.sensors[rg_conf['name']] = self.sensors.pop(self.rain_gauge.name)
+                self.rain_gauge.update_config(rg_conf)
+                self.rain_gauge.start()
+            elif rg_conf and rg_conf.get('enabled', False):
+                rain_sensor = self._add_rain_gauge(rg_conf)
+                if rain_sensor:
+                    rain_sensor.start()
+
+    def _test_sensor_at_location(self, port, address, serial_settings=None, register=0):
+        """Tests for the presence of a Modbus device at a specific port, address and line settings."""
+        minimalmodbus = hardware.load('minimalmodbus', 'Modbus sensors')
         try:
             with self.shared_modbus_lock:
                 inst = minimalmodbus.Instrument(port, address)
-                inst.serial.baudrate = 4800
+                for key, value in (serial_settings or SERIAL_DEFAULTS).items():
+                    setattr(inst.serial, key, value)
                 inst.serial.timeout = 1.0
-                inst.read_register(0, 0) # Try reading a common register
+                inst.read_register(register, 0)
             return True
         except (IOError, ValueError):
             return False
@@ -125,17 +277,30 @@ class ModbusSensor:
     Represents a single Modbus sensor, handling its own polling thread and data logging.
     """
     def __init__(self, port, address, initial_config, **kwargs):
+        minimalmodbus = hardware.load('minimalmodbus', 'Modbus sensors')
+        if not minimalmodbus:
+            raise ImportError("Cannot initialize ModbusSensor, minimalmodbus library not found.")
+        self.address = address
+        self.port = port
         self.instrument = minimalmodbus.Instrument(port, address)
-        self.instrument.serial.baudrate = 4800
         self.instrument.mode = minimalmodbus.MODE_RTU
+        # minimalmodbus 2 tells a silent sensor apart from one that answered with
+        # an error or a garbled frame; older versions raise a plain IOError for all
+        self._no_answer = getattr(minimalmodbus, 'NoResponseError', IOError)
+        self._retried = (self._no_answer, getattr(minimalmodbus, 'InvalidResponseError', self._no_answer))
         self.debug = kwargs.get('debug', False)
         self.shared_port_lock = kwargs.get('lock', Lock())
         self._stop_event = Event()
+        # Station-wide defaults for the retry, timeout and breaker settings; a sensor's own config overrides them
+        self.modbus_defaults = kwargs.get('modbus', {})
+        self.timer = ResponseTimer()
+        self.breaker = CircuitBreaker()
         
-        self.db_manager = kwargs.get('db_manager')
+        self.ingest = kwargs.get('ingest')
         self.station_id = kwargs.get('station_id')
-        if not self.db_manager:
-            raise ValueError("ModbusSensor requires a db_manager instance.")
+        self.derived = kwargs.get('derived')
+        if not self.ingest:
+            raise ValueError("ModbusSensor requires an ingest pipeline.")
         
         self.poller_thread = None
         self.update_config(initial_config)
@@ -146,7 +311,30 @@ class ModbusSensor:
         self.metric_configs = new_config['metrics']
         self.polling_rate = new_config.get('polling_rate', 600)
         self.enabled = new_config.get('enabled', False)
-        if self.debug: print(f"[{self.name}] Config updated. Polling rate: {self.polling_rate}s. Enabled: {self.enabled}")
+
+        def setting(key, default):
+            return new_config.get(key, self.modbus_defaults.get(key, default))
+        self.serial_settings = {key: setting(key, default) for key, default in SERIAL_DEFAULTS.items()}
+        self.inter_frame_delay = setting('inter_frame_delay_ms', 0) / 1000.0
+        self.retries = setting('retries', 1)
+        self.timer.min_timeout = setting('min_timeout_seconds', 0.1)
+        self.timer.max_timeout = setting('max_timeout_seconds', 1.0)
+        self.timer.initial_timeout = setting('initial_timeout_seconds', 0.05)
+        if 'timeout_seconds' in new_config:
+            # A fixed timeout for this sensor instead of an adaptive one
+            self.timer.min_timeout = self.timer.max_timeout = new_config['timeout_seconds']
+            self.timer.initial_timeout = new_config['timeout_seconds']
+        self.breaker.failure_threshold = setting('failure_threshold', 3)
+        self.breaker.base_delay = self.polling_rate
+        self.breaker.max_delay = setting('max_backoff_seconds', 3600)
+
+        self._read_seconds = MODBUS_READ_SECONDS.labels(self.name, self.port)
+        self._read_errors = MODBUS_READ_ERRORS.labels(self.name, self.port)
+        self._retries = MODBUS_RETRIES.labels(self.name, self.port)
+        self._timeout_gauge = MODBUS_TIMEOUT_SECONDS.labels(self.name)
+        self._circuit_gauge = MODBUS_CIRCUIT_OPEN.labels(self.name)
+        log.info("[%s] Config updated. Polling rate: %ss. Enabled: %s. Serial: %s baud, parity %s.", self.name,
+                 self.polling_rate, self.enabled, self.serial_settings['baudrate'], self.serial_settings['parity'])
 
     def start(self):
         """Starts the sensor's polling thread if it's enabled."""
@@ -161,48 +349,136 @@ class ModbusSensor:
             self.poller_thread.join(timeout=2.0)
 
     def _poll(self):
-        """The internal polling loop that reads data and writes it to the database."""
-        while not self._stop_event.wait(self.polling_rate):
+        """
+        The internal polling loop. While the circuit breaker is open, the next
+        poll waits for its backoff instead of the polling rate. Readings are
+        handed to the ingest queue, so bus timing never waits on storage.
+        """
+        while not self._stop_event.wait(self.breaker.delay(self.polling_rate)):
             if not self.enabled: 
-                if self.debug: print(f"[{self.name}] Polling skipped (disabled).")
+                if self.debug: log.debug("[%s] Polling skipped (disabled).", self.name)
+                continue
+
+            readings = self._read_metrics()
+            for metric_name, raw_value in readings:
+                self.ingest.submit(self.station_id, self.name, metric_name, raw_value)
+                if self.derived: self.derived.record(self.name, metric_name, raw_value)
+                if self.debug: log.debug("[%s] Logged: %s = %.2f", self.name, metric_name, raw_value)
+
+    def _read_metrics(self):
+        """
+        Reads every configured register and returns (metric, value) pairs. A
+        register with no answer after its retries ends the cycle, since the
+        rest would only time out too, and counts as a failed poll. A sensor
+        that answers with an exception or a corrupt frame is still there, so
+        only that register is skipped. A probe of an open breaker gets a
+        single attempt.
+        """
+        probing = self.breaker.is_open
+        readings = []
+        for metric_name, config in self.metric_configs.items():
+            try:
+                raw_value = self._read_register(config, 0 if probing else self.retries)
+            except self._no_answer as e:
+                self._read_errors.inc()
+                backoff = self.breaker.record_failure()
+                if backoff is None:
+                    log.error("[%s] Read failed: %s", self.name, e)
+                else:
+                    self._circuit_gauge.set(1.0)
+                    log.warning("[%s] Read failed: %s. %d failed polls in a row; next attempt in %ss.",
+                                self.name, e, self.breaker.failures, backoff)
+                return readings
+            except (IOError, ValueError) as e:
+                # The sensor answered, so only this register is skipped
+                self._read_errors.inc()
+                log.error("[%s] Read of %s failed: %s", self.name, metric_name, e)
                 continue
 
+            if raw_value is not None:
+                readings.append((metric_name, raw_value))
+            else:
+                log.warning("[%s] Received null value for %s", self.name, metric_name)
+
+        if probing:
+            self._circuit_gauge.set(0.0)
+            log.info("[%s] Sensor is answering again; resuming normal polling.", self.name)
+        self.breaker.record_success()
+        return readings
+
+    def _read_register(self, config, retries):
+        """
+        Reads one register. The bus lock is held for each attempt only, so other
+        sensors' reads run between retries. The timeout follows the measured
+        response times and doubles on every retry. No answer and corrupt frames
+        are retried; an exception reported by the sensor is raised at once.
+        """
+        read_func = getattr(self.instrument, config.get("function", "read_register"))
+        timeout = self.timer.timeout
+        self._timeout_gauge.set(timeout)
+        for attempt in range(retries + 1):
             with self.shared_port_lock:
+                self._prepare_bus(timeout)
+                start = time.perf_counter()
                 try:
-                    for metric_name, config in self.metric_configs.items():
-                        read_func_name = config.get("function", "read_register")
-                        read_func = getattr(self.instrument, read_func_name)
-                        
-                        raw_value = read_func(
-                            registeraddress=config["register"],
-                            number_of_decimals=config.get("decimals", 0),
-                            signed=config.get("signed", False)
-                        )
-                        
-                        if raw_value is not None:
-                            self.db_manager.write_reading(self.station_id, self.name, metric_name, raw_value)
-                            if self.debug: print(f"[{self.name}] Logged: {metric_name} = {raw_value:.2f}")
-                        else:
-                            if self.debug: print(f"[{self.name}] Warning: Received null value for {metric_name}")
-
-                except (IOError, ValueError) as e:
-                    print(f"[{self.name}] ERROR: Read failed: {e}")
+                    raw_value = read_func(
+                        registeraddress=config["register"],
+                        number_of_decimals=config.get("decimals", 0),
+                        signed=config.get("signed", False)
+                    )
+                except self._retried:
+                    self._read_seconds.observe(time.perf_counter() - start)
+                    if attempt == retries:
+                        raise
+                    self._retries.inc()
+                    timeout = min(timeout * 2, self.timer.max_timeout)
+                    continue
+                finally:
+                    _last_frame_end[self.port] = time.monotonic()
+                elapsed = time.perf_counter() - start
+            self._read_seconds.observe(elapsed)
+            self.timer.observe(elapsed)
+            return raw_value
+
+    def _prepare_bus(self, timeout):
+        """
+        Applies this sensor's line settings and timeout; called with the bus lock
+        held, since instruments on one port share the serial object. Settings
+        are only written when they differ, as each change reconfigures the port.
+        """
+        serial = self.instrument.serial
+        for key, value in self.serial_settings.items():
+            if getattr(serial, key) != value:
+                setattr(serial, key, value)
+        serial.timeout = timeout
+        if self.inter_frame_delay:
+            wait = _last_frame_end.get(self.port, 0.0) + self.inter_frame_delay - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
 
 class RainGaugeSensor:
     """
     Represents a tipping-bucket rain gauge connected to a GPIO pin.
     """
     def __init__(self, initial_config, **kwargs):
-        if not HARDWARE_AVAILABLE:
+        gpiozero = hardware.load('gpiozero', 'Rain gauge')
+        if not gpiozero:
             raise ImportError("Cannot initialize RainGaugeSensor, gpiozero library not found.")
-        
+        self._button_class = gpiozero.Button
+
         self.debug = kwargs.get('debug', False)
-        self.db_manager = kwargs.get('db_manager')
+        self.ingest = kwargs.get('ingest')
         self.station_id = kwargs.get('station_id')
-        if not self.db_manager:
-            raise ValueError("RainGaugeSensor requires a db_manager instance.")
+        self.derived = kwargs.get('derived')
+        if not self.ingest:
+            raise ValueError("RainGaugeSensor requires an ingest pipeline.")
 
         self.button = None
+        # Tip times appended by the GPIO callback and drained by the flusher.
+        # deque.append/popleft are atomic, so the callback never takes a lock.
+        self.tips = deque()
+        self._stop_event = Event()
+        self.flusher_thread = None
         self.update_config(initial_config)
 
 
@@ -214,29 +490,69 @@ class RainGaugeSensor:
         self.mm_per_tip = new_config['mm_per_tip']
         self.debounce_ms = new_config.get('debounce_ms', 250)
         self.enabled = new_config.get('enabled', False)
+        self.flush_interval = new_config.get('flush_interval_seconds', 60)
+        self.store_tip_times = new_config.get('store_tip_times', False)
+        self._tips = RAIN_TIPS.labels(self.name)
         
         if self.button and self.button.pin.number != self.gpio_pin:
              self.button.close()
              self.button = None
 
         if not self.button and self.enabled:
-             self.button = Button(self.gpio_pin, pull_up=True, bounce_time=self.debounce_ms / 1000.0)
+             self.button = self._button_class(self.gpio_pin, pull_up=True, bounce_time=self.debounce_ms / 1000.0)
 
-        if self.debug: print(f"[{self.name}] Config updated. GPIO Pin: {self.gpio_pin}, Enabled: {self.enabled}")
+        log.info("[%s] Config updated. GPIO Pin: %s, Enabled: %s", self.name, self.gpio_pin, self.enabled)
 
     def start(self):
-        """Assigns the callback function when the sensor is enabled."""
+        """Assigns the callback function and starts the flusher when the sensor is enabled."""
         if self.enabled and self.button:
             self.button.when_pressed = self._tip_callback
+            if not self.flusher_thread or not self.flusher_thread.is_alive():
+                self._stop_event = Event()
+                self.flusher_thread = Thread(target=self._flush_loop, daemon=True)
+                self.flusher_thread.start()
     
     def stop(self):
-        """Closes the GPIO resource."""
+        """Closes the GPIO resource and writes any tips not yet flushed."""
         if self.button:
             self.button.when_pressed = None
             self.button.close()
+        self._stop_event.set()
+        if self.flusher_thread and self.flusher_thread.is_alive():
+            self.flusher_thread.join(timeout=2.0)
+        self.flush()
 
     def _tip_callback(self):
-        """Callback executed on each tip, writing the value to the database."""
+        """Callback executed on each tip. Only records the time; storage happens in the flusher."""
         if self.enabled:
-            self.db_manager.write_reading(self.station_id, self.name, self.metric, self.mm_per_tip)
-            if self.debug: print(f"[{self.name}] Logged: Rain gauge tipped!")
+            self.tips.append(time.time())
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the tips recorded since the last flush as one total for the
+        interval, plus the individual tip times as one compact batch when
+        `store_tip_times` is enabled. Returns the number of tips written.
+        """
+        tip_times = []
+        while True:
+            try:
+                tip_times.append(self.tips.popleft())
+            except IndexError:
+                break
+        if not tip_times:
+            return 0
+
+        self._tips.inc(len(tip_times))
+        total = len(tip_times) * self.mm_per_tip
+        self.ingest.submit(self.station_id, self.name, self.metric, total)
+        if self.store_tip_times:
+            self.ingest.submit_tips(self.station_id, self.name, tip_times)
+        if self.derived:
+            for t in tip_times:
+                self.derived.record(self.name, self.metric, self.mm_per_tip, t)
+        if self.debug: log.debug("[%s] Logged: %d tips (%.2f mm)", self.name, len(tip_times), total)
+        return len(tip_times)